@@ -2,6 +2,8 @@
 import os
 import json
 import sys
+import signal
+import atexit
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
@@ -16,10 +18,16 @@ logging.getLogger("openai").setLevel(logging.WARNING)
 
 # --- NEW MODULAR IMPORTS ---
 from database.db_manager import init_db, DB_PATH
-from rag.vector_store import load_faiss_index
-from rag.retriever import retrieve_chunks
-from rag.embeddings import embed_texts
-from rag.prompt import build_prompt
+from rag.snapshots import SnapshotManager
+from rag.retriever import retrieve_chunks, embedded_query_vector
+from rag.answer_cache import answer_cache, is_neutral_conversation
+from rag.config import (
+    SNAPSHOT_POLL_SECONDS, CONTEXT_CANDIDATES, IVR_PID_PATH, EMBED_MAX_CONCURRENCY, WATCH_RATE_SHARE,
+)
+from rag import embedding_executor
+from rag.context import assemble_context
+from rag.prompt import build_prompt, detect_mode
+from rag.router import route_turn
 
 # Import Skill Sets
 from tools.booking_tools import BOOKING_TOOLS_LIST, BOOKING_FUNCTIONS
@@ -32,7 +40,7 @@ client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 INDEX_PATH = DATA_DIR / "hotel_knowledge.bin"
-META_PATH = DATA_DIR / "hotel_metadata.json"
+META_PATH = DATA_DIR / "hotel_knowledge.kb"
 
 # --- AGGREGATE SKILLS ---
 # The AI sees this list
@@ -40,18 +48,46 @@ ALL_TOOLS = BOOKING_TOOLS_LIST + HOTLINE_TOOLS_LIST
 # The Code executes these functions
 AVAILABLE_FUNCTIONS = {**BOOKING_FUNCTIONS, **HOTLINE_FUNCTIONS}
 
-index = None
+# The knowledge base is served through snapshots, so a rebuilt index can be
+# swapped in while calls are live (see rag/snapshots.py).
+knowledge_base = SnapshotManager(INDEX_PATH, META_PATH)
 conversation_history = [] 
 
 def get_ai_response(user_input):
-    global conversation_history, index
+    """Answers one guest turn. Yields the reply as text pieces while it streams in."""
+    global conversation_history
     
+    history_pairs = [(h["user"], h["assistant"]) for h in conversation_history]
+
     # 1. RAG Retrieval
-    retrieved = retrieve_chunks(user_input, index, lambda x: embed_texts([x]), top_k=3) if index else []
-    context = "\n\n".join(r["text"] for r in retrieved)
+    # Turns that only hand over data or confirm a step ("yes, confirm it") skip it.
+    # Queries are embedded with the same backend the knowledge base was built with.
+    # The snapshot is pinned for the search, so a reload cannot pull it away mid-query.
+    mode = detect_mode(user_input, history_pairs)
+    retrieved = []
+    q_vec = snapshot_version = cached = None
+    route = route_turn(user_input, mode, history_pairs)
+    if route["retrieve"]:
+        with knowledge_base.acquire() as index:
+            if index:
+                # Hotline requests only search their own category (e.g. Food -> the food PDF).
+                retrieved = retrieve_chunks(user_input, index, top_k=CONTEXT_CANDIDATES,
+                                            filters=route["filters"])
+                # FAQ-style questions outside a booking/hotline workflow may already
+                # have an answer generated from this very snapshot. The lookup reuses
+                # the vector dense retrieval just computed; a turn answered by BM25
+                # alone is never embedded just for the cache.
+                if is_neutral_conversation(user_input, history_pairs):
+                    q_vec = embedded_query_vector(user_input, index)
+                    snapshot_version = index.get("snapshot_version")
+                    cached = answer_cache.lookup(q_vec, snapshot_version)
+    if cached:
+        yield cached
+        return
+    # Overlapping and near-duplicate chunks are merged away before they cost prompt tokens.
+    context = assemble_context(retrieved)
     
-    history_pairs = [(h["user"], h["assistant"]) for h in conversation_history]
-    prompt_content = build_prompt(context, user_input, history_pairs)
+    prompt_content = build_prompt(context, user_input, history_pairs, mode=mode)
     
     # Inside get_ai_response function:
     messages = [
@@ -110,21 +146,48 @@ def get_ai_response(user_input):
                 "content": str(result)
             })
         
-        # Get final answer after tool usage
-        return client.chat.completions.create(model="gpt-4o-mini", messages=messages, stream=True)
+        # Get final answer after tool usage. Answers that involved tools are never cached.
+        q_vec = None
     
-    return client.chat.completions.create(model="gpt-4o-mini", messages=messages, stream=True)
+    stream = client.chat.completions.create(model="gpt-4o-mini", messages=messages, stream=True)
+    pieces = []
+    for chunk in stream:
+        content = chunk.choices[0].delta.content
+        if content:
+            pieces.append(content)
+            yield content
+
+    if q_vec is not None:
+        answer_cache.store(user_input, q_vec, "".join(pieces), snapshot_version)
+
+def remove_pid_file():
+    try:
+        if IVR_PID_PATH.read_text().strip() == str(os.getpid()):
+            IVR_PID_PATH.unlink()
+    except OSError:
+        pass
 
 def main():
-    global index
     init_db()  
+    # The knowledge-base watcher (rag/watcher.py) embeds with WATCH_RATE_SHARE of
+    # the account's rate limits; the IVR keeps to the rest so both fit together.
+    embedding_executor.throttle(1.0 - WATCH_RATE_SHARE, EMBED_MAX_CONCURRENCY)
     
-    if INDEX_PATH.exists():
-        index = load_faiss_index(str(INDEX_PATH), str(META_PATH))
-        print(" Knowledge Base Loaded.")
+    if INDEX_PATH.exists() and knowledge_base.reload():
+        print(f" Knowledge Base Loaded (snapshot {knowledge_base.version}).")
     else:
         print(" Warning: Knowledge base not found.")
 
+    # New snapshots are picked up by polling the files, or at once on SIGHUP.
+    knowledge_base.watch(SNAPSHOT_POLL_SECONDS)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda *_: knowledge_base.reload_async())
+        # Lets the knowledge-base watcher (rag/watcher.py) find us after a sync.
+        # The file is removed on exit, unless another IVR has taken it over since.
+        IVR_PID_PATH.parent.mkdir(parents=True, exist_ok=True)
+        IVR_PID_PATH.write_text(str(os.getpid()))
+        atexit.register(remove_pid_file)
+
     print("\n" + "-"*60)
     print("           GRAND BETOPIA HOTEL SYSTEM           ")
     print("      (Bookings & Guest Services Module Online)      ")
@@ -139,16 +202,12 @@ def main():
                 print("\nAlex: It was a pleasure serving you. Have a wonderful day!")
                 break
             
-            reply_stream = get_ai_response(u_input)
-            
             # --- SINGLE OUTPUT POINT ---
             print("\nAlex: ", end="", flush=True)
             full_reply = ""
-            for chunk in reply_stream:
-                content = chunk.choices[0].delta.content
-                if content:
-                    print(content, end="", flush=True)
-                    full_reply += content
+            for piece in get_ai_response(u_input):
+                print(piece, end="", flush=True)
+                full_reply += piece
             
             print() 
             conversation_history.append({"user": u_input, "assistant": full_reply})
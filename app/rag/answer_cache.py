@@ -0,0 +1,138 @@
+# app/rag/answer_cache.py
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+from .config import ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD
+from .prompt import detect_mode
+
+def is_neutral_conversation(question, history) -> bool:
+    """
+    True when neither the question nor the conversation so far is part of a
+    booking or hotline workflow, so the answer does not depend on the guest.
+    A first-turn "book a suite for tonight" is not neutral.
+    """
+    return detect_mode(question, history) == "general"
+
+class SemanticAnswerCache:
+    """
+    Remembers generated answers to FAQ-style questions, keyed by the question's
+    embedding. A new question whose vector is within 'threshold' cosine
+    similarity of a cached one gets the cached answer without a completion call.
+
+    Every entry belongs to the knowledge-base snapshot it was generated from;
+    the first lookup against a different snapshot empties the cache. Entries
+    expire after 'ttl' seconds and the least recently used are evicted first.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 6 * 3600, threshold: float = 0.95):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.snapshot_version = None
+        self._entries = OrderedDict()  # key -> (expires_at, question, answer)
+        self._vectors = {}             # key -> unit vector
+        self._matrix = None            # stacked vectors, rebuilt after changes
+        self._keys = []
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _sync_snapshot(self, snapshot_version):
+        if snapshot_version != self.snapshot_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._vectors.clear()
+            self._matrix = None
+            self.snapshot_version = snapshot_version
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        self._vectors.pop(key, None)
+        self._matrix = None
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype="float32")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector, snapshot_version):
+        """
+        Returns:
+            str: the cached answer closest to 'vector', or None.
+        """
+        if self.max_size <= 0 or vector is None:
+            return None
+        q = self._unit(vector)
+        with self._lock:
+            self._sync_snapshot(snapshot_version)
+            if self._entries and self._matrix is None:
+                self._keys = list(self._vectors)
+                self._matrix = np.vstack([self._vectors[k] for k in self._keys])
+            if self._matrix is None or self._matrix.shape[1] != q.shape[0]:
+                self.misses += 1
+                return None
+
+            # Every entry above the threshold, best first: an expired one is
+            # dropped and the next closest still gets its chance.
+            sims = self._matrix @ q
+            matches = np.flatnonzero(sims >= self.threshold)
+            now = time.monotonic()
+            for row in matches[np.argsort(-sims[matches])]:
+                key = self._keys[row]
+                expires_at, _, answer = self._entries[key]
+                if expires_at < now:
+                    self._drop(key)
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return answer
+            self.misses += 1
+            return None
+
+    def store(self, question, vector, answer, snapshot_version):
+        """Caches 'answer' for 'question' under the snapshot it was generated from."""
+        if self.max_size <= 0 or vector is None or not answer:
+            return
+        with self._lock:
+            self._sync_snapshot(snapshot_version)
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = (time.monotonic() + self.ttl, question, answer)
+            self._vectors[key] = self._unit(vector)
+            self._matrix = None
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+            self._matrix = None
+
+    def stats(self) -> dict:
+        """Hit rate of the cache: every hit is a completion call saved."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "invalidations": self.invalidations,
+                "snapshot_version": self.snapshot_version,
+            }
+
+# Shared by every session in this process.
+answer_cache = SemanticAnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD)
+
+def answer_cache_stats() -> dict:
+    """Monitoring hook: completions saved by the semantic answer cache."""
+    return answer_cache.stats()
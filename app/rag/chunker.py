@@ -1,41 +1,151 @@
 #  app/rag/chunker.py
-def chunk_text(text, chunk_size=500, chunk_overlap=100):
+import re
+from collections import namedtuple
+
+from .config import CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS
+from .utils import estimate_tokens
+
+# A unit is one sentence, or a whole line when the line has no sentence end
+# (headings, bullets, table rows). Chunks are only ever cut between units,
+# so never inside a word.
+_UNIT = re.compile(r"\S[^\n]*?(?:[.!?](?=\s)|$)", re.M)
+_WORD = re.compile(r"\S+")
+_NUMBERED_HEADING = re.compile(r"^(#{1,6}\s|\d{1,2}(\.\d{1,2})*[.)]?\s+\S)")
+_BULLET = re.compile(r"^([•●○◦▪▫■□‣⁃∙➢➤►✓✔*]|[-–]\s)")
+_LINE_END = re.compile(r"[.:;,!?)]$")
+
+# A line this short without closing punctuation is taken for a heading.
+HEADING_MAX_CHARS = 60
+
+# 'sep' is the whitespace between the previous unit and this one, so the units
+# of a chunk join back into exactly the source text between their offsets.
+Unit = namedtuple("Unit", "text start end sep tokens heading paragraph")
+
+def _pieces(source):
+    if isinstance(source, str):
+        yield source
+    else:
+        yield from source
+
+def _split_words(unit, max_tokens):
     """
-    Splits a long string into smaller overlapping segments (chunks).
-    
+    Cuts a unit longer than 'max_tokens' at word boundaries. The pieces are
+    slices of the unit by character offset: the whitespace between two pieces
+    becomes the second one's 'sep', and the last piece keeps the unit's
+    trailing whitespace, so they still join back into the source text.
+    """
+    part_start, part_sep, part_tokens, prev_end = None, unit.sep, 0, 0
+    for m in _WORD.finditer(unit.text):
+        tokens = estimate_tokens(m.group())
+        if part_start is not None and part_tokens + tokens > max_tokens:
+            yield unit._replace(text=unit.text[part_start:prev_end], start=unit.start + part_start,
+                                end=unit.start + prev_end, sep=part_sep, tokens=part_tokens)
+            part_start, part_sep, part_tokens = None, unit.text[prev_end:m.start()], 0
+            unit = unit._replace(heading=False, paragraph=False)
+        if part_start is None:
+            part_start = m.start()
+        part_tokens += tokens
+        prev_end = m.end()
+    if part_start is not None:
+        yield unit._replace(text=unit.text[part_start:], start=unit.start + part_start,
+                            end=unit.end, sep=part_sep, tokens=part_tokens)
+
+def iter_units(source, max_tokens=CHUNK_TOKENS):
+    """
+    Yields the Units of 'source' (a string, or an iterable of strings such as
+    pages) in order. Only the line being read is held in memory.
+    """
+    pieces = _pieces(source)
+    buffer, base, carry, first, done = "", 0, "", True, False
+    while not done:
+        piece = next(pieces, None)
+        if piece is None:
+            done, cut = True, len(buffer)
+        else:
+            buffer += piece
+            cut = buffer.rfind("\n") + 1
+            if not cut:
+                continue  # wait for the end of the line
+
+        pos = 0
+        for m in _UNIT.finditer(buffer, 0, cut):
+            sep, carry = carry + buffer[pos:m.start()], ""
+            text = m.group()
+            line_start = first or "\n" in sep
+            whole_line = m.end() == len(buffer) or buffer[m.end()] == "\n"
+            heading = line_start and not _BULLET.match(text) and bool(
+                _NUMBERED_HEADING.match(text)
+                or (whole_line and len(text) <= HEADING_MAX_CHARS and not _LINE_END.search(text))
+            )
+            unit = Unit(text, base + m.start(), base + m.end(), sep, estimate_tokens(text),
+                        heading, first or sep.count("\n") >= 2)
+            first, pos = False, m.end()
+            if unit.tokens > max_tokens:
+                yield from _split_words(unit, max_tokens)
+            else:
+                yield unit
+        carry += buffer[pos:cut]
+        buffer, base = buffer[cut:], base + cut
+
+def _chunk(units) -> dict:
+    text = units[0].text + "".join(u.sep + u.text for u in units[1:])
+    return {"text": text, "start": units[0].start, "end": units[-1].end}
+
+def _overlap(units, overlap_tokens):
+    """The trailing units of a chunk that fit in 'overlap_tokens' (never all of them)."""
+    kept, tokens = [], 0
+    for unit in reversed(units[1:]):
+        if tokens + unit.tokens > overlap_tokens:
+            break
+        kept.insert(0, unit)
+        tokens += unit.tokens
+    return kept
+
+def iter_chunks(source, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Splits text into chunks of at most 'max_tokens' tokens, cutting at
+    headings, paragraphs, bullets and sentence ends.
+
+    A heading or a new paragraph starts a new chunk once the current one is
+    reasonably full, and a heading is never left at the end of a chunk. When a
+    chunk is cut only because it is full, the next one repeats its last
+    sentences (up to 'overlap_tokens') so a fact spanning the cut stays whole.
+
     Args:
-        text (str): The full raw text extracted from PDFs or Images.
-        chunk_size (int): Max number of characters per chunk.
-        chunk_overlap (int): Number of characters to repeat from the previous chunk.
-    """
-    
-    # Initialize an empty list to store our final text segments
-    chunks = []
-    
-    # The 'start' variable acts as a cursor or pointer 
-    # indicating where the current slice begins.
-    start = 0
-    
-    # Continue looping as long as our starting cursor 
-    # hasn't reached the end of the full text.
-    while start < len(text):
-        
-        # Calculate the end position of the current chunk.
-        # Python slicing (text[start:end]) is 'exclusive' of the end index.
-        end = start + chunk_size
-        
-        # 'Slice' the string from the current start to the calculated end.
-        # This extracts a sub-string of approximately 'chunk_size' characters.
-        chunk = text[start:end]
-        
-        # Save this specific piece of text into our list.
-        chunks.append(chunk)
-        
-        # Move the 'start' cursor forward. 
-        # Instead of moving by the full chunk_size, we subtract the overlap.
-        # This ensures the next chunk begins 'chunk_overlap' characters 
-        # BEFORE the current one ended.
-        start += (chunk_size - chunk_overlap)
-        
-    # Return the completed list of segments to be converted into embeddings.
-    return chunks
+        source (str or iterable of str): The document, or its pages; the
+            pages are read one at a time, so a long document is never held
+            in memory as a whole.
+        max_tokens (int): Largest chunk, in embedding-model tokens.
+        overlap_tokens (int): Most tokens repeated from the previous chunk.
+
+    Yields:
+        dict: {'text', 'start', 'end'}; text == document[start:end], with
+        character offsets into the whole document.
+    """
+    chunk, tokens = [], 0
+    for unit in iter_units(source, max_tokens):
+        if chunk:
+            full = tokens + unit.tokens > max_tokens
+            section = ((unit.heading and tokens >= max_tokens // 4)
+                       or (unit.paragraph and tokens >= max_tokens // 2))
+            if full or section:
+                carried = [chunk.pop()] if len(chunk) > 1 and chunk[-1].heading else []
+                yield _chunk(chunk)
+                overlap = _overlap(chunk, overlap_tokens) if full and not carried else []
+                chunk = overlap + carried
+                tokens = sum(u.tokens for u in chunk)
+                while chunk and tokens + unit.tokens > max_tokens:
+                    tokens -= chunk.pop(0).tokens
+        chunk.append(unit)
+        tokens += unit.tokens
+    if chunk:
+        yield _chunk(chunk)
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Splits a long string into overlapping chunks (see iter_chunks).
+
+    Returns:
+        list: The chunk texts, in order.
+    """
+    return [chunk["text"] for chunk in iter_chunks(text, max_tokens, overlap_tokens)]
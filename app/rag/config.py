@@ -0,0 +1,212 @@
+# app/rag/config.py
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+# All RAG tuning knobs live here so they can be changed from the .env file
+# without touching the code. Every value has a sensible default.
+load_dotenv()
+
+def env_int(name: str, default: int) -> int:
+    """Reads an integer setting from the environment, falling back to the default."""
+    value = os.getenv(name)
+    try:
+        return int(value) if value not in (None, "") else default
+    except ValueError:
+        return default
+
+# --- PATHS ---
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DATA_DIR = BASE_DIR / "data"
+
+# The knowledge base is two files: the FAISS index and the memory-mapped
+# GBKB file with vectors, texts and metadata (see kb_format.py).
+INDEX_PATH = DATA_DIR / "hotel_knowledge.bin"
+KB_PATH = DATA_DIR / "hotel_knowledge.kb"
+# Pickle sidecar used before the GBKB format. Only read for migration.
+LEGACY_META_PATH = DATA_DIR / "hotel_metadata.json"
+# Source folders of the knowledge base (see sync.gather_files).
+PDF_DIR = DATA_DIR / "pdf"
+IMG_DIR = DATA_DIR / "images"
+# What the last sync saw in those folders (see sync.sync_documents).
+MANIFEST_PATH = DATA_DIR / "manifest.json"
+
+# --- INGESTION ---
+# PDF text is extracted by INGEST_WORKERS processes (0 = one per CPU core,
+# 1 = no pool). Files with more than PDF_PAGES_PER_TASK pages are split into
+# page ranges so one large file is spread over several processes too.
+INGEST_WORKERS = env_int("INGEST_WORKERS", 0)
+PDF_PAGES_PER_TASK = env_int("PDF_PAGES_PER_TASK", 16)
+# A full ingestion streams documents through extract -> chunk -> embed -> write
+# stages on separate threads; at most INGEST_QUEUE_SIZE items wait between two
+# stages. Chunks are embedded INGEST_EMBED_WINDOW at a time.
+INGEST_QUEUE_SIZE = env_int("INGEST_QUEUE_SIZE", 4)
+INGEST_EMBED_WINDOW = env_int("INGEST_EMBED_WINDOW", 512)
+# Sync confirms unchanged files by size, mtime and inode; files whose stat
+# changed are re-hashed by HASH_WORKERS threads.
+HASH_WORKERS = env_int("HASH_WORKERS", 4)
+
+# --- CHUNKING ---
+# Documents are cut into chunks of at most CHUNK_TOKENS tokens at headings,
+# bullets and sentence ends; a chunk cut only for size repeats up to
+# CHUNK_OVERLAP_TOKENS tokens of whole sentences from the one before it.
+CHUNK_TOKENS = env_int("CHUNK_TOKENS", 256)
+CHUNK_OVERLAP_TOKENS = env_int("CHUNK_OVERLAP_TOKENS", 32)
+# 1 adds the chunk count before/after text normalization to the ingest log.
+# That chunks every document twice more, so it is meant for tuning only.
+NORMALIZE_CHUNK_STATS = env_int("NORMALIZE_CHUNK_STATS", 0)
+
+# --- EMBEDDINGS ---
+# Which embedding backend builds the knowledge base; it is chosen once, per build:
+#   "openai" - OpenAI embeddings API (best quality, needs OPENAI_API_KEY and network)
+#   "local"  - hashed bag-of-words vectors computed with NumPy (offline, sub-millisecond)
+# There is no automatic fallback between them: a knowledge base is always queried
+# with the backend that built it (their vectors differ in space and size), so
+# switching backends means rebuilding with ingest.py.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+
+# Vector size of the local backend.
+LOCAL_EMBED_DIM = env_int("LOCAL_EMBED_DIM", 768)
+
+# "text-embedding-3-small" is fast and cost-effective.
+EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
+
+# Optional output size for text-embedding-3 models. 0 keeps the model's native size.
+EMBED_DIMENSIONS = env_int("EMBED_DIMENSIONS", 0)
+
+# How many chunks are packed into a single embeddings request (the API allows 2048).
+EMBED_BATCH_SIZE = env_int("EMBED_BATCH_SIZE", 128)
+
+# Token ceiling for one request. OpenAI rejects requests above 300k tokens in total,
+# so we stay well below that.
+EMBED_MAX_BATCH_TOKENS = env_int("EMBED_MAX_BATCH_TOKENS", 100_000)
+
+# --- EMBEDDING CACHE ---
+# Vectors are cached on disk by a hash of (model, dimensions, text), so a rebuild
+# only pays for chunks that actually changed. Set the size to 0 to disable it.
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", str(DATA_DIR / "embedding_cache.sqlite"))
+EMBED_CACHE_MAX_ENTRIES = env_int("EMBED_CACHE_MAX_ENTRIES", 200_000)
+
+# --- EMBEDDING CONCURRENCY & RETRIES ---
+# Batches are sent by a small thread pool. The rate limits should match your
+# OpenAI account tier; requests are paced so that neither limit is exceeded.
+EMBED_MAX_CONCURRENCY = env_int("EMBED_MAX_CONCURRENCY", 4)
+EMBED_REQUESTS_PER_MINUTE = env_int("EMBED_REQUESTS_PER_MINUTE", 3000)
+EMBED_TOKENS_PER_MINUTE = env_int("EMBED_TOKENS_PER_MINUTE", 1_000_000)
+
+# Retries for 429 / 5xx / connection errors, with exponential backoff (in seconds).
+EMBED_MAX_RETRIES = env_int("EMBED_MAX_RETRIES", 5)
+EMBED_BACKOFF_BASE = float(os.getenv("EMBED_BACKOFF_BASE", "0.5"))
+EMBED_BACKOFF_MAX = float(os.getenv("EMBED_BACKOFF_MAX", "30"))
+
+# --- QUERY EMBEDDING CACHE ---
+# Guest questions repeat a lot, so their vectors are kept in memory (per process).
+QUERY_CACHE_SIZE = env_int("QUERY_CACHE_SIZE", 2048)
+QUERY_CACHE_TTL = env_int("QUERY_CACHE_TTL", 24 * 3600)
+
+# --- IMAGE DESCRIPTIONS ---
+# Images become text through VISION_MODEL. Before upload they are downscaled so
+# the longer side is at most VISION_MAX_SIDE pixels (0 = send as is; needs
+# Pillow, without it images are sent unchanged) and re-encoded as JPEG at
+# VISION_JPEG_QUALITY (PNG if the image has transparency). Descriptions are
+# cached on disk by image content; VISION_CACHE_MAX_ENTRIES = 0 disables that.
+# VISION_MAX_CONCURRENCY images are described at the same time.
+VISION_MODEL = os.getenv("VISION_MODEL", "gpt-4o-mini")
+VISION_MAX_SIDE = env_int("VISION_MAX_SIDE", 1024)
+VISION_JPEG_QUALITY = env_int("VISION_JPEG_QUALITY", 85)
+VISION_CACHE_PATH = os.getenv("VISION_CACHE_PATH", str(DATA_DIR / "vision_cache.sqlite"))
+VISION_CACHE_MAX_ENTRIES = env_int("VISION_CACHE_MAX_ENTRIES", 10_000)
+VISION_MAX_CONCURRENCY = env_int("VISION_MAX_CONCURRENCY", 4)
+
+# --- SESSION UPLOADS ---
+# Memory cap (MB) for each session's in-memory upload index. Chunks beyond it
+# are left out of the index.
+SESSION_INDEX_MAX_MB = env_int("SESSION_INDEX_MAX_MB", 64)
+
+# --- SEMANTIC ANSWER CACHE ---
+# Generated answers to FAQ-style questions are reused for any later question
+# whose embedding is at least ANSWER_CACHE_THRESHOLD cosine-similar. Only turns
+# without tool calls in a neutral conversation are cached. 0 entries turns it off.
+# The question's vector comes from dense retrieval (via the query embedding
+# cache), so turns answered by BM25 alone skip it.
+ANSWER_CACHE_SIZE = env_int("ANSWER_CACHE_SIZE", 512)
+ANSWER_CACHE_TTL = env_int("ANSWER_CACHE_TTL", 6 * 3600)
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+# --- VECTOR INDEX ---
+# FAISS index type: "flat", "ivf_flat", "hnsw", "ivf_pq" or "auto".
+# "auto" uses exact search for small knowledge bases and switches to approximate
+# indexes as the number of chunks grows (see vector_store.choose_index_type).
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+
+# Deleted chunks are only marked (tombstoned) until this share of the index is
+# dead; then the store is compacted in the background.
+COMPACTION_TOMBSTONE_RATIO = float(os.getenv("COMPACTION_TOMBSTONE_RATIO", "0.2"))
+
+# How vectors are stored inside the FAISS index: "float32" (exact), "float16"
+# (half the memory) or "int8" (a quarter, scalar-quantized). With compressed
+# storage, the top RERANK_FACTOR * top_k candidates are re-scored exactly with
+# the float32 vectors kept (memory-mapped, not resident) in the KB file.
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "float32")
+RERANK_FACTOR = env_int("RERANK_FACTOR", 4)
+
+# --- RETRIEVAL ---
+# "dense" (vectors only), "lexical" (BM25 only, no embedding call) or "hybrid"
+# (both rankings fused with reciprocal-rank fusion).
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Candidates taken from each ranking before fusion, and the RRF constant.
+HYBRID_CANDIDATES = env_int("HYBRID_CANDIDATES", 20)
+RRF_K = env_int("RRF_K", 60)
+# Hybrid mode answers from BM25 alone (skipping the embedding call) when the
+# best lexical hit contains this share of the query's terms and outscores the
+# runner-up by this factor.
+LEXICAL_FAST_PATH_COVERAGE = float(os.getenv("LEXICAL_FAST_PATH_COVERAGE", "1.0"))
+LEXICAL_FAST_PATH_MARGIN = float(os.getenv("LEXICAL_FAST_PATH_MARGIN", "1.5"))
+# Filtered searches over a partition of at most this many rows scan just that
+# partition's vectors exactly; larger ones use the main index with a row filter.
+PARTITION_EXACT_MAX_ROWS = env_int("PARTITION_EXACT_MAX_ROWS", 50_000)
+
+# --- CONTEXT ASSEMBLY ---
+# Retrieved chunks are merged, de-duplicated and packed into at most
+# CONTEXT_TOKEN_BUDGET prompt tokens (0 = no limit). CONTEXT_CANDIDATES chunks
+# are retrieved to choose from. CONTEXT_MMR_LAMBDA trades relevance (1.0)
+# against diversity (0.0); passages more similar than CONTEXT_MAX_SIMILARITY
+# to one already chosen are dropped.
+CONTEXT_TOKEN_BUDGET = env_int("CONTEXT_TOKEN_BUDGET", 1000)
+CONTEXT_CANDIDATES = env_int("CONTEXT_CANDIDATES", 5)
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_MAX_SIMILARITY = float(os.getenv("CONTEXT_MAX_SIMILARITY", "0.8"))
+
+# --- TURN ROUTER ---
+# Skip knowledge retrieval on turns that only hand over data or confirm a step
+# ("my email is ...", "yes, confirm it"). ROUTER_MARGIN shifts unclear turns
+# towards retrieving (negative) or skipping (positive).
+ROUTER_ENABLED = env_int("ROUTER_ENABLED", 1)
+ROUTER_MARGIN = float(os.getenv("ROUTER_MARGIN", "0.0"))
+
+# --- SNAPSHOTS ---
+# How often (seconds) a running IVR checks the knowledge-base file for a new
+# snapshot and hot-swaps it in. 0 turns polling off (reload on SIGHUP only).
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "5"))
+# The IVR writes its process ID here so the watcher can ask it (SIGHUP) to
+# load a new snapshot right away.
+IVR_PID_PATH = Path(os.getenv("IVR_PID_PATH", str(DATA_DIR / "ivr.pid")))
+
+# --- KNOWLEDGE-BASE WATCHER ---
+# python -m app.rag.watcher re-syncs the knowledge base when files change in
+# PDF_DIR or IMG_DIR. WATCH_MODE is "poll" (stat every WATCH_POLL_SECONDS) or
+# "inotify" (Linux; woken by the kernel, still polls as a fallback). A sync
+# starts once nothing has changed for WATCH_DEBOUNCE_SECONDS.
+WATCH_MODE = os.getenv("WATCH_MODE", "poll")
+WATCH_POLL_SECONDS = float(os.getenv("WATCH_POLL_SECONDS", "2"))
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "5"))
+# The watcher runs at nice WATCH_NICE (and SCHED_IDLE where available), with
+# WATCH_WORKERS extraction processes and WATCH_EMBED_CONCURRENCY embedding (and Vision)
+# requests in flight, using at most WATCH_RATE_SHARE of the embedding rate
+# limits. The IVR (main.py) limits itself to the other 1 - WATCH_RATE_SHARE,
+# so the two processes together stay within EMBED_*_PER_MINUTE.
+WATCH_NICE = env_int("WATCH_NICE", 19)
+WATCH_WORKERS = env_int("WATCH_WORKERS", 1)
+WATCH_EMBED_CONCURRENCY = env_int("WATCH_EMBED_CONCURRENCY", 1)
+WATCH_RATE_SHARE = float(os.getenv("WATCH_RATE_SHARE", "0.25"))
+
@@ -0,0 +1,165 @@
+# app/rag/context.py
+from .config import CONTEXT_TOKEN_BUDGET, CONTEXT_MMR_LAMBDA, CONTEXT_MAX_SIMILARITY
+from .lexical import tokenize
+from .utils import estimate_tokens
+
+# Longest repeated span we look for between neighbouring chunks. The chunker
+# repeats at most CHUNK_OVERLAP_TOKENS tokens of whole sentences.
+MAX_OVERLAP_CHARS = 600
+
+def overlap_length(a: str, b: str, max_chars: int = MAX_OVERLAP_CHARS) -> int:
+    """Length of the longest suffix of 'a' that is also a prefix of 'b'."""
+    for size in range(min(len(a), len(b), max_chars), 0, -1):
+        if a.endswith(b[:size]):
+            return size
+    return 0
+
+def _passage_key(meta):
+    return meta.get("doc_id") or meta.get("source")
+
+def merge_passages(results):
+    """
+    Groups retrieved chunks by document and stitches neighbouring chunks
+    ('chunk' n and n + 1, or chunks whose ends overlap) into one passage.
+    Chunks contained in another chunk of the same document are dropped.
+
+    Returns:
+        list: passages as {'segments', 'metadata', 'rank'}, best rank first.
+        'segments' are the passage's chunks in document order, each with its
+        retrieval 'rank' and 'shared', the characters it repeats from the
+        segment before it.
+    """
+    groups = {}
+    for rank, r in enumerate(results):
+        groups.setdefault(_passage_key(r["metadata"]), []).append((rank, r))
+
+    passages = []
+    for items in groups.values():
+        items.sort(key=lambda item: item[1]["metadata"].get("chunk", item[0]))
+        current, last_chunk = None, None
+        for rank, r in items:
+            text, chunk = r["text"], r["metadata"].get("chunk")
+            if current is not None:
+                prev = current["segments"][-1]
+                container = next((seg for seg in current["segments"] if text in seg["text"]), None)
+                if container is not None:
+                    container["rank"] = min(container["rank"], rank)
+                    current["rank"] = min(current["rank"], rank)
+                    continue
+                shared = overlap_length(prev["text"], text)
+                if shared or (chunk is not None and last_chunk is not None and chunk == last_chunk + 1):
+                    current["segments"].append({"text": text, "rank": rank, "shared": shared})
+                    current["rank"] = min(current["rank"], rank)
+                    last_chunk = chunk
+                    continue
+                passages.append(current)
+            current = {"segments": [{"text": text, "rank": rank, "shared": 0}],
+                       "metadata": r["metadata"], "rank": rank}
+            last_chunk = chunk
+        passages.append(current)
+
+    passages.sort(key=lambda p: p["rank"])
+    return passages
+
+def passage_text(passage, keep=None) -> str:
+    """
+    The text of a passage, or of only the segments at positions 'keep'.
+    Consecutive segments are joined without their repeated text; a gap
+    between kept segments is marked with an ellipsis.
+    """
+    segments = passage["segments"]
+    keep = range(len(segments)) if keep is None else sorted(keep)
+    parts, prev = [], None
+    for i in keep:
+        seg = segments[i]
+        if prev is not None and i == prev + 1:
+            parts.append(seg["text"][seg["shared"]:])
+        else:
+            if prev is not None:
+                parts.append("\n...\n")
+            parts.append(seg["text"])
+        prev = i
+    return "".join(parts)
+
+def _similarity(a, b) -> float:
+    """Jaccard overlap of two token sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def select_diverse(passages, diversity=CONTEXT_MMR_LAMBDA, max_similarity=CONTEXT_MAX_SIMILARITY):
+    """
+    Orders passages by maximal marginal relevance: each pick trades its
+    retrieval rank against its similarity to what was already picked.
+    Passages nearly identical to an earlier pick are left out.
+    'diversity' is the MMR lambda (1.0 = rank only).
+    """
+    if not passages:
+        return []
+    n = len(passages)
+    tokens = [set(tokenize(passage_text(p))) for p in passages]
+    relevance = [1.0 - p["rank"] / max(n, 1) for p in passages]
+
+    chosen, remaining = [], list(range(n))
+    while remaining:
+        best, best_score, best_sim = None, None, 0.0
+        for i in remaining:
+            sim = max((_similarity(tokens[i], tokens[j]) for j in chosen), default=0.0)
+            score = diversity * relevance[i] - (1.0 - diversity) * sim
+            if best_score is None or score > best_score:
+                best, best_score, best_sim = i, score, sim
+        remaining.remove(best)
+        if best_sim <= max_similarity:
+            chosen.append(best)
+    return [passages[i] for i in chosen]
+
+def _truncate_to_budget(text: str, budget: int) -> str:
+    """Cuts 'text' at a word boundary so that it fits in 'budget' tokens."""
+    words = text.split(" ")
+    lo, hi = 0, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(" ".join(words[:mid])) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return " ".join(words[:lo])
+
+def assemble_context(results, token_budget=CONTEXT_TOKEN_BUDGET, diversity=CONTEXT_MMR_LAMBDA,
+                     max_similarity=CONTEXT_MAX_SIMILARITY):
+    """
+    Turns retrieve_chunks results into the knowledge-base section of the prompt:
+    neighbouring chunks are merged, repeated text is removed, near-duplicates
+    are skipped, and passages are packed in MMR order until 'token_budget'
+    tokens are used.
+
+    Args:
+        results (list): Output of retrieve_chunks, best first.
+        token_budget (int): Most tokens the context may take; 0 means no limit.
+        diversity (float): MMR lambda, see select_diverse.
+        max_similarity (float): Jaccard similarity above which a passage is a duplicate.
+
+    Returns:
+        str: The packed context.
+    """
+    passages = select_diverse(merge_passages(results), diversity, max_similarity)
+
+    packed, used = [], 0
+    for p in passages:
+        remaining = token_budget - used
+        text = passage_text(p)
+        if token_budget > 0 and estimate_tokens(text) > remaining:
+            # Too long as a whole: keep its best-ranked chunks that still fit.
+            keep = []
+            for i in sorted(range(len(p["segments"])), key=lambda i: p["segments"][i]["rank"]):
+                if estimate_tokens(passage_text(p, keep + [i])) <= remaining:
+                    keep.append(i)
+            text = passage_text(p, keep) if keep else ""
+            if not text and not packed:
+                # Even the best chunk is too long: keep as much of it as fits.
+                best = min(p["segments"], key=lambda seg: seg["rank"])
+                text = _truncate_to_budget(best["text"], token_budget)
+        if text:
+            packed.append(text)
+            used += estimate_tokens(text)
+    return "\n\n".join(packed)
@@ -0,0 +1,27 @@
+# app/rag/description_cache.py
+import hashlib
+
+from .sqlite_cache import SQLiteLRUCache
+
+def description_key(image_hash: str, model: str, prompt: str, max_side: int = 0) -> str:
+    """
+    Content address of an image description: the same image described by the
+    same model, with the same prompt and downscaling, always maps to the same
+    key, whatever the file is called.
+    """
+    h = hashlib.sha256()
+    h.update(f"{model}\0{max_side}\0{prompt}\0".encode("utf-8"))
+    h.update(image_hash.encode("utf-8"))
+    return h.hexdigest()
+
+class DescriptionCache(SQLiteLRUCache):
+    """
+    A size-bounded, on-disk store of Vision model descriptions backed by SQLite,
+    evicting the least recently used descriptions first.
+    """
+
+    table = "descriptions"
+    columns = (("description", "TEXT"),)
+
+    def __init__(self, path: str, max_entries: int = 10_000):
+        super().__init__(path, max_entries)
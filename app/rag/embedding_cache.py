@@ -0,0 +1,36 @@
+# app/rag/embedding_cache.py
+import hashlib
+import numpy as np
+
+from .sqlite_cache import SQLiteLRUCache
+
+def cache_key(text: str, model: str, dimensions: int = 0) -> str:
+    """
+    Content address of an embedding. The same chunk embedded by the same model
+    at the same size always maps to the same key, no matter which file it came from.
+    """
+    h = hashlib.sha256()
+    h.update(f"{model}\0{dimensions}\0".encode("utf-8"))
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+class EmbeddingCache(SQLiteLRUCache):
+    """
+    A size-bounded, on-disk store of embedding vectors backed by SQLite.
+
+    Vectors are stored as raw float32 bytes. When the cache grows past
+    'max_entries', the least recently used vectors are evicted first.
+    Hit/miss counters accumulate for the lifetime of the object.
+    """
+
+    table = "embeddings"
+    columns = (("dim", "INTEGER"), ("vector", "BLOB"))
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        super().__init__(path, max_entries)
+
+    def _encode(self, vec) -> tuple:
+        return len(vec), np.asarray(vec, dtype="float32").tobytes()
+
+    def _decode(self, row):
+        return np.frombuffer(row[1], dtype="float32")
@@ -0,0 +1,170 @@
+# app/rag/embedding_executor.py
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from openai import APIConnectionError
+
+from .config import (
+    EMBED_MAX_CONCURRENCY, EMBED_REQUESTS_PER_MINUTE, EMBED_TOKENS_PER_MINUTE,
+    EMBED_MAX_RETRIES, EMBED_BACKOFF_BASE, EMBED_BACKOFF_MAX,
+)
+
+def is_retryable(exc: Exception) -> bool:
+    """
+    Rate limits (429), server errors (5xx) and dropped connections are worth
+    retrying. Everything else (bad input, bad key) will fail the same way again.
+    """
+    if isinstance(exc, APIConnectionError):
+        return True
+    status = getattr(exc, "status_code", None)
+    return status == 429 or (status is not None and status >= 500)
+
+def retry_after(exc: Exception):
+    """Returns the server's 'Retry-After' hint in seconds, if it sent one."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class RateLimiter:
+    """
+    Paces requests against a requests-per-minute and a tokens-per-minute budget.
+
+    Both budgets are token buckets that refill continuously, so a burst can use
+    the whole minute's allowance but the long-run rate never exceeds the limit.
+    When the server still answers 429, 'pause' holds back every caller, not
+    just the one that got rejected.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.rpm = float(requests_per_minute)
+        self.tpm = float(tokens_per_minute)
+        self._requests = self.rpm
+        self._tokens = self.tpm
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def acquire(self, tokens: int = 0):
+        """Blocks until one request carrying 'tokens' tokens may be sent."""
+        # A single request larger than the whole budget can never fit, so it
+        # only waits for a full bucket.
+        tokens = min(tokens, self.tpm)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._requests >= 1 and self._tokens >= tokens:
+                        self._requests -= 1
+                        self._tokens -= tokens
+                        return
+                    wait = max(
+                        (1 - self._requests) * 60.0 / self.rpm,
+                        (tokens - self._tokens) * 60.0 / self.tpm,
+                    )
+            time.sleep(max(wait, 0.001))
+
+    def pause(self, seconds: float):
+        """Stops all callers from sending anything for 'seconds'."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+# One limiter per process: every embedding call shares the same account budget.
+rate_limiter = RateLimiter(EMBED_REQUESTS_PER_MINUTE, EMBED_TOKENS_PER_MINUTE)
+# Batches in flight per embedding call, unless the executor is given its own.
+default_concurrency = EMBED_MAX_CONCURRENCY
+
+def throttle(share: float, max_concurrency: int = 1):
+    """
+    Limits this process to 'share' of the account's rate limits and to
+    'max_concurrency' requests in flight. Each process has its own buckets, so
+    the shares of processes that run side by side must add up to at most 1:
+    the knowledge-base watcher takes WATCH_RATE_SHARE and the IVR (main.py)
+    the rest. Both call this once at start-up.
+    """
+    global rate_limiter, default_concurrency
+    share = min(max(share, 0.01), 1.0)
+    rate_limiter = RateLimiter(max(1, int(EMBED_REQUESTS_PER_MINUTE * share)),
+                               max(1, int(EMBED_TOKENS_PER_MINUTE * share)))
+    default_concurrency = max(1, max_concurrency)
+
+class EmbeddingExecutor:
+    """
+    Runs embedding batches on a bounded thread pool with retries.
+
+    'embed_batch' is any function that takes a list of texts and returns one
+    vector per text. Results always line up with the input: a text that could
+    not be embedded after every retry gets a None placeholder in its slot.
+    """
+
+    def __init__(self, embed_batch, count_tokens, max_concurrency=None, max_retries=None,
+                 limiter=None):
+        self.embed_batch = embed_batch
+        self.count_tokens = count_tokens
+        self.max_concurrency = max_concurrency or default_concurrency
+        self.max_retries = EMBED_MAX_RETRIES if max_retries is None else max_retries
+        self.limiter = limiter or rate_limiter
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        # Exponential backoff with full jitter, unless the server told us how long to wait.
+        hint = retry_after(exc)
+        if hint is not None:
+            return min(hint, EMBED_BACKOFF_MAX)
+        return random.uniform(0, min(EMBED_BACKOFF_MAX, EMBED_BACKOFF_BASE * (2 ** attempt)))
+
+    def _call_with_retry(self, texts):
+        """Embeds one batch, retrying transient failures. Raises the last error."""
+        tokens = sum(self.count_tokens(t) for t in texts)
+        attempt = 0
+        while True:
+            self.limiter.acquire(tokens)
+            try:
+                return self.embed_batch(texts)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                if getattr(e, "status_code", None) == 429:
+                    self.limiter.pause(delay)
+                attempt += 1
+                time.sleep(delay)
+
+    def _run_batch(self, batch):
+        try:
+            return self._call_with_retry(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                print(f"Error embedding text: {batch[0][:50]}... | {e}")
+                return [None]
+            # A batch that still fails may contain one bad chunk (e.g. too long).
+            # Retrying chunk by chunk keeps its neighbours.
+            print(f"Error embedding batch of {len(batch)} chunks, retrying individually | {e}")
+            return [v for t in batch for v in self._run_batch([t])]
+
+    def run(self, batches):
+        """
+        Embeds a sequence of batches concurrently.
+
+        Returns:
+            list: One vector (or None) per text, in the order the texts were given.
+        """
+        batches = list(batches)
+        if not batches:
+            return []
+        if len(batches) == 1 or self.max_concurrency <= 1:
+            return [v for b in batches for v in self._run_batch(b)]
+
+        # pool.map keeps the batch order, so flattening restores the input order.
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return [v for vectors in pool.map(self._run_batch, batches) for v in vectors]
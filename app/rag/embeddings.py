@@ -3,56 +3,216 @@ import numpy as np
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
+from .config import (
+    EMBEDDING_BACKEND, LOCAL_EMBED_DIM,
+    EMBED_MODEL, EMBED_DIMENSIONS, EMBED_BATCH_SIZE, EMBED_MAX_BATCH_TOKENS,
+    EMBED_CACHE_PATH, EMBED_CACHE_MAX_ENTRIES,
+)
+from .embedding_cache import EmbeddingCache, cache_key
+from .embedding_executor import EmbeddingExecutor
+from .local_embeddings import LocalHashEmbeddingBackend
+from .utils import estimate_tokens
 
 # 1. Configuration & Setup
 # load_dotenv() searches for a .env file to load your secret API keys into the system environment.
 load_dotenv()
 
-# We fetch the API key from the environment. This keeps your key safe and out of the source code.
-api_key = os.getenv("OPENAI_API_KEY")
+# Native vector sizes, used when no 'dimensions' is requested.
+MODEL_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
 
-# Safety Check: If the key is missing, the program stops immediately with a clear error message.
-if not api_key:
-    raise ValueError("OPENAI_API_KEY not found in environment. Please set it in .env file.")
+class OpenAIEmbeddingBackend:
+    """
+    Embeds text with the OpenAI embeddings API.
+
+    The client is created on first use, so importing this module never needs
+    an API key; only actually calling the API does.
+    """
+
+    name = "openai"
+    cacheable = True
+
+    def __init__(self, model: str = EMBED_MODEL, dimensions: int = EMBED_DIMENSIONS):
+        self.model = model
+        self.dimensions = dimensions
+        self._client = None
+
+    @property
+    def dim(self) -> int:
+        """Length of the vectors this backend returns."""
+        return self.dimensions or MODEL_DIMENSIONS.get(self.model, 1536)
+
+    @property
+    def client(self):
+        if self._client is None:
+            # We fetch the API key from the environment. This keeps your key safe and out of the source code.
+            api_key = os.getenv("OPENAI_API_KEY")
+            # Safety Check: If the key is missing, we stop with a clear error message.
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY not found in environment. Please set it in .env file.")
+            # The client's own retries are turned off: EmbeddingExecutor retries with backoff and
+            # paces every request against the account's rate limit.
+            self._client = OpenAI(api_key=api_key, max_retries=0)
+        return self._client
+
+    def embed_batch(self, batch):
+        """Sends one embeddings request and returns the vectors in input order."""
+        params = {"model": self.model, "input": batch}
+        if self.dimensions:
+            params["dimensions"] = self.dimensions
+        resp = self.client.embeddings.create(**params)
+        # The API tags every vector with the position of its input, so we sort
+        # on that instead of trusting the order of the response list.
+        return [np.array(d.embedding, dtype="float32") for d in sorted(resp.data, key=lambda d: d.index)]
+
+    def embed(self, texts, batch_size=None, max_batch_tokens=None):
+        """
+        Sends texts to the API in batches, several requests at a time.
+
+        Returns:
+            list: One entry per text, in order. Texts that could not be embedded are None.
+        """
+        executor = EmbeddingExecutor(self.embed_batch, estimate_tokens)
+        return executor.run(iter_batches(texts, batch_size, max_batch_tokens))
+
+# 2. Backend Registry
+# Backends are created once per process and selected by name (EMBEDDING_BACKEND in .env).
+BACKENDS = {
+    "openai": OpenAIEmbeddingBackend,
+    "local": lambda: LocalHashEmbeddingBackend(LOCAL_EMBED_DIM),
+}
+_backends = {}
+
+def get_backend(name=None):
+    """
+    Returns the embedding backend called 'name' (default: EMBEDDING_BACKEND).
+
+    Every backend has a 'name', a 'cacheable' flag and an 'embed(texts)' method
+    that returns one vector (or None) per text. Backends are selected, not
+    chained: when one fails, its texts come back as None; no other backend is tried.
+    """
+    name = (name or EMBEDDING_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
+
+# The on-disk embedding cache is opened on first use and shared by the whole process.
+_cache = None
+
+def get_embedding_cache():
+    """Returns the shared EmbeddingCache, or None when caching is disabled."""
+    global _cache
+    if _cache is None and EMBED_CACHE_MAX_ENTRIES > 0:
+        _cache = EmbeddingCache(EMBED_CACHE_PATH, EMBED_CACHE_MAX_ENTRIES)
+    return _cache
+
+def reset_cache_stats():
+    """Zeroes the cache counters so the next report covers a single rebuild."""
+    cache = get_embedding_cache()
+    if cache is not None:
+        cache.reset_stats()
 
-# 2. Client Initialization
-# Create an instance of the OpenAI class. This object handles the connection to OpenAI's servers.
-client = OpenAI(api_key=api_key)
+def format_cache_stats():
+    """One-line summary of the cache counters, printed after every rebuild."""
+    cache = get_embedding_cache()
+    if cache is None:
+        return "Embedding cache disabled."
+    s = cache.stats()
+    return (f"Embedding cache: {s['hits']} hits, {s['misses']} misses "
+            f"({s['hit_rate']:.0%} reused), {s['entries']}/{s['max_entries']} entries, "
+            f"{s['evictions']} evicted.")
 
-def embed_texts(texts):
+def iter_batches(texts, batch_size=None, max_batch_tokens=None):
+    """
+    Groups texts into request-sized batches, keeping their original order.
+
+    A batch is closed as soon as adding the next text would exceed either
+    'batch_size' texts or 'max_batch_tokens' tokens. A single text that is larger
+    than the token ceiling on its own still gets a batch of its own.
+
+    Yields:
+        list[str]: Consecutive slices of 'texts'.
+    """
+    batch_size = batch_size or EMBED_BATCH_SIZE
+    max_batch_tokens = max_batch_tokens or EMBED_MAX_BATCH_TOKENS
+
+    batch, batch_tokens = [], 0
+    for t in texts:
+        tokens = estimate_tokens(t)
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(t)
+        batch_tokens += tokens
+
+    if batch:
+        yield batch
+
+def embed_texts(texts, batch_size=None, max_batch_tokens=None, use_cache=True, backend=None):
     """
     Converts a list of text chunks into numerical vectors (embeddings).
 
+    The backend is chosen by the EMBEDDING_BACKEND setting unless one is passed in.
+    For the OpenAI backend, vectors are looked up in the on-disk embedding cache
+    first; only the misses are sent to the API, packed into batches (see
+    'iter_batches') so that rebuilding the knowledge base costs a handful of
+    requests instead of one per chunk.
+
     Args:
         texts (list[str]): The text pieces created by your chunking function.
+        batch_size (int): Max chunks per request (defaults to EMBED_BATCH_SIZE).
+        max_batch_tokens (int): Max tokens per request (defaults to EMBED_MAX_BATCH_TOKENS).
+        use_cache (bool): Set to False to bypass the embedding cache.
+        backend (str): Backend name, e.g. "openai" or "local".
 
     Returns:
-        list[np.ndarray]: A list of vectors representing the meaning of the text.
+        list[np.ndarray]: One vector per text, in the same order as 'texts'.
+        A text that could not be embedded after all retries is None, so
+        position i always belongs to texts[i].
     """
-    
-    # Initialize an empty list to store the numerical vectors.
-    embeddings = []
+    texts = list(texts)
+    backend = get_backend(backend)
+    if not backend.cacheable:
+        return backend.embed(texts)
 
-    # 3. Processing the Chunks
-    # We loop through every single text chunk in the list.
-    for t in texts:
-        try:
-            # Request a 'vector' from the OpenAI API.
-            # We use "text-embedding-3-small", which is fast and cost-effective.
-            resp = client.embeddings.create(
-                model="text-embedding-3-small",
-                input=t
-            )
-            
-            # The API returns a list of floats. We convert this into a 'numpy array' 
-            # (np.array) because FAISS (your vector store) requires numpy format for fast math.
-            vector = np.array(resp.data[0].embedding)
-            embeddings.append(vector)
-            
-        except Exception as e:
-            # If the internet fails or the API crashes, we print a snippet of the 
-            # text that failed so you can troubleshoot without crashing the whole bot.
-            print(f"Error embedding text: {t[:50]}... | {e}")
+    # 3. Cache Lookup
+    # Each chunk is addressed by a hash of its text, the model and the vector size.
+    cache = get_embedding_cache() if use_cache else None
+    keys = [cache_key(t, backend.model, backend.dimensions) for t in texts]
+    cached = cache.get_many(keys) if cache is not None else {}
+
+    # 4. Embed the Misses
+    # Identical chunks (e.g. repeated headers) are only sent once.
+    pending = {}
+    for key, t in zip(keys, texts):
+        if key not in cached:
+            pending.setdefault(key, t)
+    fresh = dict(zip(pending, backend.embed(list(pending.values()), batch_size, max_batch_tokens)))
+
+    if cache is not None:
+        cache.put_many((k, v) for k, v in fresh.items() if v is not None)
+
+    # 5. Reassemble in input order
+    embeddings = [cached[k] if k in cached else fresh[k] for k in keys]
 
     # Return the list of numerical vectors to be stored in the FAISS index.
     return embeddings
+
+def drop_failed(vectors, *columns):
+    """
+    Removes the entries whose embedding failed from 'vectors' and from every
+    list aligned with it (texts, metadatas, ...).
+
+    Returns:
+        tuple: (vectors, *columns), all filtered the same way.
+    """
+    keep = [i for i, v in enumerate(vectors) if v is not None]
+    failed = len(vectors) - len(keep)
+    if failed:
+        print(f" Warning: {failed} chunk(s) could not be embedded and were left out.")
+    return tuple([col[i] for i in keep] for col in (vectors,) + columns)
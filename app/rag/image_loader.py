@@ -1,53 +1,126 @@
 # app/rag/image_loader.py
 import base64
+import io
+import logging
+import mimetypes
+import os
+import threading
+from .config import (
+    VISION_MODEL, VISION_MAX_SIDE, VISION_JPEG_QUALITY, VISION_CACHE_PATH, VISION_CACHE_MAX_ENTRIES,
+)
+from .description_cache import DescriptionCache, description_key
+from .utils import file_hash
 
-def encode_image(path):
+# Pillow (in requirements.txt) shrinks images before upload. Should it be
+# missing, images are uploaded exactly as they are on disk.
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+VISION_PROMPT = ("Describe this image clearly for knowledge retrieval. "
+                 "Focus on any text, data, or company facts visible.")
+
+_cache = None
+# Upload volume since the last reset_vision_stats: images sent, and their size
+# on disk versus after downscaling.
+_stats = {"images": 0, "bytes_original": 0, "bytes_sent": 0}
+_stats_lock = threading.Lock()
+_warned_no_pillow = False
+
+def image_mime_type(data: bytes, path: str = "") -> str:
+    """The MIME type of an image, from its first bytes (the file extension as a fallback)."""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return mimetypes.guess_type(path)[0] or "image/png"
+
+def prepare_image(path, max_side=VISION_MAX_SIDE, quality=VISION_JPEG_QUALITY):
     """
-    Computers and APIs cannot 'see' a file on your hard drive directly. 
-    We must convert the binary image file into a Base64 string (a long string of text)
-    so it can be sent inside a standard JSON API request.
+    Reads an image and makes it cheap to upload: with Pillow installed, it is
+    shrunk so its longer side is at most 'max_side' pixels and re-encoded as
+    JPEG (PNG if it has transparency). The Vision model scales large images
+    down on its side anyway, so the full resolution only costs upload time.
+    The original bytes are kept whenever the result would not be smaller.
+
+    Returns:
+        tuple: (image bytes, MIME type)
     """
-    # 'rb' stands for 'read binary' - necessary for non-text files like images
-    with open(path, "rb") as image_file:
-        # 1. Read the raw bytes
-        # 2. Encode those bytes into base64 format
-        # 3. Decode into a UTF-8 string so it can be handled as text
-        return base64.b64encode(image_file.read()).decode('utf-8')
+    with open(path, "rb") as f:
+        data = f.read()
+    mime = image_mime_type(data, path)
+    if Image is None and max_side > 0:
+        global _warned_no_pillow
+        if not _warned_no_pillow:
+            _warned_no_pillow = True
+            logger.warning("Pillow is not installed; images are uploaded at full size "
+                           "(pip install -r requirements.txt).")
+    if Image is None or max_side <= 0:
+        return data, mime
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.thumbnail((max_side, max_side))
+            out = io.BytesIO()
+            if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+                img.save(out, "PNG", optimize=True)
+                out_mime = "image/png"
+            else:
+                img.convert("RGB").save(out, "JPEG", quality=quality, optimize=True)
+                out_mime = "image/jpeg"
+    except Exception:
+        # Not something Pillow can read; let the API decide.
+        return data, mime
+
+    if out.tell() < len(data):
+        return out.getvalue(), out_mime
+    return data, mime
 
 def image_to_text(image_path, client):
     """
     This function sends the image to OpenAI's Vision model (GPT-4o-mini)
-    and asks the AI to describe it. This description becomes the 'text' 
+    and asks the AI to describe it. This description becomes the 'text'
     version of the image for your RAG database.
-    
+
     Args:
         image_path (str): The local path to your image (e.g., 'data/images/chart.png')
         client: Your initialized OpenAI client
     """
-    
-    # First, convert the image file into a sendable string format
-    image_base64 = encode_image(image_path)
+
+    # First, shrink the image and convert it into a sendable string format
+    data, mime = prepare_image(image_path)
+    image_base64 = base64.b64encode(data).decode("utf-8")
+    with _stats_lock:
+        _stats["images"] += 1
+        _stats["bytes_sent"] += len(data)
+        _stats["bytes_original"] += os.path.getsize(image_path)
 
     # Call the GPT-4o-mini Vision model
     response = client.chat.completions.create(
-        model="gpt-4o-mini",
+        model=VISION_MODEL,
         messages=[
             {
                 "role": "user",
                 "content": [
                     # Content item 1: The instruction (Prompt)
                     {
-                        "type": "text", 
-                        "text": "Describe this image clearly for knowledge retrieval. "
-                                "Focus on any text, data, or company facts visible."
+                        "type": "text",
+                        "text": VISION_PROMPT
                     },
                     # Content item 2: The actual image data
                     {
                         "type": "image_url",
                         "image_url": {
-                            # We create a 'Data URL' which tells the API the format 
-                            # and includes the encoded image string.
-                            "url": f"data:image/png;base64,{image_base64}"
+                            # We create a 'Data URL' which tells the API the format
+                            # (the real one, e.g. image/jpeg) and includes the encoded image string.
+                            "url": f"data:{mime};base64,{image_base64}"
                         }
                     }
                 ]
@@ -58,4 +131,51 @@ def image_to_text(image_path, client):
     )
 
     # Extract the AI's description of the image and clean up whitespace
-    return response.choices[0].message.content.strip()
\ No newline at end of file
+    return response.choices[0].message.content.strip()
+
+def get_description_cache():
+    """Returns the shared DescriptionCache, or None when caching is disabled."""
+    global _cache
+    if _cache is None and VISION_CACHE_MAX_ENTRIES > 0:
+        _cache = DescriptionCache(VISION_CACHE_PATH, VISION_CACHE_MAX_ENTRIES)
+    return _cache
+
+def describe_image(image_path, client, image_hash=None):
+    """
+    Like image_to_text, but an image whose content was described before (under
+    any file name) is answered from the description cache without a Vision call.
+    """
+    cache = get_description_cache()
+    if cache is None:
+        return image_to_text(image_path, client)
+
+    # The key covers everything that shapes the answer: the pixels, the model,
+    # the prompt and how far the image is shrunk before upload.
+    max_side = VISION_MAX_SIDE if Image is not None else 0
+    key = description_key(image_hash or file_hash(image_path), VISION_MODEL, VISION_PROMPT, max_side)
+    cached = cache.get_many([key])
+    if key in cached:
+        return cached[key]
+    text = image_to_text(image_path, client)
+    cache.put(key, text)
+    return text
+
+def reset_vision_stats():
+    """Zeroes the upload and cache counters so the next report covers a single rebuild."""
+    with _stats_lock:
+        _stats.update(images=0, bytes_original=0, bytes_sent=0)
+    cache = get_description_cache()
+    if cache is not None:
+        cache.reset_stats()
+
+def format_vision_stats():
+    """One-line summary of the image work, printed after images are loaded."""
+    with _stats_lock:
+        s = dict(_stats)
+    line = (f"Image descriptions: {s['images']} requested, uploading {s['bytes_sent'] / 1024:.0f} KB "
+            f"of {s['bytes_original'] / 1024:.0f} KB on disk")
+    cache = get_description_cache()
+    if cache is None:
+        return line + "; description cache disabled."
+    c = cache.stats()
+    return line + f"; {c['hits']} served from cache, {c['entries']}/{c['max_entries']} entries."
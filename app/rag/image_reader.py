@@ -1,10 +1,73 @@
 # app/rag/image_reader.py
 import os
-from .image_loader import image_to_text
+from concurrent.futures import ThreadPoolExecutor
+from .config import VISION_MAX_CONCURRENCY
+from .image_loader import describe_image, format_vision_stats, reset_vision_stats
+from .utils import file_hash
 
 # Define which image formats the OpenAI Vision model can process
 SUPPORTED_EXT = (".png", ".jpg", ".jpeg", ".webp")
 
+# Images described at the same time. Background jobs (the knowledge-base
+# watcher) lower this so live calls keep most of the API budget.
+vision_concurrency = VISION_MAX_CONCURRENCY
+
+def load_images_text(paths, client, max_workers=None):
+    """
+    Converts the given images into text descriptions. Images described before
+    come from the description cache; the rest are sent to the Vision model
+    'max_workers' at a time (default: vision_concurrency).
+
+    Args:
+        paths (list): Paths of the images to describe.
+        client: The initialized OpenAI client.
+
+    Returns:
+        list: A list of dictionaries containing the text, the filename and the path.
+        An image that could not be described (e.g. no client, or the API call
+        failed) is reported and left out, so a sync tries it again next time.
+    """
+    paths = list(paths)
+    if not paths:
+        return []
+    reset_vision_stats()
+
+    # Identical images (e.g. the same logo under two names) are described once.
+    hashes = [file_hash(path) for path in paths]
+    unique = dict(zip(hashes, paths))
+    workers = max(1, min(max_workers or vision_concurrency, len(unique)))
+
+    def describe(image_hash):
+        # Use the image_loader to get a text description from GPT-4o-mini
+        # (or from the cache, keyed by the same content hash as the document)
+        try:
+            return describe_image(unique[image_hash], client, image_hash=image_hash)
+        except Exception as e:
+            print(f" Could not describe {os.path.basename(unique[image_hash])}: {e}")
+            return None
+
+    # pool.map keeps the input order; one failed image does not stop the others.
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        texts = dict(zip(unique, pool.map(describe, unique)))
+
+    documents = []
+    for path, image_hash in zip(paths, hashes):
+        file = os.path.basename(path)
+        print(f" Loading image: {file}")
+        if texts[image_hash] is None:
+            continue
+
+        # Store the result as a dictionary
+        # Keeping the 'source' allows the bot to cite its sources later
+        documents.append({
+            "text": texts[image_hash],
+            "source": file,
+            "path": path,
+            "doc_id": image_hash
+        })
+    print(f" {format_vision_stats()}")
+    return documents
+
 def load_all_images_text(image_dir, client):
     """
     Scans a folder for images and converts them into text descriptions.
@@ -16,30 +79,12 @@ def load_all_images_text(image_dir, client):
     Returns:
         list: A list of dictionaries containing the text and the filename.
     """
-    documents = []
-
     # 1. Check if the directory exists to prevent the app from crashing
     if not os.path.exists(image_dir):
         print(f" Warning: Image directory not found: {image_dir}")
-        return documents
+        return []
 
-    # 2. Loop through every file inside the folder
-    for file in os.listdir(image_dir):
-        
-        # 3. Only process files with supported image extensions
-        if file.lower().endswith(SUPPORTED_EXT):
-            path = os.path.join(image_dir, file)
-            print(f" Loading image: {file}")
-
-            # 4. Use the image_loader to get a text description from GPT-4o-mini
-            text = image_to_text(path, client)
-
-            # 5. Store the result as a dictionary
-            # Keeping the 'source' allows the bot to cite its sources later
-            documents.append({
-                "text": text,
-                "source": file
-            })
-
-    # Return the full list of image-based descriptions
-    return documents
\ No newline at end of file
+    # 2. Only process files with supported image extensions
+    paths = [os.path.join(image_dir, file) for file in os.listdir(image_dir)
+             if file.lower().endswith(SUPPORTED_EXT)]
+    return load_images_text(paths, client)
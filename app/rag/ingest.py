@@ -1,34 +1,98 @@
 # app/rag/ingest.py
 import os
+import sys
 from pathlib import Path
-import PyPDF2
-from app.rag.embeddings import embed_texts
-from app.rag.vector_store import create_faiss_index, save_faiss_index
+from app.rag.embeddings import embed_texts, drop_failed, format_cache_stats, get_backend
+from app.rag.vector_store import load_faiss_index, MutableVectorStore, StreamingIndexBuilder
+from app.rag.config import INDEX_PATH, KB_PATH, INGEST_QUEUE_SIZE, INGEST_EMBED_WINDOW
+from app.rag.utils import file_hash, source_category
+from app.rag.chunker import iter_chunks
+from app.rag.pdf_loader import extract_pdf_pages, iter_pdf_pages
+from app.rag.pipeline import run_stage
+from app.rag.text_normalize import normalize_pages, normalization_stats, format_normalization_stats
 
 # Paths setup
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 PDF_DIR = BASE_DIR / "data" / "pdf"
 DATA_DIR = BASE_DIR / "data"
 
-def extract_text_from_pdf(pdf_path):
-    """Helper function to extract all text from a PDF file."""
-    text = ""
-    try:
-        with open(pdf_path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-    except Exception as e:
-        print(f" Could not read {pdf_path.name}: {e}")
+def normalized_text(pdf_path, pages):
+    """A PDF's normalized text from its page texts, with the before/after report."""
+    text = normalize_pages(pages or [])
+    if text:
+        stats = normalization_stats("\n".join(pages), text)
+        print(f"   {format_normalization_stats(pdf_path.name, stats)}")
     return text
 
+def extract_texts_from_pdfs(pdf_paths):
+    """
+    Extracts the (normalized) text of several PDF files at once. Files and
+    the pages of large files are spread over INGEST_WORKERS processes.
+
+    Returns:
+        dict: path -> text ('' if the file could not be read).
+    """
+    return {pdf_path: normalized_text(pdf_path, pages)
+            for pdf_path, pages in extract_pdf_pages(pdf_paths).items()}
+
+def extract_text_from_pdf(pdf_path):
+    """Helper function to extract all (normalized) text from a PDF file."""
+    return extract_texts_from_pdfs([pdf_path])[pdf_path]
+
+# --- INGESTION STAGES ---
+# run_ingestion chains these generators with pipeline.run_stage, so PDFs are
+# extracted, chunked, embedded and written at the same time, and only a few
+# documents' worth of data is in memory however large the corpus is.
+
+def document_chunks(documents):
+    """
+    Normalizes and chunks each extracted document.
+
+    Yields:
+        list: (text, metadata) pairs, one list per document.
+    """
+    for pdf_path, pages in documents:
+        print(f" Processing: {pdf_path.name}")
+        content = normalized_text(pdf_path, pages)
+        if not content.strip():
+            continue
+        # The content hash identifies the document for later per-file updates.
+        doc_id = file_hash(pdf_path)
+        yield [
+            (chunk["text"], {
+                "source": pdf_path.name, "category": source_category(pdf_path.name),
+                "chunk": i, "char_start": chunk["start"], "char_end": chunk["end"], "doc_id": doc_id,
+            })
+            for i, chunk in enumerate(iter_chunks(content))
+        ]
+
+def embedded_batches(chunk_lists, window=INGEST_EMBED_WINDOW):
+    """
+    Embeds chunks about 'window' at a time. embed_texts packs each window into
+    batched requests, sent concurrently, so chunks from several PDFs share the
+    same few round trips.
+
+    Yields:
+        tuple: (vectors, texts, metadatas) with failed chunks already dropped.
+    """
+    pending = []
+
+    def embed(items):
+        texts = [text for text, _ in items]
+        metadatas = [meta for _, meta in items]
+        # embed_texts keeps one slot per chunk; failed chunks are dropped together
+        # with their text and metadata so every vector stays paired with its text.
+        return drop_failed(embed_texts(texts), texts, metadatas)
+
+    for chunks in chunk_lists:
+        pending.extend(chunks)
+        if len(pending) >= window:
+            yield embed(pending)
+            pending = []
+    if pending:
+        yield embed(pending)
+
 def run_ingestion():
-    all_vectors = []
-    all_texts = []
-    all_metadatas = []
-    
     # Check if PDF directory exists
     if not PDF_DIR.exists():
         print(f" PDF folder not found at: {PDF_DIR}")
@@ -41,40 +105,89 @@ def run_ingestion():
         print(" No PDF files found in data/pdf/.")
         return
 
-    for pdf_path in pdf_files:
-        print(f" Processing: {pdf_path.name}")
-        content = extract_text_from_pdf(pdf_path)
-        
-        if content.strip():
-            # Chunking logic: 1500 chars with 300 char overlap
-            text_chunks = [content[i:i+1500] for i in range(0, len(content), 1200)]
-            
-            # Generate embeddings for these chunks via your embeddings.py
-            chunk_vectors = embed_texts(text_chunks)
-            
-            for i, chunk_text in enumerate(text_chunks):
-                all_vectors.append(chunk_vectors[i])
-                all_texts.append(chunk_text)
-                all_metadatas.append({"source": pdf_path.name, "chunk": i})
-
-    if not all_vectors:
+    # Note: DATA_DIR must exist, the knowledge base is written there as it grows
+    DATA_DIR.mkdir(exist_ok=True)
+    # The vector size is taken from the first embedded batch, not from the
+    # backend's guess for its model.
+    builder = StreamingIndexBuilder(INDEX_PATH, KB_PATH, embedding_backend=get_backend().name)
+
+    # extract (process pool) -> normalize + chunk -> embed (batched) -> write
+    documents = run_stage(iter_pdf_pages(pdf_files), INGEST_QUEUE_SIZE, "extract")
+    chunk_lists = run_stage(document_chunks(documents), INGEST_QUEUE_SIZE, "chunk")
+    batches = run_stage(embedded_batches(chunk_lists), INGEST_QUEUE_SIZE, "embed")
+    try:
+        for vectors, texts, metadatas in batches:
+            builder.add(vectors, texts, metadatas)
+            print(f" Embedded and stored {builder.count} segments...")
+    except BaseException:
+        builder.abort()
+        raise
+    print(f" {format_cache_stats()}")
+
+    if not builder.count:
+        builder.abort()
         print(" No text extracted from PDFs.")
         return
 
-    # 1. Create the index bundle (Returns dictionary with faiss, texts, metadatas)
-    print(f" Creating search index for {len(all_texts)} segments...")
-    index_bundle = create_faiss_index(all_vectors, all_texts, all_metadatas)
+    # Build the search indexes over the stored vectors and texts, and save both files
+    print(f" Creating search index for {builder.count} segments...")
+    params = builder.finish()
+    print(f" Index type: {params['factory']}")
 
-    # 2. Save the index and pickle metadata using your save_faiss_index function
-    # Note: DATA_DIR must exist
-    DATA_DIR.mkdir(exist_ok=True)
-    
-    index_path = str(DATA_DIR / "hotel_knowledge.bin")
-    meta_path = str(DATA_DIR / "hotel_metadata.json") # Your vector_store uses pickle, this name is fine.
-    
-    save_faiss_index(index_bundle, index_path, meta_path)
-    
     print(f"\n SUCCESS! Knowledge base is ready for Alex.")
 
+def update_documents(pdf_paths):
+    """
+    Re-ingests only the given PDFs into the saved knowledge base: their old
+    chunks are deleted and the new ones added, everything else is left alone.
+    A path that no longer exists removes that document.
+    """
+    bundle = load_faiss_index(str(INDEX_PATH), str(KB_PATH))
+    if bundle is None:
+        print(" No knowledge base yet, running a full ingestion.")
+        return run_ingestion()
+    store = MutableVectorStore(bundle)
+
+    changed = []  # (path, new doc_id, old doc_ids)
+    for pdf_path in map(Path, pdf_paths):
+        old_ids = store.doc_ids_for_source(pdf_path.name)
+
+        if not pdf_path.exists():
+            for doc_id in old_ids:
+                store.delete_document(doc_id)
+            print(f" Removed: {pdf_path.name}")
+            continue
+
+        doc_id = file_hash(pdf_path)
+        if old_ids == [doc_id]:
+            print(f" Unchanged: {pdf_path.name}")
+            continue
+        changed.append((pdf_path, doc_id, old_ids))
+
+    contents = extract_texts_from_pdfs([pdf_path for pdf_path, _, _ in changed])
+    for pdf_path, doc_id, old_ids in changed:
+        print(f" Processing: {pdf_path.name}")
+        chunks = list(iter_chunks(contents[pdf_path]))
+        text_chunks = [chunk["text"] for chunk in chunks]
+        metadatas = [
+            {"source": pdf_path.name, "category": source_category(pdf_path.name), "chunk": i,
+             "char_start": chunk["start"], "char_end": chunk["end"]}
+            for i, chunk in enumerate(chunks)
+        ]
+        vectors, text_chunks, metadatas = drop_failed(embed_texts(text_chunks), text_chunks, metadatas)
+
+        for old_id in old_ids:
+            store.delete_document(old_id)
+        store.add_document(doc_id, vectors, text_chunks, metadatas)
+
+    print(f" {format_cache_stats()}")
+    store.save(str(INDEX_PATH), str(KB_PATH))
+    print(f"\n SUCCESS! Knowledge base now holds {store.live_count} segments.")
+
 if __name__ == "__main__":
-    run_ingestion()
\ No newline at end of file
+    # python -m app.rag.ingest                -> rebuild everything
+    # python -m app.rag.ingest data/pdf/x.pdf -> update just those files
+    if len(sys.argv) > 1:
+        update_documents(sys.argv[1:])
+    else:
+        run_ingestion()
\ No newline at end of file
@@ -0,0 +1,436 @@
+# app/rag/kb_format.py
+"""
+The on-disk knowledge-base format ("GBKB").
+
+One file holds everything the retriever needs next to the FAISS index:
+
+    [preamble]  magic "GBKB", format version, offset and length of the header
+    [sections]  raw little-endian arrays, each aligned to 64 bytes:
+                  vectors         float32 [count, dim]
+                  text.offsets    int64   [count + 1]
+                  text.arena      uint8   (all chunk texts, UTF-8, back to back)
+                  meta.<key>.*    one or more arrays per metadata column
+                  <other>.*       optional extra indexes (e.g. bm25.* from lexical.py)
+    [header]    JSON describing every section (offset, dtype, shape) and column
+
+Readers map the file with mmap and wrap each section with np.frombuffer, so
+opening a knowledge base copies nothing: texts and metadata are decoded only
+for the rows a query actually returns, and every process that opens the same
+file shares one copy in the OS page cache.
+
+write_knowledge_base writes a file from in-memory lists; KnowledgeBaseWriter
+writes the same layout a batch of rows at a time (streaming ingestion).
+"""
+import json
+import mmap
+import os
+import shutil
+import struct
+from array import array
+from collections.abc import Sequence
+import numpy as np
+
+MAGIC = b"GBKB"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# magic, format version, header offset, header length
+_PREAMBLE = struct.Struct("<4sIQQ")
+
+def is_knowledge_base(path) -> bool:
+    """True if 'path' is a GBKB file (as opposed to e.g. a legacy pickle)."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+# --- METADATA COLUMNS ---
+
+def _column_kind(values):
+    """Picks the most compact storage for one metadata column."""
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, bool) for v in present):
+        return "bool"
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return "int"
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return "float"
+    if all(isinstance(v, str) for v in present):
+        # Columns like 'source' repeat a handful of values: store them as codes.
+        unique = len(set(present))
+        return "category" if unique <= 65535 and unique * 2 <= max(len(present), 2) else "str"
+    return "json"
+
+def string_arrays(strings):
+    """Packs strings into (offsets, arena) arrays."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    arena = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return offsets, arena
+
+def encode_metadata(metadatas):
+    """
+    Turns a list of metadata dicts into columns.
+
+    Returns:
+        tuple: (columns, sections) - 'columns' describes each column for the
+        header, 'sections' maps section names to the arrays to write.
+    """
+    keys = list(dict.fromkeys(k for m in metadatas for k in m))
+    columns, sections = {}, {}
+
+    for key in keys:
+        values = [m.get(key) for m in metadatas]
+        kind = _column_kind(values)
+        col = {"kind": kind}
+        prefix = f"meta.{key}"
+
+        if any(v is None for v in values):
+            sections[f"{prefix}.mask"] = np.array([v is not None for v in values], dtype=np.uint8)
+            col["nullable"] = True
+
+        if kind == "bool":
+            sections[f"{prefix}.values"] = np.array([bool(v) for v in values], dtype=np.uint8)
+        elif kind == "int":
+            sections[f"{prefix}.values"] = np.array([v or 0 for v in values], dtype=np.int64)
+        elif kind == "float":
+            sections[f"{prefix}.values"] = np.array([v or 0.0 for v in values], dtype=np.float64)
+        elif kind == "category":
+            categories = sorted({v for v in values if v is not None})
+            lookup = {c: i for i, c in enumerate(categories)}
+            sections[f"{prefix}.codes"] = np.array([lookup.get(v, -1) for v in values], dtype=np.int32)
+            col["categories"] = categories
+        else:
+            strings = [
+                "" if v is None else (v if kind == "str" else json.dumps(v))
+                for v in values
+            ]
+            sections[f"{prefix}.offsets"], sections[f"{prefix}.arena"] = string_arrays(strings)
+
+        columns[key] = col
+    return columns, sections
+
+# --- WRITING ---
+
+def _pad(f):
+    pad = -f.tell() % ALIGNMENT
+    if pad:
+        f.write(b"\0" * pad)
+
+def _write_array(f, layout, name, arr):
+    _pad(f)
+    layout[name] = {"offset": f.tell(), "dtype": arr.dtype.str, "shape": list(arr.shape)}
+    f.write(arr.tobytes())
+
+def _write_header(f, count, dim, attrs, columns, layout):
+    """Appends the JSON header, points the preamble at it and syncs the file."""
+    header = json.dumps({
+        "format_version": FORMAT_VERSION,
+        "count": count,
+        "dim": dim,
+        "attrs": attrs or {},
+        "columns": columns,
+        "sections": layout,
+    }).encode("utf-8")
+    _pad(f)
+    header_offset = f.tell()
+    f.write(header)
+
+    f.seek(0)
+    f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_offset, len(header)))
+    f.flush()
+    os.fsync(f.fileno())
+
+def write_knowledge_base(path, vectors, texts, metadatas, attrs=None, extra_sections=None):
+    """
+    Writes a knowledge base atomically: the file is written next to 'path'
+    and renamed over it, so readers see either the old or the new file, never
+    a half-written one.
+
+    Args:
+        path (str): Destination file.
+        vectors (np.ndarray): float32 matrix, one row per chunk.
+        texts (list[str]): Chunk texts, aligned with 'vectors'.
+        metadatas (list[dict]): Chunk metadata, aligned with 'vectors'.
+        attrs (dict): Extra JSON-serializable facts about the bundle
+            (e.g. which embedding backend produced the vectors).
+        extra_sections (dict): More named arrays to store, readable afterwards
+            through KnowledgeBase.extra.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count = len(texts)
+    if vectors.shape[0] != count or len(metadatas) != count:
+        raise ValueError("vectors, texts and metadatas must have the same length.")
+
+    text_offsets, text_arena = string_arrays(texts)
+    columns, meta_sections = encode_metadata(metadatas)
+    sections = {
+        "vectors": vectors,
+        "text.offsets": text_offsets,
+        "text.arena": text_arena,
+        **meta_sections,
+        **(extra_sections or {}),
+    }
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, 0))
+        layout = {}
+        for name, arr in sections.items():
+            _write_array(f, layout, name, arr)
+        _write_header(f, count, int(vectors.shape[1]) if vectors.ndim == 2 else 0, attrs, columns, layout)
+
+    os.replace(tmp_path, path)
+
+class _SpilledRows:
+    """Metadata dicts spilled to a JSON-lines file, re-read on every pass."""
+
+    def __init__(self, f):
+        self._f = f
+
+    def __iter__(self):
+        self._f.flush()
+        self._f.seek(0)
+        for line in self._f:
+            yield json.loads(line)
+
+class KnowledgeBaseWriter:
+    """
+    Writes a knowledge base a batch of rows at a time, so building one never
+    needs every vector and text in memory at once.
+
+    Vectors go straight into their section of the new file; texts and metadata
+    go to spill files next to it and are copied in by 'close', which also
+    encodes the metadata columns and renames the file into place (atomically,
+    like write_knowledge_base). Until then 'vectors' and 'texts' are read-only
+    views of the rows written so far, e.g. to build the search indexes from.
+
+    Without a 'dim', the vector size is taken from the first rows appended.
+    Rows of any other size are rejected, never reshaped.
+    """
+
+    def __init__(self, path, dim=None):
+        self.path = str(path)
+        self.dim = dim
+        self.count = 0
+        self._tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        self._f = open(self._tmp_path, "wb+")
+        self._f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, 0))
+        _pad(self._f)
+        self._vectors_offset = self._f.tell()
+        self._arena = open(f"{self._tmp_path}.texts", "wb+")
+        self._text_offsets = array("q", [0])
+        self._meta = open(f"{self._tmp_path}.meta", "w+", encoding="utf-8")
+
+    def append(self, vectors, texts, metadatas):
+        """Appends rows. 'vectors' is a float32 [n, dim] matrix (or a list of rows)."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            vectors = vectors.reshape(0, self.dim or 0)
+        elif vectors.ndim != 2 or (self.dim is not None and vectors.shape[1] != self.dim):
+            raise ValueError(f"Got vectors of shape {vectors.shape}; this knowledge base "
+                             f"holds {self.dim}-dimensional rows.")
+        elif self.dim is None:
+            self.dim = vectors.shape[1]
+        if not (len(vectors) == len(texts) == len(metadatas)):
+            raise ValueError("vectors, texts and metadatas must have the same length.")
+        self._f.write(vectors.tobytes())
+        for text in texts:
+            encoded = text.encode("utf-8")
+            self._arena.write(encoded)
+            self._text_offsets.append(self._text_offsets[-1] + len(encoded))
+        for meta in metadatas:
+            self._meta.write(json.dumps(meta) + "\n")
+        self.count += len(vectors)
+
+    def vectors(self) -> np.ndarray:
+        """float32 [count, dim] view of the vectors written so far (file-backed)."""
+        self._f.flush()
+        if not self.count:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(self._tmp_path, dtype=np.float32, mode="r",
+                         offset=self._vectors_offset, shape=(self.count, self.dim))
+
+    def texts(self) -> "TextColumn":
+        """The texts written so far (file-backed)."""
+        self._arena.flush()
+        offsets = np.frombuffer(self._text_offsets, dtype=np.int64)
+        if offsets[-1] == 0:
+            return TextColumn(offsets, np.empty(0, dtype=np.uint8))
+        return TextColumn(offsets, np.memmap(self._arena.name, dtype=np.uint8, mode="r"))
+
+    def close(self, attrs=None, extra_sections=None):
+        """Writes the remaining sections and the header, then renames the file into place."""
+        f = self._f
+        f.seek(0, os.SEEK_END)
+        layout = {"vectors": {"offset": self._vectors_offset, "dtype": np.dtype(np.float32).str,
+                              "shape": [self.count, self.dim]}}
+        offsets = np.frombuffer(self._text_offsets, dtype=np.int64)
+        _write_array(f, layout, "text.offsets", offsets)
+
+        _pad(f)
+        layout["text.arena"] = {"offset": f.tell(), "dtype": np.dtype(np.uint8).str, "shape": [int(offsets[-1])]}
+        self._arena.flush()
+        self._arena.seek(0)
+        shutil.copyfileobj(self._arena, f, 1 << 20)
+
+        columns, meta_sections = encode_metadata(_SpilledRows(self._meta))
+        for name, arr in {**meta_sections, **(extra_sections or {})}.items():
+            _write_array(f, layout, name, arr)
+        _write_header(f, self.count, self.dim, attrs, columns, layout)
+
+        self._close_files()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Throws away everything written so far."""
+        self._close_files()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def _close_files(self):
+        if self._f.closed:
+            return
+        for spill in (self._arena, self._meta):
+            spill.close()
+            os.remove(spill.name)
+        self._f.close()
+
+# --- READING ---
+
+class TextColumn(Sequence):
+    """A read-only list of strings backed by (offsets, arena) arrays."""
+
+    def __init__(self, offsets, arena):
+        self._offsets = offsets
+        self._arena = arena
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("text index out of range")
+        return self._arena[self._offsets[i]:self._offsets[i + 1]].tobytes().decode("utf-8")
+
+class MetadataTable(Sequence):
+    """
+    A read-only list of metadata dicts backed by columns. Rows are rebuilt on
+    access, so only the rows a query returns are ever turned into Python objects.
+    """
+
+    def __init__(self, count, columns):
+        self._count = count
+        self._columns = columns  # key -> (kind, info, arrays)
+
+    def __len__(self):
+        return self._count
+
+    def _value(self, kind, info, arrays, i):
+        if kind == "bool":
+            return bool(arrays["values"][i])
+        if kind == "int":
+            return int(arrays["values"][i])
+        if kind == "float":
+            return float(arrays["values"][i])
+        if kind == "category":
+            return info["categories"][arrays["codes"][i]]
+        raw = arrays["arena"][arrays["offsets"][i]:arrays["offsets"][i + 1]].tobytes().decode("utf-8")
+        return raw if kind == "str" else json.loads(raw)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("metadata index out of range")
+
+        row = {}
+        for key, (kind, info, arrays) in self._columns.items():
+            mask = arrays.get("mask")
+            if mask is not None and not mask[i]:
+                continue
+            row[key] = self._value(kind, info, arrays, i)
+        return row
+
+    def keys(self):
+        return list(self._columns)
+
+    def column(self, key):
+        """
+        Raw arrays of one column, for vectorized filtering. Category columns
+        return (codes, categories); other kinds return their 'values' array.
+        """
+        kind, info, arrays = self._columns[key]
+        if kind == "category":
+            return arrays["codes"], info["categories"]
+        return arrays.get("values")
+
+class KnowledgeBase:
+    """
+    A memory-mapped, read-only view of a GBKB file.
+
+    Attributes:
+        vectors (np.ndarray): float32 [count, dim], backed by the file.
+        texts (TextColumn): chunk texts.
+        metadatas (MetadataTable): chunk metadata dicts.
+        attrs (dict): bundle-level facts saved with the file.
+        extra (dict): any other sections, by name (see write_knowledge_base).
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mm) < _PREAMBLE.size:
+            raise ValueError(f"{self.path} is not a knowledge-base file.")
+        magic, version, header_offset, header_len = _PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a knowledge-base file.")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{self.path} uses format v{version}; this code reads up to v{FORMAT_VERSION}.")
+
+        header = json.loads(self._mm[header_offset:header_offset + header_len])
+        self.format_version = version
+        self.count = header["count"]
+        self.dim = header["dim"]
+        self.attrs = header["attrs"]
+
+        arrays = {name: self._section(info) for name, info in header["sections"].items()}
+        self.vectors = arrays["vectors"]
+        self.texts = TextColumn(arrays["text.offsets"], arrays["text.arena"])
+
+        columns = {}
+        for key, info in header["columns"].items():
+            prefix = f"meta.{key}."
+            parts = {n[len(prefix):]: a for n, a in arrays.items() if n.startswith(prefix)}
+            columns[key] = (info["kind"], info, parts)
+        self.metadatas = MetadataTable(self.count, columns)
+        self.extra = {
+            name: arr for name, arr in arrays.items()
+            if name != "vectors" and not name.startswith(("text.", "meta."))
+        }
+
+    def _section(self, info):
+        # np.frombuffer over the mmap is a zero-copy view of the file.
+        dtype = np.dtype(info["dtype"])
+        count = int(np.prod(info["shape"])) if info["shape"] else 1
+        arr = np.frombuffer(self._mm, dtype=dtype, count=count, offset=info["offset"])
+        return arr.reshape(info["shape"])
+
+    def __len__(self):
+        return self.count
+
+def open_knowledge_base(path) -> KnowledgeBase:
+    """Maps a GBKB file into memory. Nothing is read until it is used."""
+    return KnowledgeBase(path)
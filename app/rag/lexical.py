@@ -0,0 +1,267 @@
+# app/rag/lexical.py
+"""
+A BM25 inverted index over the chunk texts.
+
+Exact terms such as "Bengali Suite" or "Express Laundry Surcharge" are what
+guests say and what dense search handles worst. The index is stored in CSR
+form, which persists as a handful of flat arrays in the knowledge-base file:
+
+    terms      the vocabulary, sorted (offsets + arena, like the chunk texts)
+    indptr     int64 [n_terms + 1]: postings of term t are rows indptr[t]:indptr[t + 1]
+    doc_ids    int32: the row of each posting
+    tfs        float32: how often the term occurs in that row
+    doc_lens   int32 [n_rows]: tokens per row
+
+Rows appended after the index was built (MutableVectorStore edits) go into a
+small in-memory delta, which is folded into the arrays when the index is saved.
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+from itertools import islice
+import numpy as np
+
+from .kb_format import TextColumn, string_arrays
+
+_TOKEN = re.compile(r"\w+")
+
+# Words that occur in almost every chunk and question carry no signal.
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i in is it its me my of on or
+our please the their there this to was we what when where which who why will with you your
+""".split())
+
+def tokenize(text: str):
+    """Lower-cased word tokens without stopwords."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return [t for t in _TOKEN.findall(text) if t not in STOPWORDS]
+
+class BM25Index:
+    """
+    Okapi BM25 over CSR postings. Searches touch only the postings of the query
+    terms, so a lookup costs microseconds and no embedding call.
+    """
+
+    def __init__(self, terms, indptr, doc_ids, tfs, doc_lens, k1=1.2, b=0.75):
+        self.terms = terms
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.k1 = k1
+        self.b = b
+        self._vocab = None
+        self._delta = {}  # term -> [(row, tf)] for appended rows
+        self._update_norm()
+
+    def _update_norm(self):
+        # The length normalisation k1 * (1 - b + b * len / avgdl) of every row,
+        # computed once per build or append instead of on every search.
+        avgdl = max(float(self.doc_lens.mean()), 1.0) if len(self.doc_lens) else 1.0
+        self._norm = (self.k1 * (1.0 - self.b + self.b * self.doc_lens / avgdl)).astype(np.float32)
+
+    # --- building ---
+
+    @staticmethod
+    def _postings(texts, start=0):
+        """(term, row, tf) triples and token counts for a run of texts."""
+        triples, lens = [], []
+        for row, text in enumerate(texts, start):
+            counts = Counter(tokenize(text))
+            lens.append(sum(counts.values()))
+            triples.extend((term, row, tf) for term, tf in counts.items())
+        return triples, lens
+
+    @classmethod
+    def build(cls, texts, k1=1.2, b=0.75, block_size=1024):
+        """
+        Indexes chunk texts (row i is texts[i]). 'texts' may be any iterable;
+        it is read 'block_size' texts at a time and each block's postings are
+        packed into arrays right away, so building from a file-backed column
+        never holds more than one block as Python objects.
+        """
+        seen = {}  # term -> ID in first-seen order
+        term_ids, rows, tfs, lens = [], [], [], []
+        texts, start = iter(texts), 0
+        while True:
+            block = list(islice(texts, block_size))
+            if not block:
+                break
+            triples, block_lens = cls._postings(block, start)
+            term_ids.append(np.fromiter((seen.setdefault(t, len(seen)) for t, _, _ in triples),
+                                        dtype=np.int64, count=len(triples)))
+            rows.append(np.fromiter((r for _, r, _ in triples), dtype=np.int32, count=len(triples)))
+            tfs.append(np.fromiter((tf for _, _, tf in triples), dtype=np.float32, count=len(triples)))
+            lens.append(np.array(block_lens, dtype=np.int32))
+            start += len(block)
+
+        # Renumber the terms in sorted order, as the CSR layout expects.
+        terms = sorted(seen)
+        vocab = {t: i for i, t in enumerate(terms)}
+        renumber = np.fromiter((vocab[t] for t in seen), dtype=np.int64, count=len(seen))
+
+        def joined(parts, dtype):
+            return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+        term_ids = renumber[joined(term_ids, np.int64)]
+        return cls._from_postings(terms, vocab, term_ids, joined(rows, np.int32), joined(tfs, np.float32),
+                                  joined(lens, np.int32), k1, b)
+
+    @classmethod
+    def _from_postings(cls, terms, vocab, term_ids, rows, tfs, doc_lens, k1, b):
+        # Sorting the postings by term ID turns them into CSR rows.
+        order = np.argsort(term_ids, kind="stable")
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(terms)), out=indptr[1:])
+        index = cls(terms, indptr, rows[order].astype(np.int32), tfs[order].astype(np.float32), doc_lens, k1, b)
+        index._vocab = vocab
+        return index
+
+    def merged(self):
+        """Returns an index with the appended rows folded into the CSR arrays."""
+        if not self._delta:
+            return self
+        terms = sorted(set(self.terms) | set(self._delta))
+        vocab = {t: i for i, t in enumerate(terms)}
+        old_ids = np.array([vocab[t] for t in self.terms], dtype=np.int64)
+        delta = [(vocab[t], r, tf) for t, postings in self._delta.items() for r, tf in postings]
+
+        term_ids = np.concatenate([np.repeat(old_ids, np.diff(self.indptr)), [d[0] for d in delta]])
+        rows = np.concatenate([self.doc_ids, [d[1] for d in delta]])
+        tfs = np.concatenate([self.tfs, [d[2] for d in delta]])
+        return self._from_postings(terms, vocab, term_ids.astype(np.int64), rows, tfs,
+                                   self.doc_lens, self.k1, self.b)
+
+    def copy(self):
+        """A copy that can be appended to without affecting this index."""
+        other = BM25Index(self.terms, self.indptr, self.doc_ids, self.tfs, self.doc_lens, self.k1, self.b)
+        other._vocab = self._vocab
+        other._delta = {t: list(p) for t, p in self._delta.items()}
+        return other
+
+    def append(self, texts):
+        """
+        Indexes rows count .. count + len(texts) - 1, in place. An index that
+        searches may be reading is appended to through a copy (see copy).
+        """
+        triples, lens = self._postings(texts, start=self.count)
+        for term, row, tf in triples:
+            self._delta.setdefault(term, []).append((row, tf))
+        self.doc_lens = np.concatenate([self.doc_lens, np.array(lens, dtype=np.int32)])
+        self._update_norm()
+
+    # --- persistence ---
+
+    def to_sections(self, prefix="bm25"):
+        """
+        Returns (sections, attrs) for kb_format.write_knowledge_base. Appended
+        rows are folded in, so the saved arrays are complete.
+        """
+        index = self.merged()
+        offsets, arena = string_arrays(list(index.terms))
+        sections = {
+            f"{prefix}.terms.offsets": offsets,
+            f"{prefix}.terms.arena": arena,
+            f"{prefix}.indptr": np.asarray(index.indptr, dtype=np.int64),
+            f"{prefix}.doc_ids": np.asarray(index.doc_ids, dtype=np.int32),
+            f"{prefix}.tfs": np.asarray(index.tfs, dtype=np.float32),
+            f"{prefix}.doc_lens": np.asarray(index.doc_lens, dtype=np.int32),
+        }
+        return sections, {"k1": index.k1, "b": index.b}
+
+    @classmethod
+    def from_sections(cls, sections, attrs=None, prefix="bm25"):
+        """Wraps arrays read from a knowledge-base file (no copies). None if absent."""
+        if f"{prefix}.indptr" not in sections:
+            return None
+        attrs = attrs or {}
+        return cls(
+            TextColumn(sections[f"{prefix}.terms.offsets"], sections[f"{prefix}.terms.arena"]),
+            sections[f"{prefix}.indptr"],
+            sections[f"{prefix}.doc_ids"],
+            sections[f"{prefix}.tfs"],
+            sections[f"{prefix}.doc_lens"],
+            attrs.get("k1", 1.2),
+            attrs.get("b", 0.75),
+        )
+
+    # --- searching ---
+
+    @property
+    def count(self) -> int:
+        return len(self.doc_lens)
+
+    @property
+    def vocab(self):
+        # Decoded on first use, so opening a knowledge base stays cheap.
+        if self._vocab is None:
+            self._vocab = {t: i for i, t in enumerate(self.terms)}
+        return self._vocab
+
+    def _term_postings(self, term):
+        rows, tfs = [], []
+        term_id = self.vocab.get(term)
+        if term_id is not None:
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            rows.append(self.doc_ids[start:end])
+            tfs.append(self.tfs[start:end])
+        delta = self._delta.get(term)
+        if delta:
+            rows.append(np.array([r for r, _ in delta], dtype=np.int32))
+            tfs.append(np.array([tf for _, tf in delta], dtype=np.float32))
+        if not rows:
+            return None, None
+        return np.concatenate(rows), np.concatenate(tfs)
+
+    def search(self, query, top_k, deleted=None, rows=None):
+        """
+        Scores every row that contains a query term. Work and memory grow with
+        the postings of the query terms, not with the number of rows.
+
+        Args:
+            query (str): The question.
+            top_k (int): How many rows to return.
+            deleted (np.ndarray): Optional tombstone mask; those rows are skipped.
+            rows (np.ndarray): Optional row IDs to restrict the search to.
+
+        Returns:
+            tuple: (ids, scores, coverage) arrays, best first. 'coverage' is the
+            share of the query's distinct terms that occur in each row.
+        """
+        terms = set(tokenize(query))
+        n = self.count
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32))
+        if not terms or n == 0:
+            return empty
+
+        all_rows, weights = [], []
+        for term in terms:
+            posting_rows, tfs = self._term_postings(term)
+            if posting_rows is None:
+                continue
+            df = len(posting_rows)
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            all_rows.append(posting_rows)
+            weights.append(idf * tfs * (self.k1 + 1.0) / (tfs + self._norm[posting_rows]))
+        if not all_rows:
+            return empty
+
+        # Sum the postings per row over the union of rows they touch. A row has
+        # one posting per term, so the postings per row are its matched terms.
+        hit_rows, slots = np.unique(np.concatenate(all_rows), return_inverse=True)
+        scores = np.zeros(len(hit_rows), dtype=np.float32)
+        np.add.at(scores, slots, np.concatenate(weights).astype(np.float32))
+        matched = np.bincount(slots, minlength=len(hit_rows))
+
+        keep = scores > 0
+        if deleted is not None:
+            tracked = hit_rows < len(deleted)
+            keep[tracked] &= ~deleted[hit_rows[tracked]]
+        if rows is not None:
+            keep &= np.isin(hit_rows, rows)
+        candidates = np.flatnonzero(keep)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return hit_rows[order].astype(np.int64), scores[order], matched[order] / len(terms)
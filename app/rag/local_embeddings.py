@@ -0,0 +1,68 @@
+# app/rag/local_embeddings.py
+import math
+import re
+import zlib
+from collections import Counter
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+
+def _features(text: str):
+    """
+    Breaks text into weighted features: words, word pairs and character
+    trigrams of each word. The trigrams let "checkout" and "check-out" overlap.
+    """
+    words = _WORD_RE.findall(text.lower())
+    feats = Counter()
+    for w in words:
+        feats["w:" + w] += 1.0
+        padded = f"<{w}>"
+        for i in range(len(padded) - 2):
+            feats["c:" + padded[i:i + 3]] += 0.25
+    for a, b in zip(words, words[1:]):
+        feats[f"b:{a} {b}"] += 0.5
+    return feats
+
+class LocalHashEmbeddingBackend:
+    """
+    A fully local embedding backend: hashed, sublinear-TF bag-of-features vectors.
+
+    Every feature is hashed into one of 'dim' buckets with a random sign (the
+    "hashing trick"), so no vocabulary has to be stored and the same text always
+    gives the same vector. Vectors are L2-normalized, which makes FAISS L2
+    distance rank results exactly like cosine similarity.
+
+    Quality is below a neural model, but it needs no network, no API key and
+    embeds a query in well under a millisecond. It serves knowledge bases built
+    with EMBEDDING_BACKEND=local only; it cannot stand in for the OpenAI backend
+    on an index built with that one.
+    """
+
+    name = "local"
+    cacheable = False  # Recomputing is cheaper than a cache lookup.
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+
+    def embed_one(self, text: str) -> np.ndarray:
+        feats = _features(text)
+        vec = np.zeros(self.dim, dtype="float32")
+        if not feats:
+            return vec
+
+        buckets = np.empty(len(feats), dtype=np.int64)
+        weights = np.empty(len(feats), dtype="float32")
+        for i, (feat, count) in enumerate(feats.items()):
+            h = zlib.crc32(feat.encode("utf-8"))
+            buckets[i] = h % self.dim
+            # The top bit picks the sign, so colliding features tend to cancel out.
+            weights[i] = math.log1p(count)
+            if h & 0x80000000:
+                weights[i] = -weights[i]
+
+        vec += np.bincount(buckets, weights=weights, minlength=self.dim).astype("float32")
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def embed(self, texts):
+        return [self.embed_one(t) for t in texts]
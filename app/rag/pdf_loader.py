@@ -1,47 +1,208 @@
 # app/rag/pdf_loader.py
+import multiprocessing
 import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
 from PyPDF2 import PdfReader
+from .config import INGEST_WORKERS, PDF_PAGES_PER_TASK
+from .utils import file_hash
+from .text_normalize import normalize_pages, normalization_stats, format_normalization_stats
 
-def load_all_pdfs_text(pdf_dir):
+def ingest_workers(workers=None) -> int:
+    """Processes used for extraction: 'workers', else INGEST_WORKERS, else one per core."""
+    workers = INGEST_WORKERS if workers is None else workers
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+def read_pdf_pages(path, start=0, stop=None):
+    """
+    Extracts the text of pages start .. stop - 1 of a PDF (all pages by default).
+
+    Returns:
+        list: One string per page, '' for a page without extractable text.
+    """
+    reader = PdfReader(path)
+    stop = len(reader.pages) if stop is None else min(stop, len(reader.pages))
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def _pool_context():
+    """
+    Start method of the extraction processes. The pool is created while other
+    threads run (pipeline stages, the embedding executor) and may hold locks, so
+    workers are never forked from this process: they come from a forkserver,
+    or are spawned where there is none.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+def _read_task(task):
+    """Reads one page range in a worker. Also reports the file's page count."""
+    path, start, stop = task
+    reader = PdfReader(path)
+    count = len(reader.pages)
+    stop = count if stop is None else min(stop, count)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)], count
+
+def _remaining_tasks(path, count, pages_per_task):
+    """The page ranges of a file after its first 'pages_per_task' pages."""
+    return [(path, start, start + pages_per_task) for start in range(pages_per_task, count, pages_per_task)]
+
+def _report_failure(path, exc):
+    print(f" Could not read {os.path.basename(path)}: {exc}")
+
+def _finished(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+def iter_pdf_pages(paths, workers=None, pages_per_task=PDF_PAGES_PER_TASK):
+    """
+    Extracts the page texts of many PDFs in a pool of processes. Files are
+    read in parallel. A worker first reads up to 'pages_per_task' pages of a
+    file and reports how many pages it has. The rest of a longer file is then
+    split into page ranges that are read in parallel too. With one worker
+    everything is read in this process.
+
+    Files are submitted as results are consumed (at most two per worker are
+    in flight), so only a few files' pages are in memory at any time.
+
+    Args:
+        paths (list): PDF paths.
+        workers (int): Processes to use (see ingest_workers).
+        pages_per_task (int): Most pages one process extracts in a single task.
+
+    Yields:
+        tuple: (path, pages) in the order of 'paths'; 'pages' lists the page
+        texts in page order, or is None if the file could not be read.
+    """
+    paths = list(paths)
+    workers = ingest_workers(workers)
+    in_flight = deque()  # [path, future of the first range, futures of the rest or None]
+    if workers > 1 and len(paths) == 1:
+        # A single file is only worth a pool if it is long: read its first
+        # range here and hand the rest, if any, to the workers.
+        try:
+            pages, count = _read_task((paths[0], 0, pages_per_task))
+        except Exception as e:
+            _report_failure(paths[0], e)
+            yield paths[0], None
+            return
+        if count <= pages_per_task:
+            yield paths[0], pages
+            return
+        in_flight.append([paths[0], _finished((pages, count)), None])
+        paths = []
+
+    if workers <= 1:
+        for path in paths:
+            try:
+                yield path, read_pdf_pages(path)
+            except Exception as e:
+                _report_failure(path, e)
+                yield path, None
+        return
+
+    # _read_task is a module-level function, so the workers can unpickle it.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+        def split(entry):
+            # Once a file's page count is known, its remaining ranges are queued.
+            path, first, _ = entry
+            count = first.result()[1] if first.exception() is None else 0
+            entry[2] = [pool.submit(_read_task, task)
+                        for task in _remaining_tasks(path, count, pages_per_task)]
+
+        pending = iter(paths)
+        while True:
+            while len(in_flight) < 2 * workers:
+                path = next(pending, None)
+                if path is None:
+                    break
+                in_flight.append([path, pool.submit(_read_task, (path, 0, pages_per_task)), None])
+            if not in_flight:
+                return
+
+            # Wait for the oldest file, splitting the others as their counts come in.
+            head = in_flight[0]
+            while True:
+                for entry in in_flight:
+                    if entry[2] is None and entry[1].done():
+                        split(entry)
+                if head[2] is not None:
+                    break
+                wait([entry[1] for entry in in_flight if entry[2] is None], return_when=FIRST_COMPLETED)
+
+            path, first, rest = in_flight.popleft()
+            try:
+                pages = first.result()[0]
+                for future in rest:
+                    pages.extend(future.result()[0])
+            except Exception as e:
+                _report_failure(path, e)
+                pages = None
+            yield path, pages
+
+def extract_pdf_pages(paths, workers=None, pages_per_task=PDF_PAGES_PER_TASK):
+    """
+    Like iter_pdf_pages, but returns every file at once.
+
+    Returns:
+        dict: path -> list of page texts in page order, or None if the file
+        could not be read.
+    """
+    return dict(iter_pdf_pages(paths, workers, pages_per_task))
+
+def load_pdfs_text(paths, workers=None):
+    """
+    Extracts the text content of the given PDF files.
+
+    Args:
+        paths (list): PDF paths.
+        workers (int): Extraction processes (see ingest_workers).
+
+    Returns:
+        list: A list of dictionaries, each containing extracted 'text', the 'source'
+        filename and the 'path' it was read from. Unreadable or empty files are left out.
+    """
+    documents = []
+
+    # 1. Extract every page of every file, spread over the worker processes
+    for path, pages in iter_pdf_pages(paths, workers):
+        file = os.path.basename(path)
+        print(f" Loading PDF: {file}")
+        if pages is None:
+            continue
+
+        # 2. Collapse PyPDF2's layout whitespace and report what it saved
+        raw = "\n".join(pages)
+        text = normalize_pages(pages)
+        print(f"   {format_normalization_stats(file, normalization_stats(raw, text))}")
+
+        # 3. Append a structured dictionary to our documents list
+        if text.strip():
+            documents.append({
+                "text": text.strip(),
+                "source": file,
+                "path": path,
+                "doc_id": file_hash(path)
+            })
+
+    return documents
+
+def load_all_pdfs_text(pdf_dir, workers=None):
     """
     Scans a folder for PDF files and extracts all text content from them.
-    
+
     Args:
         pdf_dir (str): Path to the folder containing your PDFs (e.g., 'data/pdf').
-        
+        workers (int): Extraction processes (see ingest_workers).
+
     Returns:
         list: A list of dictionaries, each containing extracted 'text' and the 'source' filename.
     """
-    documents = []
-
     # 1. Check if the directory exists
     if not os.path.exists(pdf_dir):
         print(f" PDF folder not found: {pdf_dir}")
-        return documents
-
-    # 2. Iterate through every file in the folder
-    for file in os.listdir(pdf_dir):
-        
-        # 3. Only process files that end with the .pdf extension
-        if file.lower().endswith(".pdf"):
-            path = os.path.join(pdf_dir, file)
-            print(f" Loading PDF: {file}")
-
-            # 4. Initialize the PDF reader
-            reader = PdfReader(path)
-            text = ""
-            
-            # 5. Loop through every page and extract text
-            for page in reader.pages:
-                # We use 'or ""' to handle cases where a page might be empty/unreadable
-                text += page.extract_text() or ""
-
-            # 6. Append a structured dictionary to our documents list
-            # We use .strip() to remove unnecessary whitespace at the start/end
-            if text.strip():
-                documents.append({
-                    "text": text.strip(),
-                    "source": file
-                })
-
-    return documents
\ No newline at end of file
+        return []
+
+    # 2. Only process files that end with the .pdf extension
+    paths = [os.path.join(pdf_dir, file) for file in os.listdir(pdf_dir) if file.lower().endswith(".pdf")]
+    return load_pdfs_text(paths, workers)
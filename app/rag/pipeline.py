@@ -0,0 +1,60 @@
+# app/rag/pipeline.py
+import queue
+import threading
+
+_DONE = object()
+
+class _Failure:
+    def __init__(self, exc):
+        self.exc = exc
+
+def run_stage(items, maxsize=4, name="stage"):
+    """
+    Runs the generator 'items' on its own thread and yields what it produces.
+
+    At most 'maxsize' produced items wait in the queue; when the consumer
+    falls behind, the stage blocks instead of piling up results. Chaining
+    stages therefore overlaps their work (extraction, embedding requests,
+    index writes) while keeping memory bounded. An exception raised by the
+    stage is re-raised in the consumer.
+    """
+    q = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failure(e))
+        finally:
+            # Stops an upstream stage too when this one ends early.
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name=f"pipeline-{name}", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+    finally:
+        # The consumer stopped early (or failed): let the producer thread exit.
+        stop.set()
+        thread.join()
@@ -1,12 +1,54 @@
 # app/rag/prompt.py
+import re
 from datetime import datetime
 
-def build_prompt(context: str, question: str, history: list, user_profile: dict = None, booking_status: bool = False):
+# Words that put a conversation into one of THE TWO MODES described to Alex below.
+BOOKING_KEYWORDS = (
+    "book", "booking", "reserve", "reservation", "availability", "available", "nights",
+    "check-in", "check in", "check-out", "checkout", "suite", "room type", "king", "twin",
+    "cancel", "stay", "price", "rate",
+)
+HOTLINE_KEYWORDS = (
+    "laundry", "wash", "iron", "dry clean", "food", "order", "menu", "breakfast", "dinner",
+    "room service", "medical", "doctor", "medicine", "sick", "bellhop", "luggage", "bags",
+    "towel", "housekeeping", "maintenance", "room number",
+)
+
+def _keyword_mode(text: str):
+    text = text.lower()
+    hotline = sum(1 for k in HOTLINE_KEYWORDS if re.search(rf"\b{re.escape(k)}\b", text))
+    booking = sum(1 for k in BOOKING_KEYWORDS if re.search(rf"\b{re.escape(k)}\b", text))
+    if hotline > booking:
+        return "hotline"
+    if booking > hotline:
+        return "booking"
+    return None
+
+def detect_mode(question: str, history: list = None) -> str:
+    """
+    Works out which of the two modes the conversation is in: "booking"
+    (pre-stay), "hotline" (in-stay) or "general" when nothing points either way.
+    A turn without mode keywords ("yes", an email address) inherits the mode of
+    the most recent turn that had them.
+    """
+    mode = _keyword_mode(question)
+    if mode:
+        return mode
+    for u, a in reversed(history or []):
+        mode = _keyword_mode(f"{u} {a}")
+        if mode:
+            return mode
+    return "general"
+
+def build_prompt(context: str, question: str, history: list, user_profile: dict = None, booking_status: bool = False,
+                 mode: str = None):
     """
     Final optimized prompt for Alex. 
     Maintains strict user data collection and proactive sales logic.
+    'mode' is the conversation mode from detect_mode (detected here if not given).
     """
     
+    mode = mode or detect_mode(question, history)
     now = datetime.now()
     current_date_str = now.strftime("%A, %B %d, %Y")
 
@@ -75,6 +117,7 @@ Before calling 'finalize_hotel_booking', you MUST collect and validate:
 
 ### SESSION STATE
 - **Reference Date**: {current_date_str}
+- [Conversation Mode]: {mode}
 - [Booking Confirmed]: {booking_status}
 - [Current Guest Data]: {user_profile if user_profile else 'Awaiting details'}
 
@@ -82,7 +125,7 @@ Before calling 'finalize_hotel_booking', you MUST collect and validate:
 {history_str}
 
 ### KNOWLEDGE BASE
-{context}
+{context or 'Not needed for this turn.'}
 
 ### CURRENT GUEST INPUT
 Guest: {question}
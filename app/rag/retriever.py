@@ -1,42 +1,429 @@
 # app/rag/retriever.py
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
 import numpy as np
+from .config import (
+    QUERY_CACHE_SIZE, QUERY_CACHE_TTL, RETRIEVAL_MODE, HYBRID_CANDIDATES, RRF_K,
+    LEXICAL_FAST_PATH_COVERAGE, LEXICAL_FAST_PATH_MARGIN,
+)
+from .embeddings import embed_texts
+from .vector_store import search_index, lexical_index, filter_rows, row_vectors
 
-def retrieve_chunks(query, index, embed_func, top_k=3):
+RETRIEVAL_MODES = ("dense", "hybrid", "lexical")
+
+def normalize_query(text: str) -> str:
+    """
+    Reduces a guest utterance to a canonical form for cache lookups, so that
+    "What time is checkout?" and "what time is  checkout" share one entry.
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+class QueryEmbeddingCache:
+    """
+    An in-memory LRU cache of query vectors with a time-to-live.
+
+    One instance is shared by every call session in the process. Alongside the
+    hit/miss counters it tracks how long real embedding calls take, which gives
+    an estimate of the latency that cache hits saved.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl: float = 24 * 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, vector)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def peek(self, key):
+        """Like get, but without counting a hit or refreshing the entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def put(self, key, vector):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_embed(self, query, embed_func, namespace="default"):
+        """
+        Returns the vector for 'query', calling 'embed_func' only on a miss.
+        'namespace' keeps vectors from different embedding backends apart.
+        Failed embeddings (None) are not cached, so the next call tries again.
+        """
+        key = (namespace, normalize_query(query))
+        vector = self.get(key)
+        if vector is not None:
+            return vector
+
+        start = time.perf_counter()
+        vector = embed_func(query)[0]
+        with self._lock:
+            self.misses += 1
+            self.miss_seconds += time.perf_counter() - start
+
+        if vector is not None and self.max_size > 0:
+            self.put(key, vector)
+        return vector
+
+    def get_or_embed_many(self, queries, embed_many, namespace="default"):
+        """
+        Like get_or_embed for a list of queries. All misses are embedded with
+        a single 'embed_many' call; duplicates within the list are embedded once.
+
+        Returns:
+            list: One vector (or None) per query.
+        """
+        keys = [(namespace, normalize_query(q)) for q in queries]
+        vectors = [self.get(k) for k in keys]
+        missing = {}
+        for q, k, v in zip(queries, keys, vectors):
+            if v is None:
+                missing.setdefault(k, q)
+        if not missing:
+            return vectors
+
+        start = time.perf_counter()
+        embedded = dict(zip(missing, embed_many(list(missing.values()))))
+        with self._lock:
+            self.misses += len(missing)
+            self.miss_seconds += time.perf_counter() - start
+
+        for k, v in embedded.items():
+            if v is not None and self.max_size > 0:
+                self.put(k, v)
+        return [v if v is not None else embedded.get(k) for k, v in zip(keys, vectors)]
+
+    def stats(self) -> dict:
+        """Hit rate and the embedding latency that hits avoided."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "avg_embed_ms": avg_miss * 1000,
+                "latency_saved_ms": self.hits * avg_miss * 1000,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+            self.miss_seconds = 0.0
+
+# Shared by every session in this process.
+query_cache = QueryEmbeddingCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+
+def query_cache_stats() -> dict:
+    """Monitoring hook: hit rate and latency saved by the query embedding cache."""
+    return query_cache.stats()
+
+# How queries were answered: by dense search, by fusion, or by BM25 alone.
+_retrieval_counts = {"dense": 0, "hybrid": 0, "lexical": 0, "lexical_fast_path": 0}
+_counts_lock = threading.Lock()
+
+def _count(kind, n=1):
+    with _counts_lock:
+        _retrieval_counts[kind] += n
+
+def retrieval_stats() -> dict:
+    """Monitoring hook: how many queries each retrieval path served."""
+    with _counts_lock:
+        return dict(_retrieval_counts)
+
+def query_embedder(index):
+    """
+    Returns an embed function that puts queries into the same vector space as
+    'index', i.e. one that uses the backend the knowledge base was built with.
+    """
+    backend = index.get("embedding_backend") or "openai"
+    return lambda q: embed_texts([q], backend=backend)
+
+def embed_query(query, index, use_cache=True):
+    """The vector of 'query' in the index's vector space (None if embedding failed)."""
+    embed_func = query_embedder(index)
+    if use_cache:
+        return query_cache.get_or_embed(query, embed_func, index.get("embedding_backend"))
+    return embed_func(query)[0]
+
+def embedded_query_vector(query, index):
+    """
+    The vector of 'query' if a search embedded it already (kept by query_cache),
+    else None. Never makes an embedding call, so a lexical answer stays free.
+    """
+    return query_cache.peek((index.get("embedding_backend"), normalize_query(query)))
+
+def batch_query_embedder(index):
+    """Like query_embedder, but embeds a whole list of queries in one request."""
+    backend = index.get("embedding_backend") or "openai"
+    return lambda queries: embed_texts(queries, backend=backend)
+
+def lexical_is_confident(ids, scores, coverage) -> bool:
+    """
+    True when the best BM25 hit is clear enough to answer without an embedding
+    call: it contains (nearly) every query term and beats the runner-up by a margin.
+    """
+    if not len(ids) or coverage[0] < LEXICAL_FAST_PATH_COVERAGE:
+        return False
+    return len(ids) == 1 or scores[0] >= LEXICAL_FAST_PATH_MARGIN * scores[1]
+
+def reciprocal_rank_fusion(rankings, top_k, k=RRF_K):
+    """
+    Fuses several ranked ID lists: each list gives a row 1 / (k + rank).
+    Rows ranked well by both dense and lexical search rise to the top.
+
+    Returns:
+        tuple: (ids, scores) arrays, best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking):
+            fused[int(idx)] = fused.get(int(idx), 0.0) + 1.0 / (k + rank + 1)
+    best = sorted(fused.items(), key=lambda item: -item[1])[:top_k]
+    return np.array([i for i, _ in best], dtype=np.int64), np.array([sc for _, sc in best])
+
+def retrieve_chunks(query, index, embed_func=None, top_k=3, use_cache=True, mode=None, filters=None):
     """
     Finds the most relevant pieces of text from the FAISS index.
     
     Args:
         query (str): The user's natural language question.
-        index (dict): A dictionary containing the 'faiss' object, 'texts', and 'metadatas'.
+        index (dict): A dictionary containing the 'faiss' object, 'texts', and 'metadatas'
+            (a loaded bundle or MutableVectorStore.bundle).
         embed_func (function): The function that converts text into math vectors.
+            Defaults to the embedding backend the index was built with.
         top_k (int): How many relevant chunks to return (default is 3).
+        use_cache (bool): Reuse the vector of a previously seen (normalized) question.
+        mode (str): "dense", "hybrid" or "lexical"; defaults to RETRIEVAL_MODE.
+        filters (dict): Only search matching partitions, e.g. {"category": "Food"}
+            or {"source": "Medical support.pdf"} (see vector_store.filter_rows).
         
     Returns:
-        list: A list of dictionaries containing text and source metadata.
+        list: A list of dictionaries containing text, source metadata and score.
     """
-    
-    # 1. Vectorize the User Question
-    # We convert the user's text into the same "math language" (vectors) as our PDF chunks.
-    # .astype("float32") is required by the FAISS library.
-    q_vec = embed_func(query)[0].astype("float32")
-
-    # 2. Mathematical Search
-    # index["faiss"].search looks for the k-nearest vectors in the database.
-    # D: Distances (how similar the results are).
-    # I: Indices (the position IDs of the matching text).
-    D, I = index["faiss"].search(
-        np.array([q_vec]), 
-        top_k
-    )
-
-    # 3. Reconstruct the Results
-    results = []
-    # I[0] contains the IDs of the top matching chunks
-    for idx in I[0]:
-        # If FAISS finds a match, we grab the actual text and its source metadata
-        results.append({
-            "text": index["texts"][idx],
-            "metadata": index["metadatas"][idx]
-        })
-
-    return results
+    embed_many = None
+    if embed_func is not None:
+        embed_many = lambda queries: [embed_func(q)[0] for q in queries]
+    return retrieve_chunks_batch([query], index, embed_many, top_k, use_cache, mode, filters)[0]
+
+def _dense_search(queries, index, embed_many, depth, use_cache, allowed_rows=None):
+    """
+    Embeds 'queries' in one request and searches them in one FAISS call,
+    restricted to 'allowed_rows' when given.
+
+    Returns:
+        dict: position in 'queries' -> (ids, scores) for every query that could be
+        embedded. Scores are cosine similarities for unit-length vectors.
+    """
+    # Cached vectors are kept per backend: they must live in the index's vector space.
+    embed_many = embed_many or batch_query_embedder(index)
+    if use_cache:
+        vectors = query_cache.get_or_embed_many(queries, embed_many, index.get("embedding_backend"))
+    else:
+        vectors = embed_many(list(queries))
+
+    rows = [i for i, v in enumerate(vectors) if v is not None]
+    if not rows:
+        return {}
+    q_mat = np.vstack([vectors[i] for i in rows]).astype("float32")
+    if q_mat.shape[1] != index["faiss"].d:
+        print(f" Warning: query vectors have {q_mat.shape[1]} dims but the index has "
+              f"{index['faiss'].d}. Was the knowledge base built with another embedding backend?")
+        return {}
+
+    # D: squared L2 distances, I: row IDs (-1 when fewer than 'depth' matches exist).
+    # For unit vectors |a - b|^2 = 2 - 2cos(a, b).
+    D, I = search_index(index, q_mat, depth, rows=allowed_rows)
+    scores = 1.0 - D / 2.0
+    valid = I >= 0
+    return {pos: (I[j][valid[j]], scores[j][valid[j]]) for j, pos in enumerate(rows)}
+
+def retrieve_chunks_batch(queries, index, embed_many=None, top_k=3, use_cache=True, mode=None,
+                          filters=None):
+    """
+    Runs many lookups at once: every query that needs a vector is embedded in
+    one request and searched in one FAISS call over the whole query matrix.
+
+    Modes:
+        dense    vector search only.
+        lexical  BM25 only; no embedding call at all.
+        hybrid   BM25 and vector rankings fused with reciprocal-rank fusion. A
+                 query whose BM25 result is unambiguous (lexical_is_confident)
+                 is answered from BM25 alone and never embedded.
+
+    Args:
+        queries (list[str]): The questions.
+        index (dict): A loaded bundle or MutableVectorStore.bundle.
+        embed_many (function): Turns a list of texts into a list of vectors.
+            Defaults to the embedding backend the index was built with.
+        top_k (int): How many chunks to return per query.
+        use_cache (bool): Reuse the vectors of previously seen (normalized) questions.
+        mode (str): "dense", "hybrid" or "lexical"; defaults to RETRIEVAL_MODE.
+        filters (dict): Only search matching partitions (applies to every query).
+
+    Returns:
+        list: One result list per query, in order. Each result is a dict with
+        'text', 'metadata', 'id' (row in the index) and 'score' (higher is better: cosine similarity in
+        dense mode, BM25 in lexical mode, the fused RRF score in hybrid mode).
+        A query that found nothing (e.g. its embedding failed) gets [].
+    """
+    if not queries:
+        return []
+    mode = (mode or RETRIEVAL_MODE).lower()
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}'. Choose one of: {', '.join(RETRIEVAL_MODES)}")
+    rows = filter_rows(index, filters)
+    if rows is not None and not len(rows):
+        return [[] for _ in queries]
+
+    # 1. Lexical pass: cheap, and it decides which queries still need a vector.
+    hits = [None] * len(queries)
+    need_dense = list(range(len(queries)))
+    if mode != "dense":
+        lexical = lexical_index(index)
+        depth = top_k if mode == "lexical" else max(top_k, HYBRID_CANDIDATES)
+        hits = [lexical.search(q, depth, index.get("deleted"), rows) for q in queries]
+        if mode == "lexical":
+            need_dense = []
+        else:
+            need_dense = [i for i, h in enumerate(hits) if not lexical_is_confident(*h)]
+            _count("lexical_fast_path", len(queries) - len(need_dense))
+
+    # 2. Dense pass over the remaining queries, as one embedding request and one matrix search.
+    dense = {}
+    if need_dense:
+        depth = top_k if mode == "dense" else max(top_k, HYBRID_CANDIDATES)
+        found = _dense_search([queries[i] for i in need_dense], index, embed_many, depth, use_cache, rows)
+        dense = {need_dense[j]: r for j, r in found.items()}
+        _count(mode, len(need_dense))
+    elif mode == "lexical":
+        _count("lexical", len(queries))
+
+    # 3. Pick or fuse the rankings for each query.
+    ranked = []
+    for pos in range(len(queries)):
+        if pos in dense and hits[pos] is not None:
+            ranked.append(reciprocal_rank_fusion([dense[pos][0], hits[pos][0]], top_k))
+        elif pos in dense:
+            ranked.append(dense[pos])
+        elif hits[pos] is not None:
+            # Lexical mode, the fast path, or a failed embedding in hybrid mode.
+            ranked.append((hits[pos][0][:top_k], hits[pos][1][:top_k]))
+        else:
+            ranked.append((np.empty(0, dtype=np.int64), np.empty(0)))
+
+    # 4. Reconstruct the results. Each distinct row is decoded from the
+    # knowledge base only once, even when several queries return it.
+    # Rows appended while this search ran may not have their text yet.
+    n_rows = len(index["texts"])
+    all_ids = np.unique(np.concatenate([ids for ids, _ in ranked]).astype(np.int64))
+    chunks = {int(idx): (index["texts"][idx], index["metadatas"][idx]) for idx in all_ids if idx < n_rows}
+
+    return [
+        [
+            {"text": chunks[idx][0], "metadata": chunks[idx][1], "id": idx, "score": score}
+            for idx, score in zip(ids.tolist(), scores.tolist()) if idx in chunks
+        ]
+        for ids, scores in ranked
+    ]
+
+def _cosine_scores(query, index, results, mode):
+    """
+    Cosine similarity of each result's stored vector to the query, or None if
+    the search did not embed the query. Never makes an embedding call: dense
+    scores already are cosines, and a hybrid search that went to dense search
+    left the query's vector in query_cache. Lexical mode and the lexical fast
+    path have no vector to compare with.
+    """
+    if mode == "dense":
+        return [r["score"] for r in results]
+    if mode == "lexical":
+        return None
+    q_vec = embedded_query_vector(query, index)
+    if q_vec is None or len(q_vec) != index["faiss"].d:
+        return None
+    vectors = row_vectors(index, [r["id"] for r in results])
+    q_vec = np.asarray(q_vec, dtype="float32")
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(q_vec) or 1.0)
+    return (vectors @ q_vec / np.where(norms > 0, norms, 1.0)).tolist()
+
+def _min_max(scores):
+    raw = np.asarray(scores, dtype="float64")
+    span = raw.max() - raw.min()
+    return ((raw - raw.min()) / span).tolist() if span > 0 else [1.0] * len(raw)
+
+def retrieve_federated(query, index, session_indexes=None, top_k=3, use_cache=True, mode=None,
+                       filters=None):
+    """
+    Searches the global knowledge base and a session's upload indexes
+    (upload_manager.build_temp_index) in one call and merges them into one top-k.
+
+    Each index is searched on its own (same mode and filters). BM25 and RRF
+    scores only rank results within one index, so hybrid results are re-scored
+    by the cosine similarity of their stored vectors to the query vector the
+    search computed (dense scores are cosines already). Nothing is embedded
+    for the merge: in lexical mode, or when an index answered from the lexical
+    fast path, every index's scores are min-max scaled instead.
+
+    Args:
+        query (str): The guest's question.
+        index (dict): The global bundle (may be None).
+        session_indexes (dict or list): Session bundles, by name or in a list.
+        top_k (int): Results to return in total.
+
+    Returns:
+        list: Result dicts as from retrieve_chunks, plus 'index' naming where each
+        came from ("global" or "session:<name>"), best first.
+    """
+    sources = [("global", index)] if index is not None else []
+    if session_indexes:
+        items = session_indexes.items() if hasattr(session_indexes, "items") else enumerate(session_indexes)
+        sources += [(f"session:{name}", bundle) for name, bundle in items if bundle is not None]
+
+    mode = (mode or RETRIEVAL_MODE).lower()
+    found = []
+    for name, bundle in sources:
+        results = retrieve_chunks(query, bundle, top_k=top_k, use_cache=use_cache, mode=mode, filters=filters)
+        if results:
+            found.append((name, results, _cosine_scores(query, bundle, results, mode)))
+    comparable = all(cosines is not None for _, _, cosines in found)
+
+    pooled = []
+    for name, results, cosines in found:
+        scores = cosines if comparable else _min_max([r["score"] for r in results])
+        pooled.extend({**r, "score": score, "index": name} for r, score in zip(results, scores))
+
+    # The same text can sit in both the knowledge base and an upload; keep its best hit.
+    pooled.sort(key=lambda r: -r["score"])
+    merged, seen = [], set()
+    for r in pooled:
+        if r["text"] not in seen:
+            seen.add(r["text"])
+            merged.append(r)
+    return merged[:top_k]
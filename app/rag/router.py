@@ -0,0 +1,201 @@
+# app/rag/router.py
+import re
+import threading
+import numpy as np
+
+from .config import ROUTER_ENABLED, ROUTER_MARGIN
+from .embeddings import get_backend
+from .utils import text_category
+
+# --- KEYWORD RULES ---
+
+# Turns that only hand over data or steer the workflow. The tools and the
+# conversation history already carry everything needed to answer them.
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE = re.compile(r"\+?\d[\d\s().-]{6,}\d")
+_DATE = re.compile(
+    r"\b(\d{1,2}[/.-]\d{1,2}([/.-]\d{2,4})?|\d{4}-\d{2}-\d{2}|today|tomorrow|tonight|"
+    r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s*\d{1,2}|"
+    r"\d{1,2}(st|nd|rd|th)?\s+(of\s+)?(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*)\b"
+)
+_ROOM_NUMBER = re.compile(r"\b(room\s*(no\.?|number|#)?\s*)?\d{2,4}\b")
+# A whole turn made of courtesy words only ("ok", "yes please", "thanks!").
+_ACK_WORDS = (
+    r"yes|yeah|yep|yup|no|nope|ok|okay|sure|fine|great|perfect|correct|right|exactly|"
+    r"confirm|confirmed|please|please do|go ahead|proceed|do it|sounds good|that's right|that is right|"
+    r"that's all|that is all|all good|thanks|thank you|thank u|a lot|so much|very much|cheers|"
+    r"hi|hello|hey|good morning|good evening|bye|goodbye|alex"
+)
+_ACK = re.compile(rf"^(?:{_ACK_WORDS})(?:[\s,]+(?:{_ACK_WORDS}))*[\s.!]*$")
+# "my name is sarah khan", or an introduction followed by one or two
+# capitalised words ("I'm Sarah Khan"); matched against the turn as typed.
+_NAME = re.compile(
+    r"^(?:(?i:my name is|name:)\s+[A-Za-z][A-Za-z.'-]*(?:\s+[A-Za-z][A-Za-z.'-]*){0,3}|"
+    r"(?i:i am|i'm|this is|it's)\s+[A-Z][a-z'-]+(?:\s+[A-Z][a-z'-]+)?)[.!]?$"
+)
+
+# Words that mean the guest wants facts from the knowledge base.
+_KNOWLEDGE = re.compile(
+    r"\?|\b(what|which|where|when|how|why|does|do you|is there|are there|can i|tell me|explain|"
+    r"price|cost|rate|fee|charge|surcharge|policy|policies|hours|open|menu|amenit\w*|facilit\w*|"
+    r"pool|spa|gym|wifi|parking|breakfast|difference|include\w*|offer\w*|available)\b"
+)
+
+def _is_data_only(text: str) -> bool:
+    """True if nothing is left after removing emails, phone numbers, dates and filler."""
+    rest = _EMAIL.sub(" ", text)
+    rest = _PHONE.sub(" ", rest)
+    rest = _DATE.sub(" ", rest)
+    rest = _ROOM_NUMBER.sub(" ", rest)
+    rest = re.sub(
+        r"\b(my|email|e-mail|mail|phone|number|mobile|contact|is|it|its|it's|and|the|from|to|for|"
+        r"till|until|nights?|guests?|people|adults?|kids|children|check|in|out|room|at|on|of|a)\b",
+        " ", rest,
+    )
+    return not re.sub(r"[\W_]+", "", rest)
+
+# --- INTENT CENTROIDS ---
+
+# A few typical turns per intent. Their embeddings are averaged into one
+# centroid each; a turn is routed to the intent whose centroid is closest.
+INTENT_EXAMPLES = {
+    "knowledge": [
+        "what room types do you have",
+        "how much is the executive suite per night",
+        "what is included in the express laundry service",
+        "is breakfast included with the room",
+        "what are the check in and check out times",
+        "do you have a doctor on call",
+        "tell me about the club lounge benefits",
+        "what is your cancellation policy",
+        "which rooms are good for a family of five",
+        "how long does dry cleaning take",
+        "what food options are available for room service",
+        "can the bellhop help with airport transfers",
+        "i would like to book a room for my family",
+    ],
+    "transactional": [
+        "yes please confirm the booking",
+        "my email is john at example dot com",
+        "my phone number is 01712345678",
+        "my name is sarah khan",
+        "room 305",
+        "from the 12th to the 15th",
+        "two adults and one child",
+        "three nights please",
+        "ok go ahead",
+        "no that is all thank you",
+        "the deluxe king one",
+        "normal wash, cotton shirts",
+    ],
+}
+
+# Booking and hotline conversations are mostly data collection, so an unclear
+# turn there leans towards skipping; a general chat leans towards retrieving.
+MODE_BIAS = {"booking": -0.02, "hotline": -0.02, "general": 0.03}
+
+class TurnRouter:
+    """
+    Decides, per guest turn, whether knowledge-base retrieval is worth it.
+
+    Keyword rules settle the obvious cases (a direct question, an email
+    address, "yes, confirm it"). Everything else is scored against intent
+    centroids embedded with the local backend, which costs well under a
+    millisecond and no network call. Skipped turns save an embedding request,
+    a search and the retrieved chunks' prompt tokens.
+    """
+
+    def __init__(self, margin: float = 0.0, enabled: bool = True):
+        self.margin = margin
+        self.enabled = enabled
+        self._backend = get_backend("local")
+        self._centroids = None
+        self._lock = threading.Lock()
+        self.counts = {"retrieved": 0, "skipped": 0}
+        self.reasons = {}
+
+    def _intent_centroids(self):
+        if self._centroids is None:
+            centroids = {}
+            for intent, examples in INTENT_EXAMPLES.items():
+                c = np.mean(self._backend.embed(examples), axis=0)
+                centroids[intent] = c / (np.linalg.norm(c) or 1.0)
+            self._centroids = centroids
+        return self._centroids
+
+    def intent_scores(self, text: str) -> dict:
+        """Cosine similarity of 'text' to each intent centroid."""
+        vec = self._backend.embed([text])[0]
+        return {intent: float(vec @ c) for intent, c in self._intent_centroids().items()}
+
+    def _decide(self, text: str, mode: str):
+        t = text.lower().strip()
+        # A question wins over everything else in the turn ("thanks, when does the spa open").
+        if _KNOWLEDGE.search(t):
+            return True, "question"
+        if _EMAIL.search(t) or _is_data_only(t):
+            return False, "data"
+        if _ACK.match(t):
+            return False, "acknowledgement"
+        if _NAME.match(text.strip()):
+            return False, "name"
+
+        scores = self.intent_scores(t)
+        lead = scores["knowledge"] - scores["transactional"] + MODE_BIAS.get(mode, 0.0)
+        return lead >= self.margin, "centroid"
+
+    @staticmethod
+    def hotline_category(text: str, history=None):
+        """
+        The hotline category (Food/Laundry/Medical/Bellhop) a turn is about,
+        taken from the turn itself or else from the latest turn that named one.
+        """
+        category = text_category(text)
+        for u, a in reversed(history or []):
+            if category:
+                break
+            category = text_category(f"{u} {a}")
+        return category
+
+    def route(self, text: str, mode: str = "general", history=None) -> dict:
+        """
+        Returns:
+            dict: {'retrieve': bool, 'reason': str, 'mode': str, 'filters': dict or None}.
+            In hotline mode 'filters' narrows the search to the request's category.
+        """
+        if not self.enabled:
+            retrieve, reason = True, "disabled"
+        else:
+            retrieve, reason = self._decide(text, mode)
+        category = self.hotline_category(text, history) if retrieve and mode == "hotline" else None
+        with self._lock:
+            self.counts["retrieved" if retrieve else "skipped"] += 1
+            key = f"{'retrieve' if retrieve else 'skip'}:{reason}"
+            self.reasons[key] = self.reasons.get(key, 0) + 1
+        return {
+            "retrieve": retrieve,
+            "reason": reason,
+            "mode": mode,
+            "filters": {"category": category} if category else None,
+        }
+
+    def stats(self) -> dict:
+        """How many turns were routed each way, and why."""
+        with self._lock:
+            turns = self.counts["retrieved"] + self.counts["skipped"]
+            return {
+                **self.counts,
+                "skip_rate": self.counts["skipped"] / turns if turns else 0.0,
+                "reasons": dict(self.reasons),
+            }
+
+# Shared by every session in this process.
+turn_router = TurnRouter(ROUTER_MARGIN, bool(ROUTER_ENABLED))
+
+def route_turn(text: str, mode: str = "general", history=None) -> dict:
+    """Routes one guest turn with the shared router (see TurnRouter.route)."""
+    return turn_router.route(text, mode, history)
+
+def router_stats() -> dict:
+    """Monitoring hook: how many turns skipped retrieval."""
+    return turn_router.stats()
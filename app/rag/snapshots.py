@@ -0,0 +1,181 @@
+# app/rag/snapshots.py
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+
+from .vector_store import load_faiss_index, search_index
+
+logger = logging.getLogger(__name__)
+
+def validate_bundle(bundle):
+    """
+    Sanity checks a freshly loaded bundle before it is allowed to serve calls:
+    row counts line up and a real search returns valid row IDs.
+
+    Raises:
+        ValueError: if the bundle is unusable.
+    """
+    index = bundle["faiss"]
+    rows = len(bundle["texts"])
+    if index.ntotal != rows or len(bundle["metadatas"]) != rows:
+        raise ValueError(f"Index has {index.ntotal} vectors for {rows} texts.")
+    if rows == 0:
+        return
+
+    vectors = bundle.get("vectors")
+    probe = np.asarray(vectors[:1] if vectors is not None else index.reconstruct_n(0, 1), dtype="float32")
+    _, I = search_index(bundle, probe, 1)
+    if not (0 <= I[0][0] < rows):
+        raise ValueError("Test search returned no valid result.")
+
+class Snapshot:
+    """One loaded version of the knowledge base, with a count of active readers."""
+
+    def __init__(self, bundle):
+        self.bundle = bundle
+        self.version = bundle.get("snapshot_version", 0)
+        self.loaded_at = time.time()
+        self.readers = 0
+        self.retired = False
+
+class SnapshotManager:
+    """
+    Serves the knowledge base to live calls and swaps in new versions without
+    a restart.
+
+    Readers use 'with manager.acquire() as index:'; the snapshot they get stays
+    valid for the whole block even if a reload happens meanwhile. 'reload'
+    loads and validates the new files off the request path and then publishes
+    them with a single reference assignment. A replaced snapshot is released
+    as soon as its last reader leaves, which unmaps its files.
+    """
+
+    def __init__(self, index_path, meta_path):
+        self.index_path = str(index_path)
+        self.meta_path = str(meta_path)
+        self._current = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._file_stamp = None
+        self._watcher = None
+        self._stop = threading.Event()
+        self.reloads = 0
+        self.failed_reloads = 0
+
+    # --- reading ---
+
+    @property
+    def version(self):
+        """Snapshot version currently served (None when nothing is loaded)."""
+        current = self._current
+        return current.version if current else None
+
+    def status(self) -> dict:
+        """Monitoring info about the served snapshot."""
+        current = self._current
+        return {
+            "version": current.version if current else None,
+            "loaded_at": current.loaded_at if current else None,
+            "rows": len(current.bundle["texts"]) if current else 0,
+            "reloads": self.reloads,
+            "failed_reloads": self.failed_reloads,
+        }
+
+    @contextmanager
+    def acquire(self):
+        """Yields the current bundle (or None) and pins it until the block exits."""
+        with self._lock:
+            snapshot = self._current
+            if snapshot is not None:
+                snapshot.readers += 1
+        try:
+            yield snapshot.bundle if snapshot else None
+        finally:
+            if snapshot is not None:
+                self._release(snapshot)
+
+    def _release(self, snapshot):
+        with self._lock:
+            snapshot.readers -= 1
+            if snapshot.retired and snapshot.readers == 0:
+                snapshot.bundle = None
+
+    # --- loading ---
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.meta_path)
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def reload(self, retries=3) -> bool:
+        """
+        Loads the files on disk and, if they hold a different snapshot, swaps
+        them in. Safe to call from any thread.
+
+        Returns:
+            bool: True if a new snapshot is now being served.
+        """
+        with self._reload_lock:
+            stamp = self._stamp()
+            bundle = None
+            for attempt in range(retries):
+                try:
+                    bundle = load_faiss_index(self.index_path, self.meta_path, verify=True)
+                    if bundle is not None:
+                        validate_bundle(bundle)
+                    break
+                except Exception as e:
+                    # Usually a save in progress: the two files are from different snapshots.
+                    bundle = None
+                    logger.warning(f"Snapshot load failed (attempt {attempt + 1}): {e}")
+                    time.sleep(0.5 * (attempt + 1))
+
+            if bundle is None:
+                self.failed_reloads += 1
+                return False
+
+            self._file_stamp = stamp
+            new = Snapshot(bundle)
+            old = self._current
+            if old is not None and old.version == new.version:
+                return False
+
+            # The swap itself: readers that already hold 'old' keep using it.
+            self._current = new
+            self.reloads += 1
+            logger.info(f"Serving knowledge base snapshot {new.version} ({len(bundle['texts'])} chunks).")
+
+            if old is not None:
+                with self._lock:
+                    old.retired = True
+                    if old.readers == 0:
+                        old.bundle = None
+            return True
+
+    def reload_async(self):
+        """Runs 'reload' on a background thread so a live call never waits for it."""
+        thread = threading.Thread(target=self.reload, name="kb-snapshot-reload", daemon=True)
+        thread.start()
+        return thread
+
+    def watch(self, interval: float):
+        """Polls the knowledge-base file every 'interval' seconds and reloads when it changes."""
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+
+        def _poll():
+            while not self._stop.wait(interval):
+                stamp = self._stamp()
+                if stamp is not None and stamp != self._file_stamp:
+                    self.reload()
+
+        self._watcher = threading.Thread(target=_poll, name="kb-snapshot-watch", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
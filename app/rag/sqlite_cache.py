@@ -0,0 +1,134 @@
+# app/rag/sqlite_cache.py
+import os
+import sqlite3
+import threading
+import time
+
+class SQLiteLRUCache:
+    """
+    A size-bounded, on-disk key-value store backed by one SQLite table.
+
+    Subclasses name the table and its value columns, and convert a value to
+    and from those columns ('_encode' / '_decode'). When the cache grows past
+    'max_entries', the least recently used entries are evicted first.
+    Hit/miss counters accumulate for the lifetime of the object.
+    """
+
+    table = "entries"
+    # (name, SQL type) of the columns that hold one value.
+    columns = (("value", "BLOB"),)
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._names = ", ".join(name for name, _ in self.columns)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(f'''
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                {"".join(f"{name} {kind}, " for name, kind in self.columns)}
+                last_used REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_{self.table}_last_used ON {self.table}(last_used);
+        ''')
+
+    def _encode(self, value) -> tuple:
+        return (value,)
+
+    def _decode(self, row):
+        return row[0]
+
+    def get_many(self, keys):
+        """
+        Looks up several keys at once.
+
+        Returns:
+            dict: key -> value for every key that was found.
+        """
+        unique = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            # SQLite limits the number of '?' placeholders, so we query in slices.
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, {self._names} FROM {self.table} "
+                    f"WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                for key, *row in rows:
+                    found[key] = self._decode(row)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET last_used = ? WHERE key = ?",
+                    [(now, k) for k in found],
+                )
+                self._conn.commit()
+
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, items):
+        """
+        Stores (key, value) pairs and evicts the oldest entries if the cache is full.
+        """
+        now = time.time()
+        rows = [(key, *self._encode(value), now) for key, value in items]
+        if not rows:
+            return
+
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, {self._names}, last_used) "
+                f"VALUES ({', '.join('?' * (len(self.columns) + 2))})",
+                rows,
+            )
+            count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def put(self, key: str, value):
+        """Stores one value (see put_many)."""
+        self.put_many([(key, value)])
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self) -> dict:
+        """Counters for monitoring how much work the cache saved."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+        }
+
+    def reset_stats(self):
+        """Zeroes the counters, e.g. at the start of a rebuild."""
+        self.hits = self.misses = self.evictions = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
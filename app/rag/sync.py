@@ -1,98 +1,251 @@
 # app/rag/sync.py
 import os
-from typing import List
-from .utils import file_hash, load_manifest, save_manifest
-from .pdf_loader import load_all_pdfs_text
-from .image_reader import load_all_images_text
-from .chunker import chunk_text
-from .embeddings import embed_texts
-from .vector_store import create_faiss_index
+from typing import Dict, List
+from .config import INDEX_PATH, KB_PATH
+from .utils import load_manifest, save_manifest, manifest_hash, scan_files, source_category
+from .pdf_loader import load_all_pdfs_text, load_pdfs_text
+from .image_reader import SUPPORTED_EXT, load_all_images_text, load_images_text
+from .chunker import iter_chunks
+from .embeddings import embed_texts, drop_failed, format_cache_stats, reset_cache_stats, get_backend
+from .vector_store import create_faiss_index, load_faiss_index, save_faiss_index, MutableVectorStore
 
 def gather_files(pdf_dir: str, img_dir: str) -> List[str]:
     """
     Scans both PDF and Image folders to create a list of all current files.
+    Paths are absolute, so the manifest matches however the folders were named.
     """
+    pdf_dir, img_dir = os.path.abspath(pdf_dir), os.path.abspath(img_dir)
     files = []
     # Check PDF folder
     if os.path.isdir(pdf_dir):
         for fn in os.listdir(pdf_dir):
             if fn.lower().endswith(".pdf"):
                 files.append(os.path.join(pdf_dir, fn))
-    
+
     # Check Image folder
     if os.path.isdir(img_dir):
         for fn in os.listdir(img_dir):
-            if fn.lower().endswith((".png", ".jpg", ".jpeg", ".webp")):
+            if fn.lower().endswith(SUPPORTED_EXT):
                 files.append(os.path.join(img_dir, fn))
     return sorted(files)
 
 def build_documents_list(pdf_dir: str, img_dir: str, client=None) -> list:
     """
-    Aggregates all content from loaders. 
-    Assumes loaders return: [{"text": "...", "source": "filename"}, ...]
+    Aggregates all content from loaders.
+    Assumes loaders return: [{"text": "...", "source": "filename", "doc_id": "..."}, ...]
     """
     pdf_docs = load_all_pdfs_text(pdf_dir)
     image_docs = load_all_images_text(img_dir, client)
     return pdf_docs + image_docs
 
-def sync_and_rebuild(pdf_dir: str, img_dir: str, client) -> bool:
+def load_documents(paths: List[str], client=None, workers=None) -> list:
+    """Like build_documents_list, but only for the given files ('workers': PDF extraction processes)."""
+    pdfs = [p for p in paths if p.lower().endswith(".pdf")]
+    images = [p for p in paths if p.lower().endswith(SUPPORTED_EXT)]
+    return load_pdfs_text(pdfs, workers) + (load_images_text(images, client) if images else [])
+
+def classify_changes(manifest: Dict[str, str], current: Dict[str, str]) -> Dict[str, List[str]]:
     """
-    The main logic: Detects changes and rebuilds the index only if necessary.
+    Compares the last known state (manifest) with the current one, both
+    {path: content hash}, and sorts every path into one of four lists.
     """
-    # 1. Load the 'Last Known State' (manifest.json)
-    manifest = load_manifest()
-    
-    # 2. Get the 'Current State' of the folders
-    files = gather_files(pdf_dir, img_dir)
-    current_map = {}
-    for f in files:
-        try:
-            # Generate a unique fingerprint (hash) based on file content
-            current_map[f] = file_hash(f)
-        except Exception:
-            current_map[f] = None
-
-    # 3. Compare: Has anything changed?
-    # Check for new or deleted files
-    files_added_or_removed = set(manifest.keys()) != set(current_map.keys())
-    
-    # Check if existing files were edited
-    content_changed = any(manifest.get(k) != current_map.get(k) for k in current_map)
-
-    if not (files_added_or_removed or content_changed):
-        print(" Data is in sync. No rebuild needed.")
-        return False
+    changes = {"added": [], "modified": [], "removed": [], "unchanged": []}
+    for path, digest in current.items():
+        if path not in manifest:
+            changes["added"].append(path)
+        elif manifest[path] != digest:
+            changes["modified"].append(path)
+        else:
+            changes["unchanged"].append(path)
+    changes["removed"] = sorted(set(manifest) - set(current))
+    return changes
+
+def document_chunks(doc: dict):
+    """Splits one document into (texts, metadatas) for the knowledge base."""
+    texts, metadatas = [], []
+    source = doc["source"]
+    for i, chunk in enumerate(iter_chunks(doc["text"])):
+        texts.append(chunk["text"])
+        # Metadata allows the bot to say "I found this in file X"
+        # ('chunk' lets context assembly stitch neighbouring chunks back together,
+        # 'char_start'/'char_end' locate the chunk in the extracted text)
+        metadatas.append({
+            "source": source,
+            "category": source_category(source),
+            "doc_id": doc["doc_id"],
+            "chunk": i,
+            "char_start": chunk["start"],
+            "char_end": chunk["end"],
+            "text_preview": chunk["text"][:100] # Useful for debugging
+        })
+    return texts, metadatas
+
+def embed_documents(docs: list):
+    """
+    Chunks and embeds several documents with one embed_texts call, so small
+    files share batched requests.
 
-    print(" Changes detected! Rebuilding FAISS index...")
+    Returns:
+        list: (doc, vectors, texts, metadatas) per document, failed chunks dropped.
+    """
+    chunked = [(doc, *document_chunks(doc)) for doc in docs]
+    vectors = embed_texts([t for _, texts, _ in chunked for t in texts])
+    results, offset = [], 0
+    for doc, texts, metadatas in chunked:
+        doc_vectors = vectors[offset:offset + len(texts)]
+        offset += len(texts)
+        results.append((doc, *drop_failed(doc_vectors, texts, metadatas)))
+    return results
+
+def format_sync_report(report: dict) -> str:
+    """Summary of one sync, e.g. '1 added, 1 modified, 0 removed, 8 unchanged; ...'."""
+    return (f"Sync: {report['added']} added, {report['modified']} modified, "
+            f"{report['removed']} removed, {report['unchanged']} unchanged, "
+            f"{report['duplicates']} duplicates "
+            f"({report['files_hashed']} files hashed, the rest confirmed by stat); "
+            f"{report['chunks_embedded']} chunks embedded, {report['chunks_reused']} reused "
+            f"(embeddings avoided), {report['chunks_removed']} removed; "
+            f"{report['vision_calls_skipped']} image descriptions and "
+            f"{report['pdfs_skipped']} PDF extractions skipped.")
+
+def sync_documents(pdf_dir: str, img_dir: str, client, index_path=INDEX_PATH, kb_path=KB_PATH,
+                   workers=None) -> dict:
+    """
+    Brings the saved knowledge base in line with the PDF and image folders.
 
-    # 4. Save the new state so we don't rebuild again next time
-    save_manifest(current_map)
+    Each file is classified against the manifest as added, modified, removed or
+    unchanged. Only added and modified files are extracted (or described by the
+    Vision model), chunked and embedded; the chunks and vectors of unchanged
+    files are kept as they are in the saved knowledge base. The result is
+    written with the atomic save of vector_store, and the manifest is only
+    updated once that succeeded, so an interrupted sync is simply redone.
+
+    'workers' caps the PDF extraction processes (see pdf_loader.ingest_workers).
+
+    Returns:
+        dict: How many files fell in each class and how much work was skipped
+        (see format_sync_report).
+    """
+    # 1. Load the 'Last Known State' (manifest.json) and the saved knowledge base
+    saved_manifest = load_manifest()
+    manifest = {os.path.abspath(p): e for p, e in saved_manifest.items()}
+    bundle = load_faiss_index(str(index_path), str(kb_path))
+    store = MutableVectorStore(bundle) if bundle is not None else None
 
-    # 5. Extract all text from files
-    docs = build_documents_list(pdf_dir, img_dir, client)
-    
-    all_chunks = []
-    metadatas = []
+    # 2. Get the 'Current State' of the folders. A file whose size, mtime and
+    # inode match its manifest entry is confirmed with a stat call; the others
+    # are hashed (streamed, on a thread pool) to tell real edits from touches.
+    entries = scan_files(gather_files(pdf_dir, img_dir), manifest)
+    current_map = {f: entry["hash"] for f, entry in entries.items()}
 
-    # 6. Process each document into chunks
+    # 3. Classify every file. The saved knowledge base has the final word: a
+    # file whose current content is already indexed counts as unchanged (e.g.
+    # on the first sync after ingest.py), and one the manifest calls unchanged
+    # but whose chunks are missing (e.g. after an interrupted run) is redone.
+    changes = classify_changes({f: manifest_hash(e) for f, e in manifest.items()}, current_map)
+    if store is None:
+        changes["added"] += changes.pop("modified") + changes.pop("unchanged")
+        changes["modified"], changes["unchanged"] = [], []
+    else:
+        indexed = {p for p in current_map
+                   if store.doc_ids_for_source(os.path.basename(p)) == [current_map[p]]}
+        stale = [p for p in changes["unchanged"] if p not in indexed]
+        for key in ("added", "modified"):
+            changes[key] = [p for p in changes[key] if p not in indexed]
+        changes["unchanged"] = sorted(indexed)
+        changes["modified"] += stale
+
+    # A file with the same content as an indexed one (a copy under another
+    # name) would get the same doc ID: it is not extracted or embedded again.
+    protected = {current_map[p] for p in changes["unchanged"]}
+    seen, duplicates = set(protected), []
+    for path in changes["added"] + changes["modified"]:
+        if current_map[path] in seen:
+            duplicates.append(path)
+        seen.add(current_map[path])
+    # One the manifest already recorded in this state has nothing left to do.
+    known = {p for p in duplicates if manifest_hash(manifest.get(p)) == current_map[p]}
+    for key in ("added", "modified"):
+        changes[key] = [p for p in changes[key] if p not in known]
+
+    unchanged = changes["unchanged"] + duplicates
+    report = {key: len(paths) for key, paths in changes.items()}
+    report.update({
+        "files_hashed": sum(1 for entry in entries.values() if entry["rehashed"]),
+        "chunks_embedded": 0,
+        "chunks_removed": 0,
+        "chunks_reused": store.live_count if store is not None else 0,
+        "duplicates": len(duplicates),
+        "vision_calls_skipped": sum(1 for p in unchanged if p.lower().endswith(SUPPORTED_EXT)),
+        "pdfs_skipped": sum(1 for p in unchanged if p.lower().endswith(".pdf")),
+    })
+
+    affected = changes["added"] + changes["modified"]
+    if not (affected or changes["removed"]):
+        print(" Data is in sync. No rebuild needed.")
+        if report["files_hashed"] or set(saved_manifest) != set(entries):
+            save_manifest(entries)
+        return report
+
+    print(f" Changes detected: {len(changes['added'])} added, {len(changes['modified'])} modified, "
+          f"{len(changes['removed'])} removed.")
+
+    # 4. Drop the old chunks of removed and modified files: the documents the
+    # manifest recorded for them, plus whatever is still filed under the name
+    # of a modified file or of a file that is gone. The documents of unchanged
+    # files are never touched, even if a removed path shared their content.
+    if store is not None:
+        current_names = {os.path.basename(p) for p in current_map}
+        stale_ids = set()
+        for path in changes["removed"] + changes["modified"]:
+            stale_ids.add(manifest_hash(manifest.get(path)))
+            if path in current_map or os.path.basename(path) not in current_names:
+                stale_ids.update(store.doc_ids_for_source(os.path.basename(path)))
+        for doc_id in stale_ids - protected - {None}:
+            report["chunks_removed"] += store.delete_document(doc_id)
+        report["chunks_reused"] = store.live_count
+
+    # 5. Extract, chunk and embed only the affected files
+    # (the content hash from step 2 doubles as the document ID)
+    to_load = [p for p in affected if p not in duplicates]
+    reset_cache_stats()
+    docs = load_documents(to_load, client, workers)
     for doc in docs:
-        body = doc["text"]
-        source = doc["source"]
-
-        chunks = chunk_text(body)
-        for c in chunks:
-            all_chunks.append(c)
-            # Metadata allows the bot to say "I found this in file X"
-            metadatas.append({
-                "source": source,
-                "text_preview": c[:100] # Useful for debugging
-            })
-
-    # 7. Create New Mathematical Vectors
-    embeddings = embed_texts(all_chunks)
-    
-    # 8. Update the FAISS index file
-    create_faiss_index(embeddings, all_chunks, metadatas)
-    
-    print(f" Index rebuilt successfully with {len(all_chunks)} chunks.")
-    return True
\ No newline at end of file
+        doc["doc_id"] = current_map[doc["path"]]
+    embedded = embed_documents(docs)
+    print(f" {format_cache_stats()}")
+
+    # 6. Persist the updated knowledge base, then the manifest
+    if store is not None:
+        for doc, vectors, texts, metadatas in embedded:
+            # Left over under the name of a file the manifest never knew (e.g. from ingest.py)
+            report["chunks_removed"] += store.delete_document(doc["doc_id"])
+            report["chunks_embedded"] += store.add_document(doc["doc_id"], vectors, texts, metadatas)
+        store.save(str(index_path), str(kb_path))
+        total = store.live_count
+    else:
+        vectors = [v for _, doc_vectors, _, _ in embedded for v in doc_vectors]
+        texts = [t for _, _, doc_texts, _ in embedded for t in doc_texts]
+        metadatas = [m for _, _, _, doc_metas in embedded for m in doc_metas]
+        if not vectors:
+            print(" No text extracted from PDFs or images.")
+            return report
+        report["chunks_embedded"] = len(vectors)
+        save_faiss_index(create_faiss_index(vectors, texts, metadatas, get_backend().name),
+                         str(index_path), str(kb_path))
+        total = len(vectors)
+
+    # Files that yielded no text are left out, so the next sync tries them again
+    loaded = {doc["path"] for doc in docs}
+    save_manifest({p: e for p, e in entries.items() if p in loaded or p not in to_load})
+    print(f" Knowledge base saved with {total} chunks.")
+    print(f" {format_sync_report(report)}")
+    return report
+
+def sync_and_rebuild(pdf_dir: str, img_dir: str, client) -> bool:
+    """
+    The main logic: Detects changes and updates the saved index only if necessary.
+    Returns True if anything was added, modified or removed.
+    """
+    report = sync_documents(pdf_dir, img_dir, client)
+    return bool(report["added"] or report["modified"] or report["removed"])
@@ -0,0 +1,146 @@
+# app/rag/text_normalize.py
+"""
+Cleans up text extracted from PDFs before it is chunked.
+
+PyPDF2 returns most of our PDFs one word per line, with a line holding a
+single space between every two words:
+
+    'Daily\\n \\nHousekeeping\\n \\nServices\\n \\n \\n●\\n \\nConcept:'
+
+A quarter of every chunk was that whitespace, which inflated the chunk count,
+the embedding tokens and the prompt tokens alike. The blank lines between fragments
+still say where words, lines and paragraphs end, so the text is rebuilt from
+them: one blank line is a space, two a line break, three or more a paragraph.
+Text extracted with ordinary line breaks has its soft-wrapped lines joined.
+In both cases words hyphenated across a break are joined, and bullets and
+numbered headings stay at the start of their own line.
+
+Word processors only break lines at hyphens that are part of the word
+("same-day"), so those are kept; in text with ordinary line breaks a hyphen
+at the end of a line splits a word and is dropped.
+"""
+import re
+import unicodedata
+
+from .chunker import chunk_text
+from .config import NORMALIZE_CHUNK_STATS
+
+# Glyphs that start a list item.
+BULLETS = "•●○◦▪▫■□‣⁃∙➢➤►✓✔"
+
+_BULLET = re.compile(rf"^[{BULLETS}]")
+_LIST_ITEM = re.compile(rf"^([{BULLETS}]|[-–*]\s|\d{{1,2}}[.)](\s|$))")
+_LINE_END = re.compile(r"[.:;!?)]$")
+_HYPHENATED = re.compile(r"[^\W\d_]-$")
+_CONTINUES_WORD = re.compile(r"^[^\W\d_A-Z]")
+_SPACE_BEFORE_PUNCT = re.compile(r" +([,.;:!?%)])")
+
+# Lines shorter than this without closing punctuation are headings, not wraps.
+HEADING_MAX_CHARS = 40
+
+# Break levels between two fragments.
+GLUE, SPACE, LINE, PARAGRAPH = range(4)
+
+def _fragments(text):
+    """(fragment, blank lines before it) for every non-blank line."""
+    fragments, gap = [], 0
+    for line in text.split("\n"):
+        line = " ".join(line.split())
+        if line:
+            fragments.append((line, gap))
+            gap = 0
+        else:
+            gap += 1
+    return fragments
+
+def _is_word_per_line(fragments) -> bool:
+    """True for PyPDF2's layout, where most fragments are one blank line apart."""
+    gaps = [gap for _, gap in fragments[1:]]
+    return bool(gaps) and sum(gap == 1 for gap in gaps) > len(gaps) / 2
+
+def _break_level(prev: str, fragment: str, gap: int, word_per_line: bool) -> int:
+    if word_per_line:
+        level = min(gap, PARAGRAPH)
+        if level < LINE and _BULLET.match(fragment):
+            level = LINE
+    else:
+        level = LINE if gap == 0 else PARAGRAPH
+        if level == LINE and not (_LIST_ITEM.match(fragment) or _LINE_END.search(prev)
+                                  or len(prev) < HEADING_MAX_CHARS):
+            level = SPACE  # a soft-wrapped line
+    return level
+
+def normalize_text(text: str) -> str:
+    """
+    Collapses PDF layout artifacts: rebuilds words, lines and paragraphs,
+    joins hyphenated words and drops stray spaces before punctuation.
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text.replace("\r\n", "\n").replace("\r", "\n"))
+    text = text.replace("\u00ad", "")  # soft hyphens
+    fragments = _fragments(text)
+    if not fragments:
+        return ""
+    word_per_line = _is_word_per_line(fragments)
+
+    paragraphs = [[fragments[0][0]]]  # lists of lines
+    for fragment, gap in fragments[1:]:
+        lines = paragraphs[-1]
+        level = _break_level(lines[-1], fragment, gap, word_per_line)
+        if (level in (SPACE, LINE) and _HYPHENATED.search(lines[-1])
+                and _CONTINUES_WORD.match(fragment) and not _LIST_ITEM.match(fragment)):
+            lines[-1] = (lines[-1] if word_per_line else lines[-1][:-1]) + fragment
+        elif level == GLUE:
+            lines[-1] += fragment
+        elif level == SPACE:
+            lines[-1] += " " + fragment
+        elif level == LINE:
+            lines.append(fragment)
+        else:
+            paragraphs.append([fragment])
+
+    return "\n\n".join(
+        "\n".join(_SPACE_BEFORE_PUNCT.sub(r"\1", line) for line in lines) for lines in paragraphs
+    )
+
+def normalize_pages(pages) -> str:
+    """
+    Normalizes each page's text and joins the pages. A page that starts in
+    the middle of a sentence or a list continues the previous page; any other
+    page starts a new paragraph.
+    """
+    text = ""
+    for page in pages:
+        page = normalize_text(page or "")
+        if not page:
+            continue
+        if not text:
+            text = page
+        elif _HYPHENATED.search(text) and _CONTINUES_WORD.match(page):
+            text += page
+        elif _LIST_ITEM.match(page):
+            text += "\n" + page
+        elif _CONTINUES_WORD.match(page):
+            text += " " + page
+        else:
+            text += "\n\n" + page
+    return text
+
+def normalization_stats(raw: str, clean: str, chunker=chunk_text, chunks=None) -> dict:
+    """
+    Characters of a document before and after normalization. The chunk counts
+    are only added when 'chunks' (default NORMALIZE_CHUNK_STATS) is set, as
+    they cost two extra chunking passes per document.
+    """
+    stats = {"chars_before": len(raw), "chars_after": len(clean)}
+    if NORMALIZE_CHUNK_STATS if chunks is None else chunks:
+        stats.update(chunks_before=len(chunker(raw)), chunks_after=len(chunker(clean)))
+    return stats
+
+def format_normalization_stats(source: str, stats: dict) -> str:
+    """One log line, e.g. 'menu.pdf: 5459 -> 4173 chars' (', 14 -> 11 chunks' with chunk counts)."""
+    line = f"{source}: {stats['chars_before']} -> {stats['chars_after']} chars"
+    if "chunks_before" in stats:
+        line += f", {stats['chunks_before']} -> {stats['chunks_after']} chunks"
+    return line
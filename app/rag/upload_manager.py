@@ -7,10 +7,13 @@ from typing import List, Optional, Dict, Any
 from PyPDF2 import PdfReader
 
 # Core RAG logic imports
-from .image_loader import image_to_text
-from .chunker import chunk_text
-from .embeddings import embed_texts
-from .vector_store import create_faiss_index
+from .image_loader import describe_image
+from .chunker import iter_chunks
+from .embeddings import embed_texts, drop_failed, get_backend
+from .vector_store import create_faiss_index, chunk_memory_bytes, bundle_memory_bytes
+from .config import SESSION_INDEX_MAX_MB
+from .utils import file_hash, source_category
+from .text_normalize import normalize_pages, normalization_stats, format_normalization_stats
 
 # Configuration for supported formats
 SUPPORTED_IMAGE_EXT = (".png", ".jpg", ".jpeg", ".webp")
@@ -76,14 +79,14 @@ def load_text_from_file(path: str, client: Any) -> Dict[str, Any]:
     if filename.lower().endswith(".pdf"):
         try:
             reader = PdfReader(path)
-            text = ""
-            for page in reader.pages:
-                extracted = page.extract_text()
-                if extracted:
-                    text += extracted + "\n"
+            pages = [page.extract_text() or "" for page in reader.pages]
+            text = normalize_pages(pages)
+            stats = normalization_stats("\n".join(pages), text)
+            logger.info(f"Normalized {format_normalization_stats(filename, stats)}")
             return {
-                "text": text.strip(), 
+                "text": text, 
                 "source": filename, 
+                "doc_id": file_hash(path),
                 "type": "upload"
             }
         except Exception as e:
@@ -93,10 +96,11 @@ def load_text_from_file(path: str, client: Any) -> Dict[str, Any]:
     # Logic for Image processing using Vision AI
     elif filename.lower().endswith(SUPPORTED_IMAGE_EXT):
         try:
-            text = image_to_text(path, client)
+            text = describe_image(path, client)
             return {
                 "text": text, 
                 "source": filename, 
+                "doc_id": file_hash(path),
                 "type": "upload"
             }
         except Exception as e:
@@ -106,10 +110,29 @@ def load_text_from_file(path: str, client: Any) -> Dict[str, Any]:
     else:
         raise ValueError(f"Incompatible file format encountered: {filename}")
 
-def build_temp_index(tmp_dir: str, client: Any) -> Optional[Dict[str, Any]]:
+def cap_session_chunks(chunks: List[str], metadatas: List[Dict[str, Any]], dim: int,
+                       max_bytes: int):
+    """
+    Keeps chunks, in upload order, while the session index stays under 'max_bytes'.
+    Returns the kept (chunks, metadatas).
+    """
+    used = 0
+    for i, chunk in enumerate(chunks):
+        used += chunk_memory_bytes(chunk, dim)
+        if used > max_bytes:
+            logger.warning(
+                f"Session index memory cap ({max_bytes / 2**20:.0f} MB) reached: "
+                f"{len(chunks) - i} of {len(chunks)} chunks were not indexed."
+            )
+            return chunks[:i], metadatas[:i]
+    return chunks, metadatas
+
+def build_temp_index(tmp_dir: str, client: Any, max_mb: Optional[int] = None) -> Optional[Dict[str, Any]]:
     """
     Orchestrates the creation of a FAISS index from all files in the tmp directory.
     This index lives in memory for the duration of the session.
+    It is capped at 'max_mb' megabytes (default SESSION_INDEX_MAX_MB); chunks past
+    the cap are dropped before they are embedded.
     """
     if not os.path.isdir(tmp_dir):
         logger.error(f"Temporary directory {tmp_dir} does not exist.")
@@ -134,30 +157,43 @@ def build_temp_index(tmp_dir: str, client: Any) -> Optional[Dict[str, Any]]:
     for doc in docs:
         if not doc["text"]: continue # Skip empty extractions
         
-        doc_chunks = chunk_text(doc["text"])
-        all_chunks.extend(doc_chunks)
-        
-        # Link each chunk back to its source file and timestamp
-        for chunk in doc_chunks:
+        # Link each chunk back to its source file, position and timestamp
+        for i, chunk in enumerate(iter_chunks(doc["text"])):
+            all_chunks.append(chunk["text"])
             all_metadatas.append({
                 "source": doc["source"],
+                "category": source_category(doc["source"]),
+                "doc_id": doc.get("doc_id"),
+                "chunk": i,
+                "char_start": chunk["start"],
+                "char_end": chunk["end"],
                 "type": doc["type"],
                 "updated_at": timestamp,
-                "text_preview": chunk[:100] # Useful for tracing sources in logs
+                "text_preview": chunk["text"][:100] # Useful for tracing sources in logs
             })
 
     # Step 3: Embedding and Vector Store creation
+    max_bytes = (SESSION_INDEX_MAX_MB if max_mb is None else max_mb) * 2**20
+    all_chunks, all_metadatas = cap_session_chunks(all_chunks, all_metadatas, get_backend().dim, max_bytes)
+    if not all_chunks:
+        return None
     logger.info(f"Generating embeddings for {len(all_chunks)} temporary chunks...")
     vectors = embed_texts(all_chunks)
+    vectors, all_chunks, all_metadatas = drop_failed(vectors, all_chunks, all_metadatas)
+    if not vectors:
+        logger.error("No chunk of the uploaded files could be embedded; no session index built.")
+        return None
     
     # Build the FAISS structure
     index = create_faiss_index(
         vectors=vectors, 
         texts=all_chunks, 
-        metadatas=all_metadatas
+        metadatas=all_metadatas,
+        embedding_backend=get_backend().name
     )
     
-    logger.info("Successfully built session-specific temporary index.")
+    logger.info(f"Successfully built session-specific temporary index "
+                f"({bundle_memory_bytes(index) / 2**20:.1f} MB).")
     return index
 
 def clear_tmp_dir(tmp_dir: str) -> None:
@@ -2,18 +2,100 @@
 import os
 import hashlib
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from .config import HASH_WORKERS, MANIFEST_PATH
 
-MANIFEST_PATH = "data/manifest.json"
+HASH_BLOCK_SIZE = 1 << 20
+
+# The tokenizer is loaded lazily and only once. If tiktoken (or its encoding file)
+# is unavailable we fall back to the "1 token ~ 4 characters" rule of thumb.
+_encoder = None
+
+def estimate_tokens(text: str) -> int:
+    """
+    Returns the number of tokens a piece of text will cost the OpenAI API.
+    Used to keep embedding batches and prompts under their token limits.
+    """
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoder = False
+
+    if _encoder:
+        return len(_encoder.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
 
 def file_hash(path: str) -> str:
     """
     Creates a unique fingerprint for a file.
     If even one character changes in a PDF, this hash will be completely different.
     """
-    # 'rb' means read binary, which is required for images and PDFs
+    # 'rb' means read binary, which is required for images and PDFs. The file is
+    # read in 1 MB blocks so a large PDF is never held in memory as a whole;
+    # blake2b is at least as fast as MD5 and releases the GIL while hashing.
+    h = hashlib.blake2b(digest_size=16)
     with open(path, "rb") as f:
-        # We use MD5 for speed; it's perfect for checking if files changed
-        return hashlib.md5(f.read()).hexdigest()
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _stat_entry(st: os.stat_result) -> dict:
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino}
+
+def manifest_hash(entry):
+    """The content hash of a manifest entry (manifests used to store bare hashes)."""
+    return entry if isinstance(entry, str) else (entry or {}).get("hash")
+
+def file_fingerprint(path: str, previous=None) -> dict:
+    """
+    The manifest entry of a file: its size, mtime and inode plus its content hash.
+
+    If 'previous' (the entry from the last run) has the same size, mtime and
+    inode, the file is taken as unchanged and its hash is reused, so confirming
+    an unchanged file costs one stat call instead of reading it.
+    """
+    st = os.stat(path)
+    entry = _stat_entry(st)
+    if isinstance(previous, dict) and previous.get("hash") and \
+            all(previous.get(k) == v for k, v in entry.items()):
+        return {**entry, "hash": previous["hash"], "rehashed": False}
+    return {**entry, "hash": file_hash(path), "rehashed": True}
+
+def scan_files(paths, manifest: dict, workers: int = HASH_WORKERS) -> dict:
+    """
+    Fingerprints many files, hashing the ones whose stat changed on a pool of
+    threads.
+
+    A file that cannot be read right now (e.g. still being copied) keeps its
+    entry from 'manifest', or is left out if it had none.
+
+    Returns:
+        dict: path -> manifest entry (see file_fingerprint); 'rehashed' tells
+        whether the content was read.
+    """
+    def fingerprint(path):
+        try:
+            return file_fingerprint(path, manifest.get(path))
+        except OSError as e:
+            print(f" Could not read {os.path.basename(path)}: {e}")
+            return None
+
+    paths = list(paths)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        entries = dict(zip(paths, pool.map(fingerprint, paths)))
+
+    result = {}
+    for path, entry in entries.items():
+        if entry is None:
+            if not manifest_hash(manifest.get(path)):
+                continue
+            entry = {"hash": manifest_hash(manifest[path]), "rehashed": False}
+        result[path] = entry
+    return result
 
 def load_manifest() -> dict:
     """
@@ -32,11 +114,41 @@ def load_manifest() -> dict:
 def save_manifest(manifest_data: dict):
     """
     Saves the current state of files to manifest.json.
+
+    The file is written next to the old one and renamed over it, so a crash
+    mid-write leaves the previous manifest intact instead of a truncated one.
     """
     # Ensure the directory exists before saving
     os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
-    with open(MANIFEST_PATH, "w") as f:
-        json.dump(manifest_data, f, indent=4)
+    entries = {path: {k: v for k, v in entry.items() if k != "rehashed"} if isinstance(entry, dict) else entry
+               for path, entry in manifest_data.items()}
+    tmp_path = f"{MANIFEST_PATH}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(entries, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, MANIFEST_PATH)
+
+# Service categories, named like the hotline categories in tools/hotline_tools.py,
+# with the words that identify them in a file name or a guest's request.
+CATEGORY_KEYWORDS = {
+    "Food": ("food", "restaurant", "dining", "menu", "breakfast", "lunch", "dinner", "meal", "room service", "drink"),
+    "Laundry": ("laundry", "housekeeping", "wash", "iron", "dry clean", "towel", "linen"),
+    "Medical": ("medical", "doctor", "medicine", "clinic", "first aid", "sick", "nurse"),
+    "Bellhop": ("bellhop", "luggage", "baggage", "bags", "porter", "suitcase"),
+}
+
+def text_category(text: str):
+    """The service category a text (file name or guest request) is about, or None."""
+    text = text.lower()
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if any(re.search(rf"\b{re.escape(k)}", text) for k in keywords):
+            return category
+    return None
+
+def source_category(source: str) -> str:
+    """Category tag for a knowledge-base file, derived from its name ("General" if none fits)."""
+    return text_category(source or "") or "General"
 
 def file_metadata(path: str, version: int = 1):
     """
@@ -46,6 +158,7 @@ def file_metadata(path: str, version: int = 1):
     return {
         "doc_id": file_hash(path),
         "doc_name": os.path.basename(path),
+        "category": source_category(os.path.basename(path)),
         "updated_at": int(os.path.getmtime(path)), # The timestamp of the last edit
         "version": version,
         "priority": version,
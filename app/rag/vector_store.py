@@ -2,57 +2,779 @@
 import faiss
 import numpy as np
 import pickle
+import math
 import os
+import sys
+import threading
+import time
+from .config import (
+    FAISS_INDEX_TYPE, COMPACTION_TOMBSTONE_RATIO, VECTOR_STORAGE, RERANK_FACTOR,
+    PARTITION_EXACT_MAX_ROWS,
+)
+from .kb_format import is_knowledge_base, open_knowledge_base, write_knowledge_base, KnowledgeBaseWriter
+from .lexical import BM25Index
+from .utils import file_hash, source_category
 
-def create_faiss_index(vectors, texts, metadatas):
+# Read FAISS indexes through mmap where this FAISS build supports it
+# (flat indexes are then shared through the page cache instead of copied).
+_FAISS_READ_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", getattr(faiss, "IO_FLAG_MMAP", 0))
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+# Knowledge bases saved before index types existed are all exact (flat) indexes.
+FLAT_PARAMS = {"type": "flat", "factory": "Flat"}
+
+# FAISS factory suffix for each vector storage mode.
+STORAGE_CODES = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+
+def choose_index_type(count: int) -> str:
+    """
+    The "auto" policy. Exact search is fastest below ~10k vectors; HNSW gives the
+    best latency/recall up to a few hundred thousand; beyond that IVF keeps
+    build time and memory in check, and PQ compresses very large corpora.
+    """
+    if count < 10_000:
+        return "flat"
+    if count < 200_000:
+        return "hnsw"
+    if count < 2_000_000:
+        return "ivf_flat"
+    return "ivf_pq"
+
+def index_params(index_type: str, count: int, dim: int, storage: str = "float32") -> dict:
+    """
+    Derives build and search parameters for an index type from the corpus size.
+    The result is stored with the knowledge base, so a reload uses the same values.
+
+    'storage' ("float32", "float16" or "int8") picks how flat, HNSW and IVF-Flat
+    indexes store their vectors. IVF-PQ is compressed by construction.
+    """
+    if index_type == "auto":
+        index_type = choose_index_type(count)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type '{index_type}'. Choose one of: auto, {', '.join(INDEX_TYPES)}")
+    if index_type == "ivf_pq":
+        storage = "pq"
+    elif storage not in STORAGE_CODES:
+        raise ValueError(f"Unknown vector storage '{storage}'. Choose one of: {', '.join(STORAGE_CODES)}")
+
+    codes = STORAGE_CODES.get(storage)
+    params = {"type": index_type, "storage": storage}
+    if index_type == "flat":
+        params["factory"] = codes
+    elif index_type == "hnsw":
+        params.update(M=32, efConstruction=80, efSearch=64)
+        params["factory"] = f"HNSW{params['M']}" + ("" if codes == "Flat" else f",{codes}")
+    else:
+        # ~4*sqrt(n) lists is the usual rule; k-means wants ~39 points per list.
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+        params.update(nlist=nlist, nprobe=min(nlist, 128, max(8, nlist // 16)))
+        if index_type == "ivf_flat":
+            params["factory"] = f"IVF{nlist},{codes}"
+        else:
+            # m sub-quantizers must divide the dimension; 8 bits per code
+            # needs 256 centroids, so small corpora get fewer bits.
+            m = max(d for d in range(1, min(dim, 64) + 1) if dim % d == 0)
+            nbits = max(1, min(8, int(math.log2(max(count // 39, 2)))))
+            params.update(m=m, nbits=nbits)
+            params["factory"] = f"IVF{nlist},PQ{m}x{nbits}"
+    return params
+
+def apply_search_params(index, params):
+    """Sets the query-time knobs (nprobe / efSearch) recorded in 'params'."""
+    space = faiss.ParameterSpace()
+    for name in ("nprobe", "efSearch"):
+        if name in params:
+            space.set_index_parameter(index, name, params[name])
+
+def build_index(matrix, index_type=None, storage=None):
+    """
+    Builds and, if needed, trains a FAISS index over a float32 matrix.
+
+    Returns:
+        tuple: (index, params) where 'params' records how it was built.
+    """
+    count, dim = matrix.shape
+    params = index_params(
+        (index_type or FAISS_INDEX_TYPE).lower(), count, dim, (storage or VECTOR_STORAGE).lower()
+    )
+
+    index = faiss.index_factory(dim, params["factory"])
+    if params["type"] == "hnsw":
+        index.hnsw.efConstruction = params["efConstruction"]
+    if not index.is_trained:
+        # IVF centroids, PQ codebooks and int8 value ranges are learned from the
+        # data itself. A sample of 256 points per list is plenty for k-means.
+        sample = matrix
+        max_train = params.get("nlist", 256) * 256
+        if count > max_train:
+            sample = matrix[np.random.default_rng(0).choice(count, max_train, replace=False)]
+        index.train(sample)
+    index.add(matrix)
+    apply_search_params(index, params)
+    return index, params
+
+def create_faiss_index(vectors, texts, metadatas, embedding_backend="openai", index_type=None,
+                       storage=None):
     """
     Creates a high-speed search index.
+
+    'embedding_backend' names the backend that produced the vectors, so queries
+    can later be embedded into the same vector space. 'index_type' overrides the
+    FAISS_INDEX_TYPE setting ("flat", "ivf_flat", "hnsw", "ivf_pq" or "auto") and
+    'storage' the VECTOR_STORAGE setting ("float32", "float16" or "int8").
     """
     if not vectors:
         raise ValueError("No vectors provided. Please check your PDF/Image folders.")
 
-    dim = len(vectors[0])
-    # IndexFlatL2 is accurate for small-to-medium sized datasets.
-    index = faiss.IndexFlatL2(dim)
-    index.add(np.vstack(vectors).astype("float32"))
+    matrix = np.vstack(vectors).astype("float32")
+    index, params = build_index(matrix, index_type, storage)
 
     return {
         "faiss": index,
+        "index_params": params,
+        "vectors": matrix,
         "texts": texts,
-        "metadatas": metadatas
+        "metadatas": metadatas,
+        "embedding_backend": embedding_backend,
+        # The BM25 index for exact-term lookups is built from the same texts.
+        "lexical": BM25Index.build(texts),
+    }
+
+def chunk_memory_bytes(text: str, dim: int) -> int:
+    """
+    Estimated memory one chunk takes in a flat in-memory bundle: its vector
+    twice (FAISS codes and the float32 'vectors' matrix), its text and a
+    small allowance for metadata and BM25 postings.
+    """
+    return 2 * 4 * dim + 2 * len(text.encode("utf-8")) + 256
+
+def bundle_memory_bytes(index_bundle) -> int:
+    """Estimated memory held by an in-memory bundle (see chunk_memory_bytes)."""
+    dim = index_bundle["faiss"].d
+    return sum(chunk_memory_bytes(t, dim) for t in index_bundle["texts"])
+
+def row_vectors(index_bundle, ids):
+    """float32 vectors of the given rows, from the bundle or read back from FAISS."""
+    ids = np.asarray(ids, dtype=np.int64)
+    vectors = index_bundle.get("vectors")
+    if vectors is not None:
+        return np.asarray(vectors[ids], dtype="float32")
+    index = index_bundle["faiss"]
+    return np.vstack([index.reconstruct(int(i)) for i in ids]) if len(ids) else np.empty((0, index.d), "float32")
+
+def lexical_index(index_bundle):
+    """
+    The bundle's BM25 index. Knowledge bases saved before it existed get one
+    built from their texts on first use.
+    """
+    lexical = index_bundle.get("lexical")
+    if lexical is None:
+        lexical = index_bundle["lexical"] = BM25Index.build(index_bundle["texts"])
+    return lexical
+
+def _search_params(index, selector):
+    """SearchParameters carrying 'selector' plus the index's own nprobe / efSearch."""
+    if isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector)
+        params.efSearch = index.hnsw.efSearch
+        return params
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return faiss.SearchParameters(sel=selector)
+    params = faiss.SearchParametersIVF(sel=selector)
+    params.nprobe = ivf.nprobe
+    return params
+
+# --- PARTITIONS ---
+
+def _column_partitions(metadatas, key):
+    """value -> row IDs for one metadata column."""
+    if hasattr(metadatas, "column"):
+        if key not in metadatas.keys():
+            return {}
+        column = metadatas.column(key)
+        if isinstance(column, tuple):
+            # Category-coded columns (e.g. 'source') split without decoding any row.
+            codes, categories = column
+            return {c: np.flatnonzero(codes == i) for i, c in enumerate(categories)}
+
+    groups = {}
+    for row, meta in enumerate(metadatas):
+        if key in meta:
+            groups.setdefault(meta[key], []).append(row)
+    return {value: np.array(rows, dtype=np.int64) for value, rows in groups.items()}
+
+def partitions(index_bundle, key):
+    """
+    Splits the bundle's rows by a metadata key ('source', 'category', ...).
+    The split is computed once per bundle and cached in it. Knowledge bases
+    built before category tags existed get them derived from 'source'.
+
+    Returns:
+        dict: value -> sorted row IDs.
+    """
+    cache = index_bundle.setdefault("partitions", {})
+    if key not in cache:
+        parts = _column_partitions(index_bundle["metadatas"], key)
+        if not parts and key == "category":
+            for source, rows in partitions(index_bundle, "source").items():
+                category = source_category(source)
+                parts[category] = np.union1d(parts.get(category, np.empty(0, dtype=np.int64)), rows)
+        cache[key] = parts
+    return cache[key]
+
+def filter_rows(index_bundle, filters):
+    """
+    Row IDs matching 'filters', e.g. {"category": "Food"} or
+    {"source": ["Medical support.pdf", "Hotel Facilities .pdf"]}. Several
+    values for one key match any of them; several keys must all match.
+
+    Returns:
+        np.ndarray: sorted row IDs, or None when 'filters' is empty.
+    """
+    if not filters:
+        return None
+    selected = None
+    for key, wanted in filters.items():
+        if isinstance(wanted, (str, bytes)) or not hasattr(wanted, "__iter__"):
+            wanted = [wanted]
+        parts = partitions(index_bundle, key)
+        rows = np.empty(0, dtype=np.int64)
+        for value in wanted:
+            if value in parts:
+                rows = np.union1d(rows, parts[value])
+        selected = rows if selected is None else np.intersect1d(selected, rows)
+    return selected
+
+def _search_rows(index_bundle, queries, top_k, rows):
+    """
+    Searches only 'rows'. A partition small enough is scanned exactly from
+    its own vectors, which is both faster and more accurate than filtering
+    the global index; larger ones go through the index with a row selector.
+    """
+    deleted = index_bundle.get("deleted")
+    if deleted is not None:
+        rows = rows[~deleted[rows]]
+    D = np.full((len(queries), top_k), np.inf, dtype="float32")
+    I = np.full((len(queries), top_k), -1, dtype=np.int64)
+    if not len(rows):
+        return D, I
+
+    vectors = index_bundle.get("vectors")
+    if vectors is not None and len(rows) <= PARTITION_EXACT_MAX_ROWS:
+        k = min(top_k, len(rows))
+        sub_D, local = faiss.knn(queries, np.ascontiguousarray(vectors[rows], dtype="float32"), k)
+        D[:, :k] = sub_D
+        I[:, :k] = np.where(local >= 0, rows[np.maximum(local, 0)], -1)
+        return D, I
+
+    index = index_bundle["faiss"]
+    allowed = np.zeros(index.ntotal, dtype=bool)
+    allowed[rows] = True
+    bitmap = np.packbits(allowed, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(allowed), faiss.swig_ptr(bitmap))
+    return index.search(queries, top_k, params=_search_params(index, selector))
+
+def rerank_exact(vectors, queries, I, top_k):
+    """
+    Re-scores candidate rows with exact float32 L2 distances and keeps the best
+    'top_k' per query. Only the candidate rows of 'vectors' are touched, so a
+    memory-mapped matrix stays mostly on disk.
+
+    Returns:
+        tuple: (D, I) like faiss.
+    """
+    valid = I >= 0
+    rows = vectors[np.where(valid, I, 0)]                       # [nq, k', dim]
+    exact = ((rows - queries[:, None, :]) ** 2).sum(axis=2)
+    exact[~valid] = np.inf
+
+    order = np.argsort(exact, axis=1)[:, :top_k]
+    D = np.take_along_axis(exact, order, axis=1).astype("float32")
+    I = np.take_along_axis(I, order, axis=1)
+    I[np.isinf(D)] = -1
+    return D, I
+
+def search_index(index_bundle, queries, top_k, rerank_factor=None, rows=None):
+    """
+    Runs a k-nearest-neighbour search over a bundle, skipping deleted rows.
+    With 'rows' (see filter_rows) only those rows are searched.
+
+    When the index stores compressed vectors (float16, int8 or PQ codes) and the
+    bundle carries the exact float32 vectors, 'rerank_factor' * top_k candidates
+    are fetched and re-scored exactly (see rerank_exact).
+
+    Args:
+        index_bundle (dict): A bundle from create_faiss_index / load_faiss_index
+            or MutableVectorStore.bundle.
+        queries (np.ndarray): float32 [n_queries, dim].
+        top_k (int): Results per query.
+        rerank_factor (int): Candidate multiplier; defaults to RERANK_FACTOR, 1 disables.
+        rows (np.ndarray): Optional row IDs to restrict the search to.
+
+    Returns:
+        tuple: (D, I) like faiss. Missing results have I == -1.
+    """
+    if rows is not None:
+        return _search_rows(index_bundle, queries, top_k, rows)
+
+    index = index_bundle["faiss"]
+    vectors = index_bundle.get("vectors")
+    storage = index_bundle.get("index_params", FLAT_PARAMS).get("storage", "float32")
+    rerank_factor = RERANK_FACTOR if rerank_factor is None else rerank_factor
+    rerank = storage != "float32" and vectors is not None and rerank_factor > 1
+    k = min(top_k * rerank_factor, index.ntotal) if rerank else top_k
+
+    deleted = index_bundle.get("deleted")
+    if deleted is None or not deleted.any():
+        D, I = index.search(queries, k)
+    else:
+        # Tombstoned rows are excluded inside FAISS with a bitmap selector, so
+        # deleted chunks never take up a top-k slot.
+        bitmap = np.packbits(deleted, bitorder="little")
+        selector = faiss.IDSelectorNot(faiss.IDSelectorBitmap(len(deleted), faiss.swig_ptr(bitmap)))
+        D, I = index.search(queries, k, params=_search_params(index, selector))
+
+    if rerank:
+        return rerank_exact(vectors, queries, I, top_k)
+    return D, I
+
+def _bundle_vectors(index_bundle):
+    """The float32 vector matrix of a bundle, rebuilt from FAISS if it was not kept."""
+    vectors = index_bundle.get("vectors")
+    if vectors is None:
+        index = index_bundle["faiss"]
+        vectors = index.reconstruct_n(0, index.ntotal)
+    return vectors
+
+def _write_faiss_file(index, index_path) -> str:
+    """Writes a FAISS index atomically. Returns the digest of the written file."""
+    tmp_index_path = f"{index_path}.tmp-{os.getpid()}"
+    faiss.write_index(index, tmp_index_path)
+    index_digest = file_hash(tmp_index_path)
+    os.replace(tmp_index_path, index_path)
+    return index_digest
+
+def _snapshot_attrs(embedding_backend, params, index_digest, lexical_attrs) -> dict:
+    """The bundle-level attrs stored in a knowledge-base file."""
+    return {
+        "embedding_backend": embedding_backend,
+        "index_params": params,
+        # Milliseconds since the epoch: unique per save and increasing over time.
+        "snapshot_version": time.time_ns() // 1_000_000,
+        "index_digest": index_digest,
+        "lexical": lexical_attrs,
     }
 
 def save_faiss_index(index_bundle, index_path, meta_path):
     """
     Saves the mathematical index and text data to disk.
+
+    Both files are written to a temporary name first and then renamed into
+    place, so a running process never loads a half-written knowledge base.
+    Every save is a new snapshot: the knowledge-base file records a snapshot
+    version and a digest of the FAISS file it belongs to, so a reader can tell
+    when it picked up the index of one save and the texts of another.
     """
     # 1. Save the FAISS index (the math part)
-    faiss.write_index(index_bundle["faiss"], index_path)
-    
-    # 2. Save the texts and metadatas (the human part) using pickle
-    with open(meta_path, "wb") as f:
-        pickle.dump({
-            "texts": index_bundle["texts"],
-            "metadatas": index_bundle["metadatas"]
-        }, f)
+    index_digest = _write_faiss_file(index_bundle["faiss"], index_path)
+
+    # 2. Save vectors, texts, metadatas and the BM25 index (the human part) in the GBKB format
+    lexical_sections, lexical_attrs = lexical_index(index_bundle).to_sections()
+    write_knowledge_base(
+        meta_path,
+        _bundle_vectors(index_bundle),
+        index_bundle["texts"],
+        index_bundle["metadatas"],
+        attrs=_snapshot_attrs(
+            index_bundle.get("embedding_backend", "openai"),
+            index_bundle.get("index_params", FLAT_PARAMS),
+            index_digest,
+            lexical_attrs,
+        ),
+        extra_sections=lexical_sections,
+    )
     print(f" Knowledge base cached to {index_path}")
 
-def load_faiss_index(index_path, meta_path):
+class StreamingIndexBuilder:
+    """
+    Builds and saves a knowledge base from batches of embedded chunks, for
+    corpora too large to hold in memory as lists (see ingest.run_ingestion).
+
+    Each 'add' appends its rows to the knowledge-base file being written
+    (kb_format.KnowledgeBaseWriter), so nothing accumulates in memory. 'finish'
+    then builds the FAISS and BM25 indexes from the file-backed vectors and
+    texts, picking the index type from the final row count like
+    create_faiss_index, and saves both files as one snapshot.
+
+    The vector size comes from the first batch added unless 'dim' is given;
+    a batch of another size raises ValueError.
+    """
+
+    def __init__(self, index_path, meta_path, dim=None, embedding_backend="openai", index_type=None,
+                 storage=None):
+        self.index_path = str(index_path)
+        self.meta_path = str(meta_path)
+        self.embedding_backend = embedding_backend
+        self.index_type = index_type
+        self.storage = storage
+        self._writer = KnowledgeBaseWriter(self.meta_path, dim)
+
+    @property
+    def count(self) -> int:
+        return self._writer.count
+
+    def add(self, vectors, texts, metadatas):
+        """Appends one batch of rows; failed embeddings must already be dropped."""
+        if len(vectors):
+            self._writer.append(np.vstack(vectors), texts, metadatas)
+
+    def finish(self):
+        """
+        Builds the indexes and writes both files.
+
+        Returns:
+            dict: the FAISS index parameters used.
+        """
+        if not self.count:
+            self._writer.abort()
+            raise ValueError("No vectors provided. Please check your PDF/Image folders.")
+        try:
+            index, params = build_index(self._writer.vectors(), self.index_type, self.storage)
+            lexical_sections, lexical_attrs = BM25Index.build(self._writer.texts()).to_sections()
+            index_digest = _write_faiss_file(index, self.index_path)
+        except BaseException:
+            self._writer.abort()
+            raise
+        self._writer.close(
+            attrs=_snapshot_attrs(self.embedding_backend, params, index_digest, lexical_attrs),
+            extra_sections=lexical_sections,
+        )
+        print(f" Knowledge base cached to {self.index_path}")
+        return params
+
+    def abort(self):
+        """Discards the partly written knowledge base; the files on disk are untouched."""
+        self._writer.abort()
+
+def _load_legacy_metadata(meta_path):
+    """Reads the old pickle sidecar (written before the GBKB format existed)."""
+    with open(meta_path, "rb") as f:
+        data = pickle.load(f)
+    return data
+
+def load_faiss_index(index_path, meta_path, verify=False):
     """
     Loads the knowledge base from disk so you don't have to re-process PDFs/Images.
+
+    The knowledge-base file is memory-mapped: startup does not copy vectors,
+    texts or metadata, and processes that load the same files share them.
+
+    With verify=True the FAISS file is checked against the digest recorded by
+    save_faiss_index, and a ValueError is raised if the two files come from
+    different saves (e.g. a save was in progress while we loaded).
     """
     if not os.path.exists(index_path) or not os.path.exists(meta_path):
         return None
 
-    # 1. Load the FAISS index
-    index = faiss.read_index(index_path)
-    
-    # 2. Load the texts and metadatas
-    with open(meta_path, "rb") as f:
-        data = pickle.load(f)
-        
+    # 1. Map the texts and metadatas (legacy pickle sidecars are handled below)
+    kb = open_knowledge_base(meta_path) if is_knowledge_base(meta_path) else None
+    verify = verify and kb is not None and "index_digest" in kb.attrs
+    if verify:
+        index_stat = os.stat(index_path)
+        if kb.attrs["index_digest"] != file_hash(index_path):
+            raise ValueError(f"{index_path} does not belong to {meta_path} (snapshot mismatch).")
+
+    # 2. Load the FAISS index
+    index = faiss.read_index(str(index_path), _FAISS_READ_FLAGS)
+    if verify and os.stat(index_path).st_ino != index_stat.st_ino:
+        # The file was replaced between checking and reading it.
+        raise ValueError(f"{index_path} changed while it was being loaded.")
+    if kb is not None:
+        if index.ntotal != kb.count:
+            raise ValueError(f"{index_path} has {index.ntotal} vectors but {meta_path} has {kb.count} rows.")
+        # FAISS stores nprobe/efSearch in the index file; re-applying the recorded
+        # parameters also covers indexes written by older FAISS versions.
+        params = kb.attrs.get("index_params", FLAT_PARAMS)
+        apply_search_params(index, params)
+        return {
+            "faiss": index,
+            "index_params": params,
+            "vectors": kb.vectors,
+            "texts": kb.texts,
+            "metadatas": kb.metadatas,
+            "embedding_backend": kb.attrs.get("embedding_backend", "openai"),
+            "snapshot_version": kb.attrs.get("snapshot_version", 0),
+            "lexical": BM25Index.from_sections(kb.extra, kb.attrs.get("lexical")),
+            "kb": kb
+        }
+
+    # Legacy pickle sidecar. Run 'python -m app.rag.vector_store migrate' to convert it.
+    data = _load_legacy_metadata(meta_path)
     return {
         "faiss": index,
+        "index_params": FLAT_PARAMS,
+        "snapshot_version": 0,
         "texts": data["texts"],
-        "metadatas": data["metadatas"]
-    }
\ No newline at end of file
+        "metadatas": data["metadatas"],
+        # Knowledge bases saved before backends existed were all built with OpenAI.
+        "embedding_backend": data.get("embedding_backend", "openai")
+    }
+
+def migrate_legacy_metadata(index_path, legacy_meta_path, kb_path):
+    """
+    Converts a pickle sidecar into a GBKB file. The vectors are read back from
+    the FAISS index, so nothing has to be re-embedded.
+    """
+    bundle = load_faiss_index(index_path, legacy_meta_path)
+    if bundle is None:
+        raise FileNotFoundError(f"Nothing to migrate at {index_path} / {legacy_meta_path}.")
+    save_faiss_index(bundle, index_path, kb_path)
+
+class MutableVectorStore:
+    """
+    A knowledge base that can be edited one document at a time.
+
+    Rows are grouped by the 'doc_id' in their metadata (see utils.file_metadata).
+    Adding a document appends its rows to the FAISS index; deleting one only
+    marks its rows as tombstones, which 'search_index' skips. Once tombstones make
+    up more than 'compaction_ratio' of the rows, the index is rebuilt without them
+    on a background thread. Updating one PDF therefore costs work in proportion
+    to that PDF, not to the whole corpus.
+
+    Readers should always go through 'store.bundle': compaction replaces the
+    bundle dict as a whole, so a reader holding the old dict keeps a consistent view.
+    """
+
+    def __init__(self, index_bundle, compaction_ratio=COMPACTION_TOMBSTONE_RATIO):
+        self.compaction_ratio = compaction_ratio
+        self._lock = threading.RLock()
+        self._compactor = None
+        self._writable = False
+        self._mutations = 0
+        self.bundle = dict(index_bundle)
+        self.bundle.setdefault("deleted", np.zeros(self.bundle["faiss"].ntotal, dtype=bool))
+        self._rebuild_doc_index()
+
+    # --- bookkeeping ---
+
+    def _rebuild_doc_index(self):
+        self._docs = {}
+        deleted = self.bundle["deleted"]
+        for row, meta in enumerate(self.bundle["metadatas"]):
+            # Chunks saved before doc IDs existed are grouped by their source file.
+            doc_id = meta.get("doc_id") or f"source:{meta.get('source')}"
+            if not deleted[row]:
+                self._docs.setdefault(doc_id, []).append(row)
+
+    def _make_writable(self):
+        """
+        Copies a loaded (memory-mapped, read-only) bundle into owned memory the
+        first time it is edited.
+        """
+        if self._writable:
+            return
+        b = self.bundle
+        index = b["faiss"]
+        # Indexes read with IO_FLAG_MMAP_IFC are views of the file; a serialize
+        # round trip gives an owned copy that accepts new vectors.
+        index = faiss.deserialize_index(faiss.serialize_index(index))
+        self._vector_buffer = np.array(_bundle_vectors(b), dtype="float32")
+        self.bundle = {
+            **b,
+            "faiss": index,
+            "vectors": self._vector_buffer,
+            "texts": list(b["texts"]),
+            "metadatas": list(b["metadatas"]),
+            "deleted": b["deleted"].copy(),
+            "lexical": lexical_index(b).copy(),
+        }
+        self.bundle.pop("partitions", None)
+        self.bundle.pop("kb", None)
+        self._writable = True
+
+    def _append_vectors(self, start, matrix):
+        """
+        Appends rows to an over-allocated buffer (capacity doubles when full),
+        so adding a document copies only its own vectors, not the whole matrix.
+        Returns the view of the rows in use.
+        """
+        end = start + len(matrix)
+        buf = self._vector_buffer
+        if end > len(buf):
+            grown = np.empty((max(end, 2 * len(buf)), matrix.shape[1]), dtype="float32")
+            grown[:start] = buf[:start]
+            buf = self._vector_buffer = grown
+        buf[start:end] = matrix
+        return buf[:end]
+
+    @property
+    def size(self) -> int:
+        return len(self.bundle["texts"])
+
+    @property
+    def live_count(self) -> int:
+        return self.size - int(self.bundle["deleted"].sum())
+
+    @property
+    def tombstone_ratio(self) -> float:
+        return 1.0 - self.live_count / self.size if self.size else 0.0
+
+    def documents(self):
+        """IDs of every live document."""
+        return list(self._docs)
+
+    def doc_ids_for_source(self, source: str):
+        """IDs of the live documents whose chunks came from file 'source'."""
+        with self._lock:
+            return [
+                doc_id for doc_id, rows in self._docs.items()
+                if self.bundle["metadatas"][rows[0]].get("source") == source
+            ]
+
+    # --- edits ---
+
+    def add_document(self, doc_id, vectors, texts, metadatas):
+        """
+        Appends one document's chunks. Every metadata dict gets 'doc_id' set.
+
+        Raises:
+            ValueError: if the document is already in the store (use replace_document).
+        """
+        if not len(vectors):
+            return 0
+        matrix = np.vstack(vectors).astype("float32")
+        if not (len(matrix) == len(texts) == len(metadatas)):
+            raise ValueError("vectors, texts and metadatas must have the same length.")
+
+        with self._lock:
+            if doc_id in self._docs:
+                raise ValueError(f"Document {doc_id} already exists; use replace_document.")
+            self._make_writable()
+            b = self.bundle
+            start = len(b["texts"])
+
+            # Texts and metadata go in before the vectors, so any row FAISS can
+            # return already has its text.
+            b["texts"].extend(texts)
+            b["metadatas"].extend({**m, "doc_id": doc_id} for m in metadatas)
+            # Searches may be reading the current BM25 index: the new rows go
+            # into a copy, which replaces it in one assignment.
+            lexical = b["lexical"].copy()
+            lexical.append(texts)
+            b["lexical"] = lexical
+            b.pop("partitions", None)
+            b["vectors"] = self._append_vectors(start, matrix)
+            b["deleted"] = np.concatenate([b["deleted"], np.zeros(len(matrix), dtype=bool)])
+            b["faiss"].add(matrix)
+
+            self._docs[doc_id] = list(range(start, start + len(matrix)))
+            self._mutations += 1
+        return len(matrix)
+
+    def delete_document(self, doc_id):
+        """Tombstones every row of a document. Returns how many rows were deleted."""
+        with self._lock:
+            rows = self._docs.pop(doc_id, None)
+            if not rows:
+                return 0
+            # A fresh array (not an in-place edit) so a concurrent search sees
+            # either the old or the new set of tombstones.
+            deleted = self.bundle["deleted"].copy()
+            deleted[rows] = True
+            self.bundle["deleted"] = deleted
+            self._mutations += 1
+        self.maybe_compact()
+        return len(rows)
+
+    def replace_document(self, doc_id, vectors, texts, metadatas, new_doc_id=None):
+        """
+        Swaps a document's chunks for new ones. Because doc IDs are content hashes,
+        an edited file usually arrives with a 'new_doc_id'.
+        """
+        with self._lock:
+            self.delete_document(doc_id)
+            return self.add_document(new_doc_id or doc_id, vectors, texts, metadatas)
+
+    # --- compaction ---
+
+    def compact(self):
+        """
+        Rebuilds the index from the live rows only. The new index is built
+        without holding the lock; if the store was edited meanwhile, the result
+        is thrown away and the next edit will schedule another compaction.
+
+        Returns:
+            bool: True if the store was compacted.
+        """
+        with self._lock:
+            b = self.bundle
+            if not b["deleted"].any():
+                return False
+            generation = self._mutations
+            keep = np.flatnonzero(~b["deleted"])
+            vectors = np.asarray(_bundle_vectors(b))[keep]
+            texts = [b["texts"][i] for i in keep]
+            metadatas = [b["metadatas"][i] for i in keep]
+            old_params = b.get("index_params", FLAT_PARAMS)
+
+        if len(keep):
+            index, params = build_index(vectors, old_params["type"], old_params.get("storage"))
+        else:
+            index, params = faiss.IndexFlatL2(b["faiss"].d), FLAT_PARAMS
+        lexical = BM25Index.build(texts)
+
+        with self._lock:
+            if generation != self._mutations:
+                return False
+            self._vector_buffer = vectors
+            self.bundle = {
+                **self.bundle,
+                "faiss": index,
+                "index_params": params,
+                "vectors": vectors,
+                "texts": texts,
+                "metadatas": metadatas,
+                "deleted": np.zeros(len(keep), dtype=bool),
+                "lexical": lexical,
+            }
+            self.bundle.pop("kb", None)
+            self.bundle.pop("partitions", None)
+            self._writable = True
+            self._rebuild_doc_index()
+        return True
+
+    def maybe_compact(self, background=True):
+        """Starts a compaction once the tombstone ratio passes the threshold."""
+        if self.tombstone_ratio <= self.compaction_ratio:
+            return
+        if not background:
+            self.compact()
+            return
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self.compact, name="vector-store-compaction", daemon=True)
+            self._compactor.start()
+
+    def wait_for_compaction(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def save(self, index_path, meta_path):
+        """Compacts away any tombstones and writes the knowledge base to disk."""
+        self.wait_for_compaction()
+        self.compact()
+        save_faiss_index(self.bundle, index_path, meta_path)
+
+if __name__ == "__main__":
+    # Usage: python -m app.rag.vector_store migrate [index_path legacy_meta_path kb_path]
+    from .config import INDEX_PATH, KB_PATH, LEGACY_META_PATH
+
+    if sys.argv[1:2] == ["migrate"]:
+        paths = sys.argv[2:5] or [str(INDEX_PATH), str(LEGACY_META_PATH), str(KB_PATH)]
+        migrate_legacy_metadata(*paths)
+    else:
+        print("Usage: python -m app.rag.vector_store migrate [index_path legacy_meta_path kb_path]")
@@ -0,0 +1,266 @@
+# app/rag/watcher.py
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import signal
+import sys
+import threading
+import time
+
+from .config import (
+    INDEX_PATH, KB_PATH, PDF_DIR, IMG_DIR, IVR_PID_PATH,
+    WATCH_MODE, WATCH_POLL_SECONDS, WATCH_DEBOUNCE_SECONDS,
+    WATCH_NICE, WATCH_WORKERS, WATCH_EMBED_CONCURRENCY, WATCH_RATE_SHARE,
+)
+from . import embedding_executor, image_reader
+from .sync import gather_files, sync_documents
+
+logger = logging.getLogger(__name__)
+
+# inotify events that can change the set or content of the watched files.
+_IN_EVENTS = (0x002 | 0x004 | 0x008 | 0x040 | 0x080 | 0x100 | 0x200 | 0x400 | 0x800)
+# (IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE,
+#  IN_DELETE, IN_DELETE_SELF, IN_MOVE_SELF)
+
+def lower_priority(nice=WATCH_NICE):
+    """
+    Makes this process yield the CPU to everything else: 'nice' is raised,
+    and on Linux the scheduling class becomes SCHED_IDLE, which only runs when
+    a core would otherwise sit idle. Threads and extraction processes started
+    afterwards inherit both, so call this before starting any.
+    """
+    try:
+        os.nice(nice)
+    except (AttributeError, OSError):
+        pass
+    if hasattr(os, "sched_setscheduler") and hasattr(os, "SCHED_IDLE"):
+        try:
+            os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+        except OSError:
+            pass
+
+def _is_ivr_process(pid: int) -> bool:
+    """True if process 'pid' is running the IVR (app/main.py), judged by its command line."""
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            args = f.read().split(b"\0")
+    except OSError:
+        # Gone, or no /proc to check with: never signal a process we cannot identify.
+        return False
+    return any(os.path.basename(arg) == b"main.py" or arg == b"app.main" for arg in args)
+
+def notify_ivr(pid_path=IVR_PID_PATH) -> bool:
+    """
+    Asks a running IVR to load the new snapshot now (SIGHUP) instead of at its
+    next poll. Returns False if no IVR is running.
+
+    The pid file outlives an IVR that crashed, and its pid may since have been
+    given to an unrelated process that SIGHUP would terminate, so the signal is
+    only sent after checking the process is the IVR. Otherwise the IVR's own
+    SNAPSHOT_POLL_SECONDS polling picks up the new snapshot.
+    """
+    if not hasattr(signal, "SIGHUP"):
+        return False
+    try:
+        pid = int(open(pid_path).read().strip())
+    except (OSError, ValueError):
+        return False
+    if not _is_ivr_process(pid):
+        return False
+    try:
+        os.kill(pid, signal.SIGHUP)
+        return True
+    except OSError:
+        return False
+
+class _Inotify:
+    """Minimal inotify binding (Linux, through libc): wakes the watcher on file events."""
+
+    def __init__(self, dirs):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watched = set()
+        self.add_dirs(dirs)
+
+    def add_dirs(self, dirs):
+        """Watches the directories that exist and are not watched yet."""
+        for d in map(str, dirs):
+            if d not in self._watched and os.path.isdir(d):
+                if self._libc.inotify_add_watch(self.fd, os.fsencode(d), _IN_EVENTS) >= 0:
+                    self._watched.add(d)
+
+    def wait(self, timeout: float) -> bool:
+        """Blocks until an event arrives or 'timeout' passes; drains the events."""
+        ready, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        # A watched directory that was removed drops its watch; re-add it later.
+        self._watched = {d for d in self._watched if os.path.isdir(d)}
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+class KnowledgeBaseWatcher:
+    """
+    Keeps the saved knowledge base in step with the PDF and image folders.
+
+    The folders are scanned every 'poll_seconds' (with inotify, whenever the
+    kernel reports an event, and still every 'poll_seconds' as a fallback).
+    A scan only stats the files. Once a change has been seen and the folders
+    then stay quiet for 'debounce_seconds', so a burst of copies is handled as
+    one sync, the worker thread runs sync.sync_documents, which re-embeds only
+    what changed and saves atomically, and the IVR is told to reload.
+    Changes seen while a sync runs are picked up by the next one.
+    """
+
+    def __init__(self, pdf_dir=PDF_DIR, img_dir=IMG_DIR, client=None, mode=WATCH_MODE,
+                 poll_seconds=WATCH_POLL_SECONDS, debounce_seconds=WATCH_DEBOUNCE_SECONDS,
+                 workers=WATCH_WORKERS, index_path=INDEX_PATH, kb_path=KB_PATH, on_sync=notify_ivr):
+        self.pdf_dir, self.img_dir = str(pdf_dir), str(img_dir)
+        self.client = client
+        self.poll_seconds = poll_seconds
+        self.debounce_seconds = debounce_seconds
+        self.workers = workers
+        self.index_path, self.kb_path = index_path, kb_path
+        self.on_sync = on_sync
+        self.syncs = 0
+        self.failed_syncs = 0
+        self._inotify = None
+        if mode == "inotify":
+            try:
+                self._inotify = _Inotify([self.pdf_dir, self.img_dir])
+            except (OSError, AttributeError) as e:
+                logger.warning(f"inotify unavailable ({e}); polling every {poll_seconds}s instead.")
+        self.mode = "inotify" if self._inotify is not None else "poll"
+        self._stop = threading.Event()
+        self._pending = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._worker = None
+
+    def _listing(self) -> dict:
+        """path -> (size, mtime, inode) for every file sync would pick up."""
+        listing = {}
+        for path in gather_files(self.pdf_dir, self.img_dir):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            listing[path] = (st.st_size, st.st_mtime_ns, st.st_ino)
+        return listing
+
+    def _wait(self, timeout: float):
+        if self._inotify is not None:
+            self._inotify.add_dirs([self.pdf_dir, self.img_dir])
+            self._inotify.wait(timeout)
+        else:
+            self._stop.wait(timeout)
+
+    def _work(self):
+        while True:
+            self._pending.wait()
+            if self._stop.is_set():
+                return
+            self._idle.clear()
+            self._pending.clear()
+            try:
+                report = sync_documents(self.pdf_dir, self.img_dir, self.client,
+                                        self.index_path, self.kb_path, workers=self.workers)
+                if report["added"] or report["modified"] or report["removed"]:
+                    self.syncs += 1
+                    if self.on_sync is not None and self.on_sync():
+                        logger.info("Asked the IVR to load the new snapshot.")
+            except Exception as e:
+                # The manifest is only saved after a successful sync, so the
+                # next change (or restart) retries the same work.
+                self.failed_syncs += 1
+                logger.error(f"Knowledge-base sync failed: {e}")
+            finally:
+                self._idle.set()
+
+    def request_sync(self):
+        """Schedules a sync on the worker thread (several requests run as one)."""
+        self._pending.set()
+
+    def wait_idle(self, timeout=None) -> bool:
+        """Blocks until no sync is pending or running."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._pending.is_set() or not self._idle.is_set():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            self._idle.wait(0.05 if remaining is None else min(0.05, remaining))
+        return True
+
+    def run(self):
+        """Watches until 'stop' is called. Starts with one sync to catch up on changes made while stopped."""
+        self._worker = threading.Thread(target=self._work, name="kb-watch-sync", daemon=True)
+        self._worker.start()
+        self.request_sync()
+
+        listing, changed_at = self._listing(), None
+        try:
+            while not self._stop.is_set():
+                timeout = self.poll_seconds
+                if changed_at is not None:
+                    timeout = min(timeout, max(0.0, changed_at + self.debounce_seconds - time.monotonic()))
+                self._wait(timeout)
+                if self._stop.is_set():
+                    break
+
+                current = self._listing()
+                if current != listing:
+                    listing, changed_at = current, time.monotonic()
+                elif changed_at is not None and time.monotonic() - changed_at >= self.debounce_seconds:
+                    changed_at = None
+                    self.request_sync()
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+
+    def start(self):
+        """Runs the watcher on a background thread."""
+        thread = threading.Thread(target=self.run, name="kb-watch", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+        self._pending.set()  # wakes the worker so it can exit
+        if self._worker is not None:
+            self._worker.join()
+
+def _vision_client():
+    """OpenAI client for describing new images, or None without an API key."""
+    if not os.getenv("OPENAI_API_KEY"):
+        return None
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+if __name__ == "__main__":
+    # Usage: python -m app.rag.watcher [poll|inotify]
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    # Before any thread starts, so everything the watcher runs is low priority.
+    lower_priority()
+    embedding_executor.throttle(WATCH_RATE_SHARE, WATCH_EMBED_CONCURRENCY)
+    image_reader.vision_concurrency = WATCH_EMBED_CONCURRENCY
+
+    watcher = KnowledgeBaseWatcher(client=_vision_client(), mode=(sys.argv[1:2] or [WATCH_MODE])[0])
+    logger.info(f"Watching {watcher.pdf_dir} and {watcher.img_dir} "
+                f"({watcher.mode}).")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
@@ -0,0 +1,58 @@
+# benchmarks/bench_embedding_batching.py
+"""
+Compares one-request-per-chunk embedding with batched embedding.
+
+Runs entirely against benchmarks/fake_embedding_server.py, so no API key or
+network access is needed:
+
+    python -m benchmarks.bench_embedding_batching
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.fake_embedding_server import start_server
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+PDF_DIR = BASE_DIR / "data" / "pdf"
+
+def load_corpus_chunks():
+    """Chunks the real hotel PDFs exactly like the rebuild does."""
+    from app.rag.pdf_loader import load_all_pdfs_text
+    from app.rag.chunker import chunk_text
+
+    chunks = []
+    for doc in load_all_pdfs_text(str(PDF_DIR)):
+        chunks.extend(chunk_text(doc["text"]))
+    return chunks
+
+def main():
+    server, base_url = start_server()
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-local-benchmark")
+
+    from app.rag.embeddings import embed_texts
+
+    chunks = load_corpus_chunks()
+    print(f"\n Corpus: {len(chunks)} chunks\n")
+
+    results = {}
+    for label, batch_size in (("one per request", 1), ("batched", None)):
+        stats = server.handler.stats
+        stats.update(requests=0, inputs=0)
+        start = time.perf_counter()
+        # The embedding cache is bypassed: it would answer the second mode
+        # without any requests, and must never hold the fake server's vectors.
+        vectors = embed_texts(chunks, batch_size=batch_size, use_cache=False, backend="openai")
+        elapsed = time.perf_counter() - start
+        assert len(vectors) == len(chunks)
+        assert stats["requests"] > 0, f"{label}: no embedding requests were made"
+        results[label] = elapsed
+        print(f" {label:<16} {elapsed:7.2f}s  {stats['requests']:4d} requests")
+
+    print(f"\n Speed-up: {results['one per request'] / results['batched']:.1f}x")
+    server.shutdown()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# benchmarks/bench_pdf_extraction.py
+"""
+Compares serial PDF text extraction with the process-pool extraction used by
+ingestion, on a corpus of synthetic PDFs: mostly short files plus a few long
+ones, so both the per-file and the per-page fan-out are exercised.
+
+The PDFs are written to a temporary directory, so nothing in data/ changes:
+
+    python -m benchmarks.bench_pdf_extraction [files]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app.rag.pdf_loader import extract_pdf_pages, ingest_workers
+
+WORDS = """
+room suite guest breakfast laundry service hotel pool spa check in out night rate
+policy booking restaurant menu airport transfer luggage doctor express surcharge
+deluxe king premier family executive club lounge view floor desk towel linen
+""".split()
+
+LINES_PER_PAGE = 45
+LONG_FILE_PAGES = 120
+
+def _pdf_string(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path, pages):
+    """Writes a minimal PDF with one Helvetica text stream per page."""
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    for i, lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        body = " ".join(f"({_pdf_string(line)}) Tj T*" for line in lines)
+        stream = f"BT /F1 10 Tf 12 TL 50 800 Td {body} ET".encode("latin-1")
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(b"%d 0 R" % page_id)
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += b"%d 0 obj\n%s\nendobj\n" % (obj_id, objects[obj_id])
+    xref = len(out)
+    size = max(objects) + 1
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    out += b"".join(b"%010d 00000 n \n" % offsets[i] for i in range(1, size))
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref)
+    Path(path).write_bytes(bytes(out))
+
+def make_corpus(directory, files, seed=0):
+    """'files' PDFs of 1-8 pages, every 50th one LONG_FILE_PAGES pages long."""
+    rng = random.Random(seed)
+    paths = []
+    for n in range(files):
+        page_count = LONG_FILE_PAGES if n % 50 == 0 else rng.randint(1, 8)
+        pages = [[" ".join(rng.choices(WORDS, k=12)) for _ in range(LINES_PER_PAGE)]
+                 for _ in range(page_count)]
+        path = os.path.join(directory, f"doc_{n:04d}.pdf")
+        write_pdf(path, pages)
+        paths.append(path)
+    return paths
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    cores = ingest_workers(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_corpus(tmp, files)
+        extract_pdf_pages(paths[:20], workers=1)  # warm-up: imports and file cache
+        print(f"\n Corpus: {files} PDFs, {cores} CPU cores\n")
+
+        print(f" {'workers':>7} {'pages/task':>10} {'seconds':>8} {'pages/s':>8} {'speedup':>8}")
+        baseline, reference = None, None
+        runs = [(1, None), (2, 16), (4, 16), (cores, 16), (cores, 4)]
+        for workers, pages_per_task in dict.fromkeys(runs):
+            start = time.perf_counter()
+            result = extract_pdf_pages(paths, workers=workers, pages_per_task=pages_per_task or 10**9)
+            seconds = time.perf_counter() - start
+            pages = sum(len(p) for p in result.values())
+            if reference is None:
+                baseline, reference = seconds, result
+            elif result != reference:
+                print(" !! output differs from the serial extraction")
+            print(f" {workers:>7} {pages_per_task or '-':>10} {seconds:8.2f} {pages / seconds:8.0f} "
+                  f"{baseline / seconds:7.2f}x")
+
+if __name__ == "__main__":
+    sys.exit(main())
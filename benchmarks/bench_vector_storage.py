@@ -0,0 +1,72 @@
+# benchmarks/bench_vector_storage.py
+"""
+Compares float32, float16 and int8 vector storage for each FAISS index type:
+index size, query latency and recall@k against an exact float32 search, with
+and without exact re-scoring.
+
+Uses the vectors of the committed hotel knowledge base, scaled up with noisy
+copies so the numbers mean something beyond 45 rows:
+
+    python -m benchmarks.bench_vector_storage [rows]
+"""
+import sys
+import time
+from pathlib import Path
+import faiss
+import numpy as np
+
+from app.rag.kb_format import open_knowledge_base
+from app.rag.vector_store import build_index, apply_search_params, search_index
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+KB_PATH = BASE_DIR / "data" / "hotel_knowledge.kb"
+
+TOP_K = 5
+QUERIES = 200
+
+def load_corpus(rows: int, seed: int = 0):
+    """Real KB vectors plus noisy copies of them, up to 'rows' rows."""
+    rng = np.random.default_rng(seed)
+    base = np.asarray(open_knowledge_base(KB_PATH).vectors, dtype="float32")
+    picks = base[rng.integers(0, len(base), rows)]
+    noise = rng.normal(0, 0.02, picks.shape).astype("float32")
+    corpus = np.vstack([base, picks + noise])[:rows]
+    queries = corpus[rng.integers(0, len(corpus), QUERIES)]
+    queries = queries + rng.normal(0, 0.01, queries.shape).astype("float32")
+    return corpus, queries
+
+def recall(found, truth):
+    return np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    corpus, queries = load_corpus(rows)
+    print(f"\n Corpus: {len(corpus)} x {corpus.shape[1]}, {len(queries)} queries, top {TOP_K}\n")
+
+    exact = faiss.IndexFlatL2(corpus.shape[1])
+    exact.add(corpus)
+    _, truth = exact.search(queries, TOP_K)
+
+    print(f" {'index':<22} {'size MB':>8} {'ms/query':>9} {'recall':>7} {'+rerank':>8} {'ms/query':>9}")
+    for index_type in ("flat", "hnsw", "ivf_flat", "ivf_pq"):
+        for storage in ("float32", "float16", "int8"):
+            if index_type == "ivf_pq" and storage != "float32":
+                continue
+            index, params = build_index(corpus, index_type, storage)
+            apply_search_params(index, params)
+            bundle = {"faiss": index, "index_params": params, "vectors": corpus}
+            size = len(faiss.serialize_index(index)) / 2**20
+
+            start = time.perf_counter()
+            _, plain = search_index(bundle, queries, TOP_K, rerank_factor=1)
+            plain_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+            start = time.perf_counter()
+            _, reranked = search_index(bundle, queries, TOP_K)
+            rerank_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+            print(f" {params['factory']:<22} {size:8.1f} {plain_ms:9.3f} "
+                  f"{recall(plain, truth):7.3f} {recall(reranked, truth):8.3f} {rerank_ms:9.3f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
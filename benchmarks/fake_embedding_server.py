@@ -0,0 +1,79 @@
+# benchmarks/fake_embedding_server.py
+"""
+A local stand-in for the OpenAI embeddings endpoint.
+
+It answers POST /v1/embeddings with deterministic vectors and sleeps for a fixed
+amount of time per request (plus a little per input), which is roughly how the
+real API behaves. Point the OpenAI client at it with OPENAI_BASE_URL.
+"""
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+DIM = 1536
+
+def fake_vector(text, dim=DIM):
+    """Same text -> same unit vector, so results can be compared across runs."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dim).astype("float32")
+    return vec / np.linalg.norm(vec)
+
+class _Handler(BaseHTTPRequestHandler):
+    request_latency = 0.05
+    per_input_latency = 0.0005
+    stats = {"requests": 0, "inputs": 0}
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dim = body.get("dimensions") or DIM
+
+        self.stats["requests"] += 1
+        self.stats["inputs"] += len(inputs)
+        time.sleep(self.request_latency + self.per_input_latency * len(inputs))
+
+        data = []
+        for i, text in enumerate(inputs):
+            vec = fake_vector(text, dim)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vec.tobytes()).decode("ascii")
+            else:
+                embedding = vec.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+        payload = json.dumps({
+            "object": "list",
+            "data": data,
+            "model": body.get("model"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+def start_server(request_latency=0.05, per_input_latency=0.0005):
+    """
+    Starts the server on a free localhost port in a background thread.
+
+    Returns:
+        tuple: (server, base_url). Call server.shutdown() when done.
+    """
+    handler = type("Handler", (_Handler,), {
+        "request_latency": request_latency,
+        "per_input_latency": per_input_latency,
+        "stats": {"requests": 0, "inputs": 0},
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.handler = handler
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
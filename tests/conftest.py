@@ -0,0 +1,32 @@
+# tests/conftest.py
+import os
+import zlib
+
+import numpy as np
+import pytest
+
+# Offline embeddings and no shared on-disk caches. Set before any app.rag
+# module reads its configuration.
+os.environ["EMBEDDING_BACKEND"] = "local"
+os.environ["EMBED_CACHE_MAX_ENTRIES"] = "0"
+os.environ["VISION_CACHE_MAX_ENTRIES"] = "0"
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """
+    Installs an OpenAI embedding backend whose requests never leave the
+    process. Each request's texts are recorded in 'backend.requests'.
+    """
+    from app.rag import embeddings
+
+    backend = embeddings.OpenAIEmbeddingBackend(model="text-embedding-3-small", dimensions=8)
+    backend.requests = []
+
+    def embed_batch(batch):
+        backend.requests.append(list(batch))
+        return [np.random.default_rng(zlib.crc32(t.encode())).normal(size=8).astype("float32")
+                for t in batch]
+
+    backend.embed_batch = embed_batch
+    monkeypatch.setitem(embeddings._backends, "openai", backend)
+    return backend
@@ -0,0 +1,62 @@
+# tests/test_answer_cache.py
+import time
+
+import numpy as np
+
+from app.rag.answer_cache import SemanticAnswerCache, is_neutral_conversation
+
+def test_expired_best_match_falls_through_to_next_match():
+    cache = SemanticAnswerCache(max_size=8, ttl=60, threshold=0.9)
+    cache.store("when is checkout", np.array([1.0, 0.1, 0.0]), "older answer", "v1")
+    cache.store("what time is checkout", np.array([1.0, 0.0, 0.0]), "closest answer", "v1")
+    # Expire the closest entry only.
+    key = next(k for k, (_, _, a) in cache._entries.items() if a == "closest answer")
+    _, question, answer = cache._entries[key]
+    cache._entries[key] = (time.monotonic() - 1, question, answer)
+
+    assert cache.lookup(np.array([1.0, 0.0, 0.0]), "v1") == "older answer"
+    assert cache.stats()["size"] == 1
+
+def test_no_match_above_threshold_is_a_miss():
+    cache = SemanticAnswerCache(max_size=8, ttl=60, threshold=0.9)
+    cache.store("is there a pool", np.array([0.0, 1.0, 0.0]), "yes", "v1")
+    assert cache.lookup(np.array([1.0, 0.0, 0.0]), "v1") is None
+    assert cache.stats()["misses"] == 1
+
+def test_first_turn_booking_question_is_not_neutral():
+    assert not is_neutral_conversation("Can I book a suite for tonight?", [])
+    assert is_neutral_conversation("What time does the pool open?", [])
+
+def test_a_neutral_question_in_a_booking_conversation_is_not_neutral():
+    history = [("I'd like to book a room for two nights", "Which room type would you like?")]
+    assert not is_neutral_conversation("What time is breakfast?", history)
+
+def test_close_paraphrase_hits():
+    cache = SemanticAnswerCache(max_size=8, ttl=60, threshold=0.95)
+    cache.store("what time is checkout", np.array([1.0, 0.0, 0.0]), "Checkout is at noon.", "v1")
+    # Scale does not matter, only the direction.
+    assert cache.lookup(np.array([2.0, 0.1, 0.0]), "v1") == "Checkout is at noon."
+    assert cache.stats()["hits"] == 1
+
+def test_a_new_snapshot_empties_the_cache():
+    cache = SemanticAnswerCache(max_size=8, ttl=60, threshold=0.9)
+    cache.store("is there a pool", np.array([0.0, 1.0, 0.0]), "yes", "v1")
+    assert cache.lookup(np.array([0.0, 1.0, 0.0]), "v2") is None
+    assert cache.stats()["invalidations"] == 1 and cache.stats()["size"] == 0
+
+def test_least_recently_used_answer_is_evicted():
+    cache = SemanticAnswerCache(max_size=2, ttl=60, threshold=0.99)
+    cache.store("pool", np.array([1.0, 0.0, 0.0]), "pool answer", "v1")
+    cache.store("spa", np.array([0.0, 1.0, 0.0]), "spa answer", "v1")
+    assert cache.lookup(np.array([1.0, 0.0, 0.0]), "v1") == "pool answer"
+    cache.store("gym", np.array([0.0, 0.0, 1.0]), "gym answer", "v1")
+    assert cache.lookup(np.array([0.0, 1.0, 0.0]), "v1") is None
+    assert cache.lookup(np.array([1.0, 0.0, 0.0]), "v1") == "pool answer"
+
+def test_disabled_cache_and_failed_embeddings_are_misses():
+    disabled = SemanticAnswerCache(max_size=0)
+    disabled.store("pool", np.array([1.0, 0.0]), "pool answer", "v1")
+    assert disabled.lookup(np.array([1.0, 0.0]), "v1") is None
+    cache = SemanticAnswerCache(max_size=8)
+    cache.store("pool", None, "pool answer", "v1")
+    assert cache.lookup(None, "v1") is None and cache.stats()["size"] == 0
@@ -0,0 +1,40 @@
+# tests/test_chunker.py
+import random
+
+import pytest
+
+from app.rag.chunker import iter_chunks, iter_units
+
+WORDS = ["guest", "suite.", "breakfast", "Laundry:", "surcharge!", "express", "x" * 60]
+SPACES = [" ", "  ", "\n", " \n", "\n\n", "   \n", "\t"]
+
+def _document(rng, words):
+    return "".join(rng.choice(WORDS) + rng.choice(SPACES) for _ in range(words))
+
+@pytest.mark.parametrize("seed", range(40))
+def test_chunk_text_is_the_document_between_its_offsets(seed):
+    rng = random.Random(seed)
+    document = _document(rng, rng.randint(1, 300))
+    max_tokens = rng.choice([8, 20, 64])
+    for chunk in iter_chunks(document, max_tokens=max_tokens, overlap_tokens=max_tokens // 4):
+        assert document[chunk["start"]:chunk["end"]] == chunk["text"]
+
+def test_a_unit_over_the_limit_is_cut_into_slices_of_the_source():
+    document = "one two three four five six seven eight nine ten   \nNext line."
+    units = list(iter_units(document, max_tokens=3))
+    assert len(units) > 2
+    for unit in units:
+        assert document[unit.start:unit.end] == unit.text
+    assert "".join(unit.sep + unit.text for unit in units) == document
+
+def test_pages_are_chunked_like_the_joined_document():
+    rng = random.Random(7)
+    pages = [_document(rng, 80) + "\n" for _ in range(3)]
+    joined = "".join(pages)
+    assert list(iter_chunks(pages, max_tokens=32)) == list(iter_chunks(joined, max_tokens=32))
+
+def test_a_heading_starts_a_new_chunk():
+    document = "Pool\nThe pool opens at seven. " * 3 + "\nSpa\n" + "Massages are booked at the desk. " * 10
+    chunks = list(iter_chunks(document, max_tokens=40, overlap_tokens=0))
+    assert len(chunks) > 1
+    assert any(chunk["text"].startswith("Spa") for chunk in chunks)
@@ -0,0 +1,60 @@
+# tests/test_context.py
+from app.rag.context import assemble_context, merge_passages, overlap_length, passage_text
+from app.rag.utils import estimate_tokens
+
+def _result(text, source, chunk=None):
+    meta = {"source": source}
+    if chunk is not None:
+        meta["chunk"] = chunk
+    return {"text": text, "metadata": meta}
+
+SPA_0 = "The spa opens at nine. Massages must be booked a day ahead."
+SPA_1 = "Massages must be booked a day ahead. The sauna is free for guests."
+POOL = "The rooftop pool is heated all year and towels are at the pool bar."
+
+def test_overlap_length():
+    assert overlap_length("abc def", "def ghi") == 3
+    assert overlap_length("abc", "xyz") == 0
+    assert overlap_length("aaaa", "aaaa", max_chars=2) == 2
+
+def test_neighbouring_chunks_are_merged_without_repeats():
+    # Retrieved in reverse order: the passage still reads in document order.
+    context = assemble_context([_result(SPA_1, "spa.pdf", 1), _result(SPA_0, "spa.pdf", 0)], token_budget=0)
+    assert context == "The spa opens at nine. Massages must be booked a day ahead. The sauna is free for guests."
+    assert context.count("Massages") == 1
+
+def test_contained_chunks_are_dropped():
+    passages = merge_passages([_result(SPA_0, "spa.pdf", 0), _result("The spa opens at nine.", "spa.pdf", 1)])
+    assert len(passages) == 1 and len(passages[0]["segments"]) == 1
+
+def test_sources_stay_apart_in_rank_order():
+    context = assemble_context([_result(POOL, "pool.pdf"), _result(SPA_0, "spa.pdf")], token_budget=0)
+    assert context == f"{POOL}\n\n{SPA_0}"
+
+def test_near_duplicates_from_other_sources_are_skipped():
+    results = [_result(POOL, "pool.pdf"), _result(POOL + " ", "guide.pdf"), _result(SPA_0, "spa.pdf")]
+    assert assemble_context(results, token_budget=0) == f"{POOL}\n\n{SPA_0}"
+
+def test_context_fits_the_token_budget():
+    results = [_result(f"Fact number {i} about the hotel is quite interesting.", f"doc{i}.pdf") for i in range(20)]
+    unlimited = assemble_context(results, token_budget=0)
+    limited = assemble_context(results, token_budget=40)
+    assert estimate_tokens(limited) <= 40 < estimate_tokens(unlimited)
+    # The best-ranked result is always kept.
+    assert limited.startswith("Fact number 0 ")
+
+def test_one_oversized_chunk_is_truncated():
+    long_text = " ".join(f"word{i}" for i in range(500))
+    context = assemble_context([_result(long_text, "long.pdf")], token_budget=50)
+    assert 0 < estimate_tokens(context) <= 50
+    assert long_text.startswith(context)
+
+def test_gaps_between_kept_segments_are_marked():
+    passage = {"segments": [{"text": "One.", "rank": 0, "shared": 0},
+                            {"text": "Two.", "rank": 2, "shared": 0},
+                            {"text": "Three.", "rank": 1, "shared": 0}]}
+    assert passage_text(passage, [2, 0]) == "One.\n...\nThree."
+    assert passage_text(passage) == "One.Two.Three."
+
+def test_empty_results():
+    assert assemble_context([]) == ""
@@ -0,0 +1,44 @@
+# tests/test_embedding_cache.py
+import numpy as np
+
+from app.rag import embeddings
+from app.rag.embedding_cache import EmbeddingCache, cache_key
+from app.rag.embeddings import embed_texts
+
+def test_vectors_round_trip_and_the_least_recently_used_is_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.put_many([("a", np.array([1, 2], "float32")), ("b", np.array([3, 4], "float32"))])
+    assert np.array_equal(cache.get_many(["a"])["a"], [1, 2])  # 'a' is now the most recent
+
+    cache.put("c", np.array([5, 6], "float32"))
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    stats = cache.stats()
+    assert (stats["evictions"], stats["entries"], stats["hits"], stats["misses"]) == (1, 2, 3, 1)
+    cache.close()
+
+    reopened = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    assert len(reopened) == 2
+
+def test_key_depends_on_text_model_and_size():
+    key = cache_key("breakfast hours", "text-embedding-3-small", 0)
+    assert key == cache_key("breakfast hours", "text-embedding-3-small", 0)
+    assert key != cache_key("breakfast hours", "text-embedding-3-large", 0)
+    assert key != cache_key("breakfast hours", "text-embedding-3-small", 512)
+    assert key != cache_key("Breakfast hours", "text-embedding-3-small", 0)
+
+def test_embed_texts_only_sends_cache_misses(tmp_path, fake_openai, monkeypatch):
+    monkeypatch.setattr(embeddings, "_cache", EmbeddingCache(str(tmp_path / "cache.sqlite"), 100))
+    first = embed_texts(["pool hours", "spa hours"], backend="openai")
+    second = embed_texts(["spa hours", "gym hours", "pool hours"], backend="openai")
+
+    assert fake_openai.requests == [["pool hours", "spa hours"], ["gym hours"]]
+    assert np.array_equal(second[0], first[1])
+    assert np.array_equal(second[2], first[0])
+
+def test_use_cache_false_neither_reads_nor_writes(tmp_path, fake_openai, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), 100)
+    monkeypatch.setattr(embeddings, "_cache", cache)
+    embed_texts(["pool hours"], use_cache=False, backend="openai")
+    embed_texts(["pool hours"], use_cache=False, backend="openai")
+    assert len(fake_openai.requests) == 2
+    assert len(cache) == 0
@@ -0,0 +1,70 @@
+# tests/test_embedding_executor.py
+import threading
+import time
+
+import pytest
+
+from app.rag.embedding_executor import EmbeddingExecutor, RateLimiter, is_retryable, retry_after
+
+class APIError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after} if retry_after else {}})()
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(EmbeddingExecutor, "_backoff", lambda self, attempt, exc: 0.0)
+
+def _executor(embed_batch, **kwargs):
+    return EmbeddingExecutor(embed_batch, len, limiter=RateLimiter(10**6, 10**9), **kwargs)
+
+def test_transient_errors_are_retried():
+    calls = []
+
+    def embed_batch(batch):
+        calls.append(batch)
+        if len(calls) < 3:
+            raise APIError(429 if len(calls) == 1 else 503)
+        return [t.upper() for t in batch]
+
+    assert _executor(embed_batch, max_retries=3).run([["a", "b"]]) == ["A", "B"]
+    assert len(calls) == 3
+
+def test_a_bad_chunk_only_fails_its_own_slot():
+    def embed_batch(batch):
+        if "bad" in batch:
+            raise APIError(400)
+        return [t.upper() for t in batch]
+
+    result = _executor(embed_batch, max_retries=2).run([["a", "bad", "c"], ["d"]])
+    assert result == ["A", None, "C", "D"]
+
+def test_concurrent_batches_keep_the_input_order():
+    lock, in_flight, peak = threading.Lock(), [0], [0]
+
+    def embed_batch(batch):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.01 * (5 - int(batch[0]) % 5))
+        with lock:
+            in_flight[0] -= 1
+        return [int(t) for t in batch]
+
+    batches = [[str(i), str(i + 1)] for i in range(0, 20, 2)]
+    assert _executor(embed_batch, max_concurrency=4).run(batches) == list(range(20))
+    assert 1 < peak[0] <= 4
+
+def test_errors_worth_retrying():
+    assert is_retryable(APIError(429)) and is_retryable(APIError(500))
+    assert not is_retryable(APIError(400)) and not is_retryable(ValueError("bad input"))
+    assert retry_after(APIError(429, retry_after="2.5")) == 2.5
+    assert retry_after(APIError(429)) is None
+
+def test_rate_limiter_waits_for_its_budget():
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=10**6)  # one request per 0.1 s
+    limiter._requests = 0
+    start = time.monotonic()
+    limiter.acquire(10)
+    assert time.monotonic() - start >= 0.08
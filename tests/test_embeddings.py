@@ -0,0 +1,31 @@
+# tests/test_embeddings.py
+import numpy as np
+
+from app.rag.embeddings import drop_failed, embed_texts, iter_batches
+
+def test_batches_close_at_the_size_and_token_limits():
+    texts = ["one", "two", "three", "four", "five"]
+    assert list(iter_batches(texts, batch_size=2, max_batch_tokens=1000)) == [
+        ["one", "two"], ["three", "four"], ["five"]]
+    # A text over the token ceiling on its own still gets a batch.
+    long = "word " * 50
+    assert list(iter_batches(["a", long, "b"], batch_size=10, max_batch_tokens=20)) == [["a"], [long], ["b"]]
+
+def test_embed_texts_sends_batches_and_keeps_the_input_order(fake_openai):
+    texts = [f"chunk number {i}" for i in range(10)]
+    vectors = embed_texts(texts, batch_size=4, use_cache=False, backend="openai")
+
+    assert [len(r) for r in fake_openai.requests] == [4, 4, 2]
+    assert sorted(t for r in fake_openai.requests for t in r) == sorted(texts)
+    single = embed_texts(["chunk number 7"], use_cache=False, backend="openai")[0]
+    assert np.array_equal(vectors[7], single)
+
+def test_identical_texts_are_sent_once(fake_openai):
+    vectors = embed_texts(["header", "body", "header"], use_cache=False, backend="openai")
+    assert sum(len(r) for r in fake_openai.requests) == 2
+    assert np.array_equal(vectors[0], vectors[2])
+
+def test_drop_failed_keeps_the_columns_aligned():
+    vectors, texts, metas = drop_failed([np.ones(2), None, np.zeros(2)], ["a", "b", "c"], [1, 2, 3])
+    assert (texts, metas) == (["a", "c"], [1, 3])
+    assert len(vectors) == 2
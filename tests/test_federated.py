@@ -0,0 +1,43 @@
+# tests/test_federated.py
+import pytest
+
+from app.rag import retriever
+from app.rag.embeddings import embed_texts
+from app.rag.vector_store import create_faiss_index
+
+GLOBAL = [
+    "Express laundry surcharge applies to same-day service.",
+    "The Bengali Suite has a private balcony and a king bed.",
+    "Breakfast is served in the garden restaurant from seven.",
+]
+SESSION = [
+    "Conference agenda: the keynote starts at nine in hall B.",
+    "Shuttle buses leave the hotel for the venue every half hour.",
+]
+
+def _bundle(texts):
+    return create_faiss_index(embed_texts(texts, backend="local"), texts,
+                              [{"source": "test.pdf"} for _ in texts], "local")
+
+@pytest.fixture
+def embed_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(retriever, "embed_texts",
+                        lambda texts, **kw: calls.append(list(texts)) or embed_texts(texts, **kw))
+    retriever.query_cache.clear()
+    return calls
+
+def test_lexical_mode_merges_without_embedding(embed_calls):
+    results = retriever.retrieve_federated("express laundry surcharge", _bundle(GLOBAL),
+                                           {"upload": _bundle(SESSION)}, top_k=3, mode="lexical")
+    assert embed_calls == []
+    assert results[0]["index"] == "global"
+    assert results[0]["text"] == GLOBAL[0]
+
+def test_dense_mode_embeds_once_per_index_and_ranks_by_cosine(embed_calls):
+    results = retriever.retrieve_federated("when does the keynote start in the hall", _bundle(GLOBAL),
+                                           {"upload": _bundle(SESSION)}, top_k=2, mode="dense")
+    # Once for the first index; the second search reuses the cached vector.
+    assert len(embed_calls) == 1
+    assert results[0]["index"] == "session:upload"
+    assert results[0]["score"] >= results[1]["score"]
@@ -0,0 +1,71 @@
+# tests/test_filters.py
+import pytest
+
+from app.rag import vector_store
+from app.rag.embeddings import embed_texts
+from app.rag.retriever import retrieve_chunks
+from app.rag.utils import source_category
+from app.rag.vector_store import (
+    create_faiss_index,
+    filter_rows,
+    load_faiss_index,
+    partitions,
+    save_faiss_index,
+)
+
+ROWS = [
+    ("Restaurant & Food Services.pdf", "Breakfast is served from seven in the lobby restaurant."),
+    ("Restaurant & Food Services.pdf", "Room service runs until midnight."),
+    ("Laundry Services.pdf", "Express laundry is returned the same evening."),
+    ("Medical support.pdf", "A doctor is on call around the clock."),
+    ("Hotel Facilities .pdf", "The rooftop pool opens at seven."),
+]
+
+def _bundle():
+    texts = [text for _, text in ROWS]
+    return create_faiss_index(embed_texts(texts, backend="local"), texts,
+                              [{"source": source} for source, _ in ROWS], "local")
+
+def test_source_categories():
+    assert [source_category(source) for source, _ in ROWS] == ["Food", "Food", "Laundry", "Medical", "General"]
+
+def test_filter_rows():
+    bundle = _bundle()
+    assert filter_rows(bundle, None) is None
+    assert filter_rows(bundle, {"category": "Food"}).tolist() == [0, 1]
+    assert filter_rows(bundle, {"category": ["Laundry", "Medical"]}).tolist() == [2, 3]
+    assert filter_rows(bundle, {"category": "Food", "source": "Laundry Services.pdf"}).tolist() == []
+    assert filter_rows(bundle, {"source": "Missing.pdf"}).tolist() == []
+    assert set(partitions(bundle, "category")) == {"Food", "Laundry", "Medical", "General"}
+    assert "category" in bundle["partitions"]
+
+def test_saved_category_codes_give_the_same_partitions(tmp_path):
+    bundle = _bundle()
+    save_faiss_index(bundle, tmp_path / "index.faiss", tmp_path / "kb.gbkb")
+    loaded = load_faiss_index(tmp_path / "index.faiss", tmp_path / "kb.gbkb")
+    for key in ("source", "category"):
+        expected = {value: rows.tolist() for value, rows in partitions(bundle, key).items()}
+        assert {value: rows.tolist() for value, rows in partitions(loaded, key).items()} == expected
+
+@pytest.mark.parametrize("exact_max_rows", [50_000, 0])
+@pytest.mark.parametrize("mode", ["dense", "lexical", "hybrid"])
+def test_filtered_search_only_returns_matching_rows(monkeypatch, exact_max_rows, mode):
+    # 0 sends every filtered search through the FAISS index with a row selector.
+    monkeypatch.setattr(vector_store, "PARTITION_EXACT_MAX_ROWS", exact_max_rows)
+    bundle = _bundle()
+    results = retrieve_chunks("When does breakfast open?", bundle, top_k=5, use_cache=False,
+                              mode=mode, filters={"category": "Food"})
+    assert results
+    assert {r["id"] for r in results} <= {0, 1}
+
+    unfiltered = retrieve_chunks("rooftop pool", bundle, top_k=1, use_cache=False, mode=mode)
+    assert unfiltered[0]["id"] == 4
+    filtered = retrieve_chunks("rooftop pool", bundle, top_k=1, use_cache=False, mode=mode,
+                               filters={"category": "Laundry"})
+    assert [r["id"] for r in filtered] in ([], [2])
+
+def test_filter_matching_nothing_skips_the_search():
+    def embed(query):
+        raise AssertionError("nothing to search, nothing to embed")
+
+    assert retrieve_chunks("breakfast", _bundle(), embed, filters={"category": "Bellhop"}) == []
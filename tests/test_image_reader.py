@@ -0,0 +1,119 @@
+# tests/test_image_reader.py
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.rag import image_loader
+from app.rag.description_cache import DescriptionCache, description_key
+from app.rag.image_loader import describe_image, image_mime_type
+from app.rag.image_reader import load_images_text
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 32
+JPEG = b"\xff\xd8\xff\xe0" + b"\0" * 32
+
+class FakeVisionClient:
+    """Answers chat.completions.create like the Vision model, recording every request."""
+
+    def __init__(self, delay=0.0, fail_on=()):
+        self.requests = []
+        self.delay = delay
+        self.fail_on = fail_on
+        self.active = self.max_active = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, temperature):
+        url = messages[0]["content"][1]["image_url"]["url"]
+        with self._lock:
+            self.requests.append(url)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if any(marker in url for marker in self.fail_on):
+                raise RuntimeError("vision request failed")
+            message = SimpleNamespace(content=f" description {len(self.requests)} ")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        finally:
+            with self._lock:
+                self.active -= 1
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = DescriptionCache(str(tmp_path / "cache" / "descriptions.sqlite"), max_entries=10)
+    monkeypatch.setattr(image_loader, "_cache", cache)
+    yield cache
+    cache.close()
+
+def _image(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+def test_mime_type_comes_from_the_content():
+    assert image_mime_type(PNG, "photo.jpg") == "image/png"
+    assert image_mime_type(JPEG, "scan.png") == "image/jpeg"
+    assert image_mime_type(b"RIFF\0\0\0\0WEBPVP8 ", "x") == "image/webp"
+    assert image_mime_type(b"GIF89a...", "x") == "image/gif"
+    assert image_mime_type(b"????", "menu.jpeg") == "image/jpeg"
+    assert image_mime_type(b"????", "unknown") == "image/png"
+
+def test_upload_uses_the_real_mime_type(tmp_path):
+    client = FakeVisionClient()
+    assert image_loader.image_to_text(_image(tmp_path, "menu.png", JPEG), client) == "description 1"
+    assert client.requests[0].startswith("data:image/jpeg;base64,")
+
+def test_description_key_covers_everything_that_shapes_the_answer():
+    key = description_key("abc", "gpt-4o-mini", "Describe", 1024)
+    assert key == description_key("abc", "gpt-4o-mini", "Describe", 1024)
+    assert len({key, description_key("abd", "gpt-4o-mini", "Describe", 1024),
+                description_key("abc", "gpt-4o", "Describe", 1024),
+                description_key("abc", "gpt-4o-mini", "Summarize", 1024),
+                description_key("abc", "gpt-4o-mini", "Describe", 0)}) == 5
+
+def test_description_cache_persists_and_evicts(tmp_path):
+    path = str(tmp_path / "descriptions.sqlite")
+    cache = DescriptionCache(path, max_entries=2)
+    cache.put("a", "lobby")
+    cache.put("b", "pool")
+    cache.get_many(["a"])
+    cache.put("c", "spa")
+    assert cache.get_many(["a", "b", "c"]) == {"a": "lobby", "c": "spa"}
+    assert cache.evictions == 1
+    cache.close()
+
+    reopened = DescriptionCache(path, max_entries=2)
+    assert reopened.get_many(["a"]) == {"a": "lobby"}
+    reopened.close()
+
+def test_described_content_is_never_sent_again(tmp_path, cache):
+    client = FakeVisionClient()
+    first = describe_image(_image(tmp_path, "logo.png", PNG), client)
+    # The same pixels under another name come from the cache.
+    assert describe_image(_image(tmp_path, "logo copy.png", PNG), client) == first
+    assert len(client.requests) == 1
+    assert cache.stats()["hits"] == 1
+
+def test_identical_images_are_described_once(tmp_path):
+    client = FakeVisionClient()
+    paths = [_image(tmp_path, "logo.png", PNG), _image(tmp_path, "menu.jpg", JPEG),
+             _image(tmp_path, "logo-old.png", PNG)]
+    documents = load_images_text(paths, client)
+    assert len(client.requests) == 2
+    assert [d["source"] for d in documents] == ["logo.png", "menu.jpg", "logo-old.png"]
+    assert documents[0]["text"] == documents[2]["text"]
+    assert documents[0]["doc_id"] == documents[2]["doc_id"] != documents[1]["doc_id"]
+
+def test_images_are_described_concurrently(tmp_path):
+    client = FakeVisionClient(delay=0.05)
+    paths = [_image(tmp_path, f"room{i}.png", PNG + bytes([i])) for i in range(6)]
+    assert len(load_images_text(paths, client, max_workers=3)) == 6
+    assert 1 < client.max_active <= 3
+
+def test_failed_image_is_left_out(tmp_path):
+    client = FakeVisionClient(fail_on=("image/jpeg",))
+    paths = [_image(tmp_path, "logo.png", PNG), _image(tmp_path, "menu.jpg", JPEG)]
+    documents = load_images_text(paths, client)
+    assert [d["source"] for d in documents] == ["logo.png"]
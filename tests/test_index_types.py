@@ -0,0 +1,70 @@
+# tests/test_index_types.py
+import faiss
+import numpy as np
+import pytest
+
+from app.rag.vector_store import (
+    build_index,
+    choose_index_type,
+    create_faiss_index,
+    index_params,
+    load_faiss_index,
+    save_faiss_index,
+)
+
+def _matrix(count, dim=8, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dim)).astype("float32")
+
+def test_auto_picks_index_type_by_corpus_size():
+    assert choose_index_type(9_999) == "flat"
+    assert choose_index_type(10_000) == "hnsw"
+    assert choose_index_type(200_000) == "ivf_flat"
+    assert choose_index_type(2_000_000) == "ivf_pq"
+    assert index_params("auto", 500, 16)["type"] == "flat"
+    assert index_params("auto", 50_000, 16)["type"] == "hnsw"
+
+def test_index_params_rejects_unknown_types():
+    with pytest.raises(ValueError):
+        index_params("annoy", 100, 16)
+    with pytest.raises(ValueError):
+        index_params("flat", 100, 16, storage="int4")
+
+def test_ivf_params_fit_the_corpus():
+    params = index_params("ivf_pq", 5_000, 24)
+    assert params["nlist"] * 39 <= 5_000
+    assert 1 <= params["nprobe"] <= params["nlist"]
+    assert 24 % params["m"] == 0
+    assert 2 ** params["nbits"] <= 5_000 // 39
+    assert params["factory"] == f"IVF{params['nlist']},PQ{params['m']}x{params['nbits']}"
+
+@pytest.mark.parametrize("index_type, faiss_type", [
+    ("flat", faiss.IndexFlat),
+    ("hnsw", faiss.IndexHNSWFlat),
+    ("ivf_flat", faiss.IndexIVFFlat),
+    ("ivf_pq", faiss.IndexIVFPQ),
+])
+def test_build_index_trains_and_finds_exact_matches(index_type, faiss_type):
+    matrix = _matrix(2_000)
+    index, params = build_index(matrix, index_type, "float32")
+    assert isinstance(index, faiss_type)
+    assert params["type"] == index_type
+    assert index.is_trained and index.ntotal == len(matrix)
+
+    # Every index type must find a stored vector when queried with it.
+    # PQ codes are lossy, so it only needs to rank it near the top.
+    queries = matrix[:50]
+    _, I = index.search(queries, 10)
+    hits = [row in I[row][:1 if index_type != "ivf_pq" else 10] for row in range(len(queries))]
+    assert np.mean(hits) >= 0.9
+
+def test_saved_index_keeps_its_type_and_search_params(tmp_path):
+    matrix = _matrix(1_000)
+    bundle = create_faiss_index(list(matrix), [f"chunk {i}" for i in range(len(matrix))],
+                                [{"source": "guide.pdf"} for _ in matrix], "local", index_type="ivf_flat")
+    params = bundle["index_params"]
+    save_faiss_index(bundle, tmp_path / "index.faiss", tmp_path / "kb.gbkb")
+
+    loaded = load_faiss_index(tmp_path / "index.faiss", tmp_path / "kb.gbkb")
+    assert loaded["index_params"] == params
+    assert isinstance(loaded["faiss"], faiss.IndexIVFFlat)
+    assert faiss.extract_index_ivf(loaded["faiss"]).nprobe == params["nprobe"]
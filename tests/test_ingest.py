@@ -0,0 +1,39 @@
+# tests/test_ingest.py
+import numpy as np
+import pytest
+
+from app.rag.pipeline import run_stage
+from app.rag.vector_store import StreamingIndexBuilder, load_faiss_index
+
+def _rows(n, dim, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype("float32")
+    return list(vectors / np.linalg.norm(vectors, axis=1, keepdims=True))
+
+def test_builder_takes_the_vector_size_from_the_first_batch(tmp_path):
+    builder = StreamingIndexBuilder(tmp_path / "kb.bin", tmp_path / "kb.kb", embedding_backend="local")
+    builder.add(_rows(3, 12), ["a", "b", "c"], [{"chunk": i} for i in range(3)])
+    builder.add(_rows(2, 12, seed=1), ["d", "e"], [{"chunk": i} for i in range(3, 5)])
+    builder.finish()
+
+    bundle = load_faiss_index(str(tmp_path / "kb.bin"), str(tmp_path / "kb.kb"))
+    assert bundle["faiss"].d == 12
+    assert list(bundle["texts"]) == ["a", "b", "c", "d", "e"]
+
+def test_builder_rejects_a_batch_of_another_width(tmp_path):
+    builder = StreamingIndexBuilder(tmp_path / "kb.bin", tmp_path / "kb.kb", dim=16)
+    with pytest.raises(ValueError):
+        builder.add(_rows(4, 8), list("abcd"), [{}] * 4)
+    builder.abort()
+    assert not (tmp_path / "kb.kb").exists()
+
+def test_run_stage_yields_in_order_and_reraises_stage_errors():
+    assert list(run_stage(iter(range(10)), maxsize=2)) == list(range(10))
+
+    def failing():
+        yield 1
+        raise RuntimeError("extraction failed")
+
+    stage = run_stage(failing(), maxsize=1)
+    assert next(stage) == 1
+    with pytest.raises(RuntimeError, match="extraction failed"):
+        next(stage)
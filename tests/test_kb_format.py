@@ -0,0 +1,87 @@
+# tests/test_kb_format.py
+import numpy as np
+import pytest
+
+from app.rag.kb_format import (
+    KnowledgeBaseWriter,
+    is_knowledge_base,
+    open_knowledge_base,
+    write_knowledge_base,
+)
+
+TEXTS = ["Breakfast is served from seven.", "", "Le spa ouvre à neuf heures ☀", "Checkout is at noon."]
+METADATAS = [
+    {"source": "guide.pdf", "page": 1, "score": 0.5, "scanned": False, "tags": ["food"], "title": "Breakfast"},
+    {"source": "guide.pdf", "page": 2, "score": 1, "scanned": True, "tags": [], "title": "Blank page"},
+    {"source": "spa.pdf", "page": 1, "score": 2.25, "scanned": False, "tags": {"lang": "fr"}, "title": "Spa"},
+    {"source": "guide.pdf", "scanned": True, "title": "Checkout", "note": "late checkout on request"},
+]
+
+def _vectors(count, dim=4):
+    return np.arange(count * dim, dtype=np.float32).reshape(count, dim) / 10
+
+def test_round_trip_keeps_vectors_texts_and_metadata(tmp_path):
+    path = tmp_path / "kb.gbkb"
+    lexical = np.array([3, 1, 4, 1, 5], dtype=np.int32)
+    write_knowledge_base(path, _vectors(4), TEXTS, METADATAS,
+                         attrs={"embedding_backend": "local"}, extra_sections={"lexical.ids": lexical})
+
+    assert is_knowledge_base(path)
+    kb = open_knowledge_base(path)
+    assert (len(kb), kb.dim) == (4, 4)
+    np.testing.assert_array_equal(kb.vectors, _vectors(4))
+    assert list(kb.texts) == TEXTS
+    assert list(kb.metadatas) == METADATAS
+    assert kb.metadatas[-1] == METADATAS[-1]
+    assert kb.metadatas[1:3] == METADATAS[1:3]
+    assert kb.attrs == {"embedding_backend": "local"}
+    np.testing.assert_array_equal(kb.extra["lexical.ids"], lexical)
+    with pytest.raises(IndexError):
+        kb.metadatas[4]
+
+def test_repeated_strings_are_stored_as_categories(tmp_path):
+    path = tmp_path / "kb.gbkb"
+    write_knowledge_base(path, _vectors(4), TEXTS, METADATAS)
+    metadatas = open_knowledge_base(path).metadatas
+
+    codes, categories = metadatas.column("source")
+    assert [categories[c] for c in codes] == [m["source"] for m in METADATAS]
+    np.testing.assert_array_equal(metadatas.column("page"), [1, 2, 1, 0])
+    assert metadatas.column("page").dtype == np.int64
+    assert metadatas.column("score").dtype == np.float64
+
+def test_other_files_are_not_knowledge_bases(tmp_path):
+    legacy = tmp_path / "metadata.pkl"
+    legacy.write_bytes(b"\x80\x04legacy pickle")
+    assert not is_knowledge_base(legacy)
+    assert not is_knowledge_base(tmp_path / "missing.gbkb")
+    with pytest.raises(ValueError):
+        open_knowledge_base(legacy)
+
+def test_write_rejects_misaligned_rows(tmp_path):
+    with pytest.raises(ValueError):
+        write_knowledge_base(tmp_path / "kb.gbkb", _vectors(3), TEXTS, METADATAS)
+
+def test_writer_matches_write_knowledge_base(tmp_path):
+    writer = KnowledgeBaseWriter(tmp_path / "streamed.gbkb")
+    writer.append(_vectors(4)[:2], TEXTS[:2], METADATAS[:2])
+    writer.append(_vectors(4)[2:], TEXTS[2:], METADATAS[2:])
+    assert writer.dim == 4
+    np.testing.assert_array_equal(writer.vectors(), _vectors(4))
+    assert list(writer.texts()) == TEXTS
+    writer.close(attrs={"embedding_backend": "local"})
+
+    write_knowledge_base(tmp_path / "direct.gbkb", _vectors(4), TEXTS, METADATAS,
+                         attrs={"embedding_backend": "local"})
+    streamed, direct = open_knowledge_base(tmp_path / "streamed.gbkb"), open_knowledge_base(tmp_path / "direct.gbkb")
+    np.testing.assert_array_equal(streamed.vectors, direct.vectors)
+    assert list(streamed.texts) == list(direct.texts)
+    assert list(streamed.metadatas) == list(direct.metadatas)
+    assert streamed.attrs == direct.attrs
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["direct.gbkb", "streamed.gbkb"]
+
+def test_writer_abort_leaves_nothing_behind(tmp_path):
+    writer = KnowledgeBaseWriter(tmp_path / "kb.gbkb", dim=4)
+    writer.append(_vectors(2), TEXTS[:2], METADATAS[:2])
+    writer.abort()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,33 @@
+# tests/test_lexical.py
+import numpy as np
+
+from app.rag.lexical import BM25Index
+
+TEXTS = [
+    "Express laundry surcharge applies to same-day service.",
+    "The Bengali Suite has a private balcony.",
+    "Breakfast is served in the lobby restaurant.",
+    "Laundry bags are collected every morning.",
+]
+
+def test_search_ranks_rows_with_more_query_terms_first():
+    index = BM25Index.build(TEXTS)
+    ids, scores, coverage = index.search("express laundry surcharge", 3)
+    assert ids.tolist() == [0, 3]
+    assert scores[0] > scores[1] > 0
+    assert coverage.tolist() == [1.0, 1 / 3]
+
+def test_search_skips_deleted_and_filtered_rows():
+    index = BM25Index.build(TEXTS)
+    deleted = np.array([True, False, False, False])
+    assert index.search("laundry", 3, deleted=deleted)[0].tolist() == [3]
+    assert index.search("laundry", 3, rows=np.array([0, 1]))[0].tolist() == [0]
+
+def test_appended_rows_are_searchable_and_survive_merging():
+    index = BM25Index.build(TEXTS)
+    index.append(["Valet parking for the Bengali Suite is free."])
+    ids, scores, _ = index.search("bengali suite parking", 2)
+    assert ids.tolist() == [4, 1]
+    merged_ids, merged_scores, _ = index.merged().search("bengali suite parking", 2)
+    assert merged_ids.tolist() == ids.tolist()
+    assert np.allclose(merged_scores, scores)
@@ -0,0 +1,25 @@
+# tests/test_local_embeddings.py
+import numpy as np
+import pytest
+
+from app.rag.embeddings import embed_texts, get_backend
+from app.rag.local_embeddings import LocalHashEmbeddingBackend
+
+def test_vectors_are_deterministic_and_unit_length():
+    backend = LocalHashEmbeddingBackend(dim=64)
+    a, b = backend.embed(["Express laundry service", "Express laundry service"])
+    assert a.shape == (64,) and a.dtype == np.float32
+    assert np.array_equal(a, b)
+    assert np.isclose(np.linalg.norm(a), 1.0)
+
+def test_related_texts_are_closer_than_unrelated_ones():
+    backend = LocalHashEmbeddingBackend(dim=256)
+    query, near, far = backend.embed(["check-out time", "What time is checkout?", "Spa massage prices"])
+    assert query @ near > query @ far
+
+def test_backends_are_selected_by_name():
+    assert get_backend("local").name == "local"
+    assert get_backend("LOCAL") is get_backend("local")
+    assert len(embed_texts(["pool"], backend="local")[0]) == get_backend("local").dim
+    with pytest.raises(ValueError):
+        get_backend("word2vec")
@@ -0,0 +1,73 @@
+# tests/test_manifest.py
+import json
+import os
+
+import pytest
+
+from app.rag import utils
+from app.rag.utils import file_fingerprint, file_hash, load_manifest, manifest_hash, save_manifest, scan_files
+
+@pytest.fixture
+def manifest_path(tmp_path, monkeypatch):
+    path = tmp_path / "data" / "manifest.json"
+    monkeypatch.setattr(utils, "MANIFEST_PATH", str(path))
+    return path
+
+def test_file_hash_streams_large_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "HASH_BLOCK_SIZE", 7)
+    path = tmp_path / "guide.pdf"
+    path.write_bytes(b"0123456789" * 10)
+    streamed = file_hash(path)
+    monkeypatch.setattr(utils, "HASH_BLOCK_SIZE", 1 << 20)
+    assert file_hash(path) == streamed
+    path.write_bytes(b"0123456789" * 10 + b"!")
+    assert file_hash(path) != streamed
+
+def test_unchanged_files_are_confirmed_by_stat(tmp_path, monkeypatch):
+    path = tmp_path / "guide.pdf"
+    path.write_bytes(b"breakfast at seven")
+    first = file_fingerprint(path)
+    assert first["rehashed"] and first["hash"] == file_hash(path)
+
+    monkeypatch.setattr(utils, "file_hash", lambda p: pytest.fail("an unchanged file was read"))
+    second = file_fingerprint(path, first)
+    assert not second["rehashed"] and second["hash"] == first["hash"]
+
+def test_touched_files_are_hashed_again(tmp_path):
+    path = tmp_path / "guide.pdf"
+    path.write_bytes(b"breakfast at seven")
+    first = file_fingerprint(path)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    touched = file_fingerprint(path, first)
+    assert touched["rehashed"] and touched["hash"] == first["hash"]
+
+    # Bare hashes from older manifests carry no stat, so the file is read once.
+    assert file_fingerprint(path, first["hash"])["rehashed"]
+    assert manifest_hash(first["hash"]) == manifest_hash(first) == first["hash"]
+
+def test_scan_files_keeps_entries_of_unreadable_files(tmp_path):
+    readable = tmp_path / "a.pdf"
+    readable.write_bytes(b"a")
+    gone, new_gone = str(tmp_path / "gone.pdf"), str(tmp_path / "new.pdf")
+    entries = scan_files([str(readable), gone, new_gone], {gone: "abc"}, workers=4)
+    assert entries[str(readable)]["hash"] == file_hash(readable)
+    assert entries[gone] == {"hash": "abc", "rehashed": False}
+    assert new_gone not in entries
+
+def test_manifest_round_trip_is_atomic(tmp_path, manifest_path):
+    assert load_manifest() == {}
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"a")
+    entries = scan_files([str(path)], {})
+    save_manifest(entries)
+
+    saved = load_manifest()
+    assert "rehashed" not in saved[str(path)]
+    assert file_fingerprint(path, saved[str(path)])["rehashed"] is False
+    assert os.listdir(manifest_path.parent) == ["manifest.json"]
+
+    manifest_path.write_text("{ truncated")
+    assert load_manifest() == {}
+    save_manifest({"b.pdf": "legacy-hash"})
+    assert json.loads(manifest_path.read_text()) == {"b.pdf": "legacy-hash"}
@@ -0,0 +1,36 @@
+# tests/test_pdf_loader.py
+import pytest
+
+from app.rag.pdf_loader import extract_pdf_pages
+from benchmarks.bench_pdf_extraction import write_pdf
+
+def _pages(name, count):
+    return [[f"{name} page {i}"] for i in range(count)]
+
+@pytest.fixture
+def pdfs(tmp_path):
+    paths = {}
+    for name, count in (("short", 2), ("long", 11), ("single", 1)):
+        paths[name] = tmp_path / f"{name}.pdf"
+        write_pdf(paths[name], _pages(name, count))
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    paths["broken"] = broken
+    return paths
+
+def _texts(pages):
+    return [page.strip() for page in pages]
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_pages_come_back_in_order_across_page_ranges(pdfs, workers):
+    paths = [pdfs["short"], pdfs["long"], pdfs["broken"], pdfs["single"]]
+    result = extract_pdf_pages(paths, workers=workers, pages_per_task=4)
+
+    assert list(result) == paths
+    assert _texts(result[pdfs["long"]]) == [f"long page {i}" for i in range(11)]
+    assert _texts(result[pdfs["short"]]) == ["short page 0", "short page 1"]
+    assert result[pdfs["broken"]] is None
+
+def test_a_single_long_file_is_split_over_the_pool(pdfs):
+    result = extract_pdf_pages([pdfs["long"]], workers=2, pages_per_task=3)
+    assert _texts(result[pdfs["long"]]) == [f"long page {i}" for i in range(11)]
@@ -0,0 +1,49 @@
+# tests/test_query_cache.py
+import numpy as np
+
+from app.rag.retriever import QueryEmbeddingCache, normalize_query
+
+def _embedder(calls):
+    return lambda q: calls.append(q) or [np.full(3, len(q), dtype="float32")]
+
+def test_normalized_questions_share_an_entry():
+    assert normalize_query("What time is Checkout?") == normalize_query("what time is  checkout")
+    cache, calls = QueryEmbeddingCache(max_size=8), []
+    first = cache.get_or_embed("What time is checkout?", _embedder(calls))
+    again = cache.get_or_embed("what time is  checkout", _embedder(calls))
+    assert calls == ["What time is checkout?"]
+    assert again is first
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+def test_namespaces_keep_backends_apart():
+    cache, calls = QueryEmbeddingCache(max_size=8), []
+    cache.get_or_embed("spa hours", _embedder(calls), namespace="openai")
+    cache.get_or_embed("spa hours", _embedder(calls), namespace="local")
+    assert len(calls) == 2
+
+def test_least_recently_used_and_expired_entries_go():
+    cache, calls = QueryEmbeddingCache(max_size=2, ttl=60), []
+    for q in ("a", "b", "a", "c"):
+        cache.get_or_embed(q, _embedder(calls))
+    cache.get_or_embed("b", _embedder(calls))
+    assert calls == ["a", "b", "c", "b"]
+
+    expiring = QueryEmbeddingCache(max_size=2, ttl=-1)
+    expiring.get_or_embed("a", _embedder(calls))
+    expiring.get_or_embed("a", _embedder(calls))
+    assert calls[-2:] == ["a", "a"]
+
+def test_failed_embeddings_are_not_cached():
+    cache, calls = QueryEmbeddingCache(max_size=8), []
+    failing = lambda q: calls.append(q) or [None]
+    assert cache.get_or_embed("pool", failing) is None
+    cache.get_or_embed("pool", failing)
+    assert len(calls) == 2
+
+def test_many_queries_are_embedded_in_one_call():
+    cache, requests = QueryEmbeddingCache(max_size=8), []
+    embed_many = lambda qs: requests.append(list(qs)) or [np.ones(2) * len(q) for q in qs]
+    cache.get_or_embed_many(["spa", "pool"], embed_many)
+    vectors = cache.get_or_embed_many(["pool", "gym", "Gym!", "spa"], embed_many)
+    assert requests == [["spa", "pool"], ["gym"]]
+    assert len(vectors) == 4 and vectors[1] is not None and np.array_equal(vectors[1], vectors[2])
@@ -0,0 +1,108 @@
+# tests/test_retriever.py
+import numpy as np
+import pytest
+
+from app.rag.config import RRF_K
+from app.rag.embeddings import embed_texts
+from app.rag.retriever import (
+    reciprocal_rank_fusion,
+    retrieval_stats,
+    retrieve_chunks,
+    retrieve_chunks_batch,
+)
+from app.rag.vector_store import create_faiss_index
+
+TEXTS = [
+    "Express laundry is returned the same evening.",
+    "The spa opens at nine and closes at eight.",
+    "The rooftop pool is heated all year.",
+    "Breakfast is served in the lobby restaurant from seven.",
+    "Checkout is at noon; late checkout costs extra.",
+]
+QUERIES = ["When does the spa open?", "Is the pool heated?", "What time is checkout?"]
+
+@pytest.fixture
+def bundle():
+    return create_faiss_index(embed_texts(TEXTS, backend="local"), TEXTS,
+                              [{"source": f"doc{i}.pdf"} for i in range(len(TEXTS))], "local")
+
+def _recording_embedder():
+    calls = []
+
+    def embed_many(queries):
+        calls.append(list(queries))
+        return embed_texts(queries, backend="local")
+
+    return embed_many, calls
+
+def test_batch_matches_single_queries(bundle):
+    batch = retrieve_chunks_batch(QUERIES, bundle, top_k=2, use_cache=False, mode="dense")
+    single = [retrieve_chunks(q, bundle, top_k=2, use_cache=False, mode="dense") for q in QUERIES]
+    assert [[r["id"] for r in res] for res in batch] == [[r["id"] for r in res] for res in single]
+    for batch_res, single_res in zip(batch, single):
+        np.testing.assert_allclose([r["score"] for r in batch_res], [r["score"] for r in single_res], rtol=1e-5)
+
+def test_batch_embeds_all_queries_in_one_request(bundle):
+    embed_many, calls = _recording_embedder()
+    results = retrieve_chunks_batch(QUERIES, bundle, embed_many, top_k=3, use_cache=False, mode="dense")
+    assert calls == [QUERIES]
+    assert len(results) == len(QUERIES)
+    for res in results:
+        assert len(res) == 3
+        scores = [r["score"] for r in res]
+        assert scores == sorted(scores, reverse=True)
+        # Unit-length vectors: scores are cosine similarities.
+        assert all(-1.0 - 1e-5 <= s <= 1.0 + 1e-5 for s in scores)
+        assert all(r["text"] == TEXTS[r["id"]] and r["metadata"] == {"source": f"doc{r['id']}.pdf"} for r in res)
+
+def test_exact_text_scores_highest(bundle):
+    results = retrieve_chunks_batch([TEXTS[2]], bundle, top_k=1, use_cache=False, mode="dense")
+    assert results[0][0]["id"] == 2
+    assert results[0][0]["score"] == pytest.approx(1.0, abs=1e-5)
+
+def test_failed_embedding_only_empties_its_own_query(bundle):
+    def embed_many(queries):
+        vectors = embed_texts(queries, backend="local")
+        return [None if q == QUERIES[1] else v for q, v in zip(queries, vectors)]
+
+    results = retrieve_chunks_batch(QUERIES, bundle, embed_many, use_cache=False, mode="dense")
+    assert results[1] == []
+    assert results[0] and results[2]
+
+def test_top_k_beyond_the_corpus_returns_every_row_once(bundle):
+    results = retrieve_chunks_batch(QUERIES[:1], bundle, top_k=10, use_cache=False, mode="dense")
+    assert sorted(r["id"] for r in results[0]) == list(range(len(TEXTS)))
+
+def test_empty_batch_and_unknown_mode(bundle):
+    assert retrieve_chunks_batch([], bundle) == []
+    with pytest.raises(ValueError):
+        retrieve_chunks_batch(QUERIES, bundle, mode="semantic")
+
+def _no_embedding(queries):
+    raise AssertionError(f"{queries} should not have been embedded")
+
+def test_lexical_mode_never_embeds(bundle):
+    results = retrieve_chunks_batch(["late checkout"], bundle, _no_embedding, top_k=2, mode="lexical")
+    assert results[0][0]["id"] == 4
+
+def test_hybrid_answers_exact_term_queries_without_embedding(bundle):
+    before = retrieval_stats()["lexical_fast_path"]
+    results = retrieve_chunks_batch(["rooftop pool heated"], bundle, _no_embedding, top_k=2,
+                                    use_cache=False, mode="hybrid")
+    assert results[0][0]["id"] == 2
+    assert retrieval_stats()["lexical_fast_path"] == before + 1
+
+def test_hybrid_fuses_dense_and_lexical_rankings(bundle):
+    embed_many, calls = _recording_embedder()
+    queries = ["When does the spa open?", "rooftop pool heated"]
+    results = retrieve_chunks_batch(queries, bundle, embed_many, top_k=3, use_cache=False, mode="hybrid")
+    # Only the query BM25 is unsure about is embedded.
+    assert calls == [["When does the spa open?"]]
+    assert results[0][0]["id"] == 1
+    # RRF scores: at most one 1 / (k + 1) share per ranking.
+    assert results[0][0]["score"] <= 2 / (RRF_K + 1)
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    ids, scores = reciprocal_rank_fusion([[3, 1, 2], [1, 4]], top_k=3, k=60)
+    assert ids.tolist() == [1, 3, 4]
+    assert scores[0] == pytest.approx(1 / 62 + 1 / 61)
@@ -0,0 +1,65 @@
+# tests/test_router.py
+import pytest
+
+from app.rag.router import TurnRouter
+
+@pytest.fixture(scope="module")
+def router():
+    return TurnRouter()
+
+@pytest.mark.parametrize("turn", [
+    "thanks, when does the spa open",
+    "ok what about breakfast",
+    "hi, is the pool open",
+    "it's about the pool timings",
+    "yes, and is parking free?",
+])
+def test_questions_after_courtesy_words_retrieve(router, turn):
+    assert router.route(turn)["retrieve"], turn
+
+@pytest.mark.parametrize("turn", [
+    "I am looking for vegetarian options",
+    "I am allergic to peanuts",
+    "it's about the pool timings",
+    "thanks, when does the spa open",
+    "ok what about breakfast",
+    "hi, is the pool open",
+])
+def test_sentences_are_not_names_or_acknowledgements(router, turn):
+    assert router.route(turn)["reason"] not in ("name", "acknowledgement"), turn
+
+@pytest.mark.parametrize("turn, reason", [
+    ("ok", "acknowledgement"),
+    ("Thanks!", "acknowledgement"),
+    ("yes please", "acknowledgement"),
+    ("ok, thank you so much", "acknowledgement"),
+    ("my name is sarah khan", "name"),
+    ("I'm Sarah Khan", "name"),
+    ("This is John", "name"),
+    ("my email is john@example.com", "data"),
+])
+def test_short_transactional_turns_skip(router, turn, reason):
+    decision = router.route(turn)
+    assert not decision["retrieve"], turn
+    assert decision["reason"] == reason
+
+def test_skips_are_counted_by_reason():
+    router = TurnRouter()
+    router.route("my email is guest@example.com")
+    router.route("yes, confirm it")
+    router.route("when does the spa open?")
+    stats = router.stats()
+    assert (stats["retrieved"], stats["skipped"]) == (1, 2)
+    assert stats["skip_rate"] == pytest.approx(2 / 3)
+    assert stats["reasons"]["skip:data"] == 1 and stats["reasons"]["retrieve:question"] == 1
+
+def test_disabled_router_always_retrieves():
+    assert TurnRouter(enabled=False).route("yes, confirm it") == {
+        "retrieve": True, "reason": "disabled", "mode": "general", "filters": None,
+    }
+
+def test_hotline_turns_are_filtered_by_category(router):
+    assert router.route("can I get a doctor to my room?", mode="hotline")["filters"] == {"category": "Medical"}
+    history = [("I need my shirts washed", "Sure, our laundry team can help.")]
+    assert router.route("how much does it cost?", mode="hotline", history=history)["filters"] == {"category": "Laundry"}
+    assert router.route("how much does it cost?", mode="booking", history=history)["filters"] is None
@@ -0,0 +1,89 @@
+# tests/test_snapshots.py
+import time
+
+from app.rag.embeddings import embed_texts
+from app.rag.retriever import retrieve_chunks
+from app.rag.snapshots import SnapshotManager
+from app.rag.vector_store import create_faiss_index, save_faiss_index
+
+def _save(tmp_path, texts):
+    bundle = create_faiss_index(embed_texts(texts, backend="local"), texts,
+                                [{"source": "guide.pdf"} for _ in texts], "local")
+    # Snapshot versions are millisecond timestamps.
+    time.sleep(0.002)
+    save_faiss_index(bundle, tmp_path / "index.faiss", tmp_path / "kb.gbkb")
+
+def _manager(tmp_path):
+    return SnapshotManager(tmp_path / "index.faiss", tmp_path / "kb.gbkb")
+
+def test_reload_serves_new_saves_only(tmp_path):
+    manager = _manager(tmp_path)
+    assert manager.reload(retries=1) is False
+    assert manager.version is None and manager.failed_reloads == 1
+    with manager.acquire() as index:
+        assert index is None
+
+    _save(tmp_path, ["The pool opens at seven."])
+    assert manager.reload() is True
+    first = manager.version
+    assert manager.reload() is False
+    assert manager.version == first
+
+    _save(tmp_path, ["The pool opens at seven.", "The gym never closes."])
+    assert manager.reload() is True
+    assert manager.version > first
+    assert manager.status()["rows"] == 2 and manager.status()["reloads"] == 2
+
+def test_reader_keeps_its_snapshot_across_a_reload(tmp_path):
+    _save(tmp_path, ["The pool opens at seven."])
+    manager = _manager(tmp_path)
+    manager.reload()
+
+    with manager.acquire() as pinned:
+        _save(tmp_path, ["Breakfast is served until ten.", "The gym never closes."])
+        assert manager.reload() is True
+        # The pinned bundle is still whole and searchable until the block exits.
+        assert len(pinned["texts"]) == 1
+        assert retrieve_chunks("pool", pinned, mode="lexical")[0]["text"] == "The pool opens at seven."
+        with manager.acquire() as current:
+            assert len(current["texts"]) == 2
+
+def test_retired_snapshot_is_released_by_its_last_reader(tmp_path):
+    _save(tmp_path, ["The pool opens at seven."])
+    manager = _manager(tmp_path)
+    manager.reload()
+    old = manager._current
+
+    with manager.acquire():
+        _save(tmp_path, ["The gym never closes."])
+        manager.reload()
+        assert old.retired and old.bundle is not None
+    assert old.readers == 0 and old.bundle is None
+
+def test_mismatched_files_keep_the_current_snapshot(tmp_path):
+    _save(tmp_path, ["The pool opens at seven."])
+    manager = _manager(tmp_path)
+    manager.reload()
+    version = manager.version
+
+    # A save caught halfway: the FAISS file no longer matches the knowledge base.
+    (tmp_path / "index.faiss").write_bytes(b"not a faiss index")
+    assert manager.reload(retries=1) is False
+    assert manager.version == version and manager.failed_reloads == 1
+    with manager.acquire() as index:
+        assert index["texts"][0] == "The pool opens at seven."
+
+def test_watch_picks_up_a_new_save(tmp_path):
+    _save(tmp_path, ["The pool opens at seven."])
+    manager = _manager(tmp_path)
+    manager.reload()
+    version = manager.version
+    manager.watch(0.01)
+    try:
+        _save(tmp_path, ["The gym never closes."])
+        deadline = time.time() + 5
+        while manager.version == version and time.time() < deadline:
+            time.sleep(0.01)
+        assert manager.version > version
+    finally:
+        manager.stop()
@@ -0,0 +1,119 @@
+# tests/test_sync.py
+import json
+import os
+import shutil
+
+import pytest
+
+from app.rag import sync, utils
+from app.rag.vector_store import load_faiss_index
+from benchmarks.bench_pdf_extraction import write_pdf
+
+TOPICS = {
+    "Medical support.pdf": "The hotel doctor is on call day and night for every guest.",
+    "Laundry services.pdf": "Laundry handed in before nine is returned the same evening.",
+    "Restaurant menu.pdf": "Breakfast is served in the garden restaurant from seven.",
+}
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    (tmp_path / "pdf").mkdir()
+    (tmp_path / "images").mkdir()
+    for name, sentence in TOPICS.items():
+        write_pdf(tmp_path / "pdf" / name, [[sentence] * 20, [sentence.upper()] * 20])
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(utils, "MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    return tmp_path
+
+def run_sync(pdf_dir, img_dir="images"):
+    return sync.sync_documents(str(pdf_dir), str(img_dir), None, "index.bin", "index.kb")
+
+def chunk_count():
+    return len(load_faiss_index("index.bin", "index.kb")["texts"])
+
+def test_relative_then_absolute_paths_keep_the_knowledge_base(corpus):
+    first = run_sync("pdf")
+    assert first["added"] == 3
+    chunks = chunk_count()
+    assert chunks > 0
+
+    second = run_sync(corpus / "pdf", corpus / "images")
+    assert (second["added"], second["modified"], second["removed"]) == (0, 0, 0)
+    assert second["unchanged"] == 3
+    assert chunk_count() == chunks
+
+def test_manifest_from_another_location_never_deletes_indexed_files(corpus):
+    run_sync("pdf")
+    chunks = chunk_count()
+
+    # The same files, recorded under paths that no longer exist.
+    manifest = json.loads((corpus / "manifest.json").read_text())
+    moved = {os.path.join("/moved", os.path.basename(p)): e for p, e in manifest.items()}
+    (corpus / "manifest.json").write_text(json.dumps(moved))
+
+    report = run_sync("pdf")
+    assert report["removed"] == 3
+    assert report["chunks_removed"] == 0
+    assert chunk_count() == chunks
+
+def test_copy_of_an_indexed_file_is_not_embedded_again(corpus, monkeypatch):
+    run_sync("pdf")
+    chunks = chunk_count()
+    shutil.copy(corpus / "pdf" / "Medical support.pdf", corpus / "pdf" / "Medical copy.pdf")
+
+    loaded = []
+    load_documents = sync.load_documents
+    monkeypatch.setattr(sync, "load_documents",
+                        lambda paths, *a, **kw: loaded.extend(paths) or load_documents(paths, *a, **kw))
+
+    report = run_sync("pdf")
+    assert report["duplicates"] == 1
+    assert report["chunks_embedded"] == 0
+    assert loaded == []
+    assert chunk_count() == chunks
+
+    again = run_sync("pdf")
+    assert (again["added"], again["modified"], again["removed"]) == (0, 0, 0)
+
+def test_image_that_cannot_be_described_does_not_fail_the_sync(corpus):
+    # No Vision client (the watcher without an API key): the image fails alone.
+    (corpus / "images" / "lobby.png").write_bytes(b"\x89PNG\r\n\x1a\n" + b"\0" * 64)
+
+    report = run_sync("pdf")
+    assert report["added"] == 4
+    assert chunk_count() > 0
+    manifest = json.loads((corpus / "manifest.json").read_text())
+    assert sorted(os.path.basename(p) for p in manifest) == sorted(TOPICS)
+
+    # Left out of the manifest, so the next sync tries it again.
+    assert run_sync("pdf")["added"] == 1
+
+def test_classify_changes():
+    changes = sync.classify_changes({"a": "1", "b": "2", "c": "3"}, {"a": "1", "b": "9", "d": "4"})
+    assert changes == {"added": ["d"], "modified": ["b"], "removed": ["c"], "unchanged": ["a"]}
+
+def sources():
+    return {m["source"] for m in load_faiss_index("index.bin", "index.kb")["metadatas"]}
+
+def test_only_changed_documents_are_processed(corpus, monkeypatch):
+    run_sync("pdf")
+    before = chunk_count()
+    metadatas = load_faiss_index("index.bin", "index.kb")["metadatas"]
+    kept = sum(1 for m in metadatas if m["source"] == "Medical support.pdf")
+
+    write_pdf(corpus / "pdf" / "Restaurant menu.pdf", [["Dinner is served on the terrace until eleven."] * 10])
+    os.remove(corpus / "pdf" / "Laundry services.pdf")
+    loaded = []
+    load_documents = sync.load_documents
+    monkeypatch.setattr(sync, "load_documents",
+                        lambda paths, *a, **kw: loaded.extend(paths) or load_documents(paths, *a, **kw))
+
+    report = run_sync("pdf")
+    assert (report["added"], report["modified"], report["removed"], report["unchanged"]) == (0, 1, 1, 1)
+    assert [os.path.basename(p) for p in loaded] == ["Restaurant menu.pdf"]
+    assert report["pdfs_skipped"] == 1 and report["files_hashed"] == 1
+    assert report["chunks_reused"] == kept and report["chunks_removed"] == before - kept
+    assert sources() == {"Medical support.pdf", "Restaurant menu.pdf"}
+    texts = load_faiss_index("index.bin", "index.kb")["texts"]
+    assert any("terrace" in t for t in texts) and not any("garden" in t for t in texts)
+    assert chunk_count() == kept + report["chunks_embedded"]
@@ -0,0 +1,29 @@
+# tests/test_text_normalize.py
+from app.rag.text_normalize import (
+    format_normalization_stats, normalization_stats, normalize_pages, normalize_text,
+)
+
+def test_one_word_per_line_extraction_is_rebuilt():
+    raw = "Daily\n \nHousekeeping\n \nServices\n \n \n●\n \nConcept:"
+    assert normalize_text(raw) == "Daily Housekeeping Services\n● Concept:"
+
+def test_soft_wrapped_lines_are_joined_and_hyphenation_removed():
+    raw = "The laundry is col-\nlected daily and re-\nturned by six."
+    assert normalize_text(raw) == "The laundry is collected daily and returned by six."
+
+def test_a_page_continuing_a_sentence_joins_the_previous_page():
+    pages = ["Rooms are cleaned", "daily by our staff.", "Spa\nOpen at nine."]
+    assert normalize_pages(pages) == "Rooms are cleaned daily by our staff.\n\nSpa\nOpen at nine."
+
+def test_stats_only_chunk_when_asked():
+    calls = []
+    chunker = lambda text: calls.append(text) or [text]
+
+    stats = normalization_stats("a  b", "a b", chunker=chunker, chunks=False)
+    assert stats == {"chars_before": 4, "chars_after": 3}
+    assert calls == []
+    assert format_normalization_stats("menu.pdf", stats) == "menu.pdf: 4 -> 3 chars"
+
+    stats = normalization_stats("a  b", "a b", chunker=chunker, chunks=True)
+    assert len(calls) == 2
+    assert format_normalization_stats("menu.pdf", stats) == "menu.pdf: 4 -> 3 chars, 1 -> 1 chunks"
@@ -0,0 +1,56 @@
+# tests/test_upload_manager.py
+import os
+
+from app.rag.retriever import retrieve_federated
+from app.rag.upload_manager import (
+    build_temp_index,
+    cap_session_chunks,
+    clear_tmp_dir,
+    save_uploaded_files,
+)
+from app.rag.vector_store import chunk_memory_bytes
+from benchmarks.bench_pdf_extraction import write_pdf
+
+AGENDA = "Conference agenda: the keynote starts at nine in hall B."
+
+def _upload(tmp_path):
+    write_pdf(tmp_path / "agenda.pdf", [[AGENDA] * 5])
+    (tmp_path / "notes.txt").write_text("not a supported upload")
+    return save_uploaded_files(str(tmp_path / "session"),
+                               [str(tmp_path / "agenda.pdf"), str(tmp_path / "notes.txt"),
+                                str(tmp_path / "missing.pdf")])
+
+def test_only_supported_files_are_saved(tmp_path):
+    saved = _upload(tmp_path)
+    assert [os.path.basename(p) for p in saved] == ["agenda.pdf"]
+    clear_tmp_dir(str(tmp_path / "session"))
+    assert not (tmp_path / "session").exists()
+
+def test_session_index_is_searched_next_to_the_global_one(tmp_path):
+    _upload(tmp_path)
+    session = build_temp_index(str(tmp_path / "session"), client=None)
+    assert session["embedding_backend"] == "local"
+    meta = session["metadatas"][0]
+    assert (meta["source"], meta["type"], meta["chunk"]) == ("agenda.pdf", "upload", 0)
+
+    (tmp_path / "hotel").mkdir()
+    write_pdf(tmp_path / "hotel" / "guide.pdf", [["Breakfast is served in the garden restaurant from seven."]])
+    hotel = build_temp_index(str(tmp_path / "hotel"), client=None)
+    results = retrieve_federated("keynote hall", hotel, {"upload": session}, top_k=2, mode="lexical")
+    assert results[0]["index"] == "session:upload"
+    assert "keynote" in results[0]["text"]
+
+def test_session_index_respects_the_memory_cap(tmp_path):
+    chunks = ["a" * 100, "b" * 100, "c" * 100]
+    metadatas = [{"chunk": i} for i in range(3)]
+    cap = 2 * chunk_memory_bytes("a" * 100, 8)
+    assert cap_session_chunks(chunks, metadatas, 8, cap) == (chunks[:2], metadatas[:2])
+    assert cap_session_chunks(chunks, metadatas, 8, 10 * cap) == (chunks, metadatas)
+
+    _upload(tmp_path)
+    assert build_temp_index(str(tmp_path / "session"), client=None, max_mb=0) is None
+
+def test_nothing_to_index(tmp_path):
+    assert build_temp_index(str(tmp_path / "missing"), client=None) is None
+    (tmp_path / "empty").mkdir()
+    assert build_temp_index(str(tmp_path / "empty"), client=None) is None
@@ -0,0 +1,62 @@
+# tests/test_vector_storage.py
+import faiss
+import numpy as np
+import pytest
+
+from app.rag.vector_store import (
+    create_faiss_index,
+    load_faiss_index,
+    rerank_exact,
+    save_faiss_index,
+    search_index,
+)
+
+def _bundle(storage, count=500, dim=32):
+    vectors = np.random.default_rng(0).standard_normal((count, dim)).astype("float32")
+    return create_faiss_index(list(vectors), [f"chunk {i}" for i in range(count)],
+                              [{"source": "guide.pdf"} for _ in range(count)], "local",
+                              index_type="flat", storage=storage)
+
+def _queries(count=20, dim=32):
+    return np.random.default_rng(1).standard_normal((count, dim)).astype("float32")
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_compressed_storage_is_smaller(storage):
+    bundle = _bundle(storage)
+    assert isinstance(bundle["faiss"], faiss.IndexScalarQuantizer)
+    assert bundle["index_params"]["storage"] == storage
+    code_size = bundle["faiss"].sa_code_size()
+    assert code_size == {"float16": 32 * 2, "int8": 32}[storage]
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_rerank_restores_exact_results(storage):
+    exact_D, exact_I = search_index(_bundle("float32"), _queries(), 5)
+    D, I = search_index(_bundle(storage), _queries(), 5)
+    np.testing.assert_array_equal(I, exact_I)
+    np.testing.assert_allclose(D, exact_D, rtol=1e-4)
+
+def test_rerank_can_be_disabled():
+    bundle = _bundle("int8")
+    D, _ = search_index(bundle, _queries(), 5, rerank_factor=1)
+    exact_D, _ = search_index(bundle, _queries(), 5)
+    # Without re-scoring the distances come from the int8 codes.
+    assert not np.allclose(D, exact_D, rtol=1e-4)
+
+def test_rerank_exact_skips_missing_candidates():
+    vectors = np.array([[0, 0], [1, 0], [3, 0]], dtype="float32")
+    queries = np.array([[0.9, 0]], dtype="float32")
+    D, I = rerank_exact(vectors, queries, np.array([[2, -1, 0, 1]]), top_k=3)
+    np.testing.assert_array_equal(I, [[1, 0, 2]])
+    np.testing.assert_allclose(D, [[0.01, 0.81, 4.41]], rtol=1e-5)
+
+    _, I = rerank_exact(vectors, queries, np.array([[2, -1]]), top_k=2)
+    np.testing.assert_array_equal(I, [[2, -1]])
+
+def test_saved_compressed_index_still_reranks(tmp_path):
+    save_faiss_index(_bundle("float16"), tmp_path / "index.faiss", tmp_path / "kb.gbkb")
+    loaded = load_faiss_index(tmp_path / "index.faiss", tmp_path / "kb.gbkb")
+    assert loaded["index_params"]["storage"] == "float16"
+
+    _, exact_I = search_index(_bundle("float32"), _queries(), 5)
+    _, I = search_index(loaded, _queries(), 5)
+    np.testing.assert_array_equal(I, exact_I)
@@ -0,0 +1,71 @@
+# tests/test_vector_store.py
+import numpy as np
+
+from app.rag.embeddings import embed_texts
+from app.rag.retriever import retrieve_chunks
+from app.rag.vector_store import MutableVectorStore, create_faiss_index, load_faiss_index
+
+DOCS = {
+    "laundry": ["Express laundry is returned the same evening.", "Laundry bags hang in the wardrobe."],
+    "spa": ["The spa opens at nine and closes at eight.", "Massages are booked at the spa desk."],
+    "pool": ["The rooftop pool is heated all year.", "Towels are handed out at the pool bar."],
+}
+
+def _add(store, doc_id):
+    texts = DOCS[doc_id]
+    return store.add_document(doc_id, embed_texts(texts, backend="local"), texts,
+                              [{"source": f"{doc_id}.pdf"} for _ in texts])
+
+def _store(*doc_ids, **kwargs):
+    first, *rest = doc_ids
+    texts = DOCS[first]
+    bundle = create_faiss_index(embed_texts(texts, backend="local"), texts,
+                                [{"source": f"{first}.pdf", "doc_id": first} for _ in texts], "local")
+    store = MutableVectorStore(bundle, **kwargs)
+    for doc_id in rest:
+        _add(store, doc_id)
+    return store
+
+def _sources(results):
+    return {r["metadata"]["source"] for r in results}
+
+def test_added_and_deleted_documents_show_in_search():
+    store = _store("laundry", "spa", compaction_ratio=1.0)
+    assert sorted(store.documents()) == ["laundry", "spa"]
+    assert "spa.pdf" in _sources(retrieve_chunks("spa massage", store.bundle, mode="lexical"))
+
+    assert store.delete_document("spa") == 2
+    assert store.live_count == 2
+    assert "spa.pdf" not in _sources(retrieve_chunks("spa massage", store.bundle, mode="lexical", top_k=4))
+    assert "spa.pdf" not in _sources(retrieve_chunks("spa massage", store.bundle, mode="dense", top_k=4))
+
+def test_add_leaves_the_bm25_index_readers_hold_untouched():
+    store = _store("laundry")
+    store.add_document("spa", embed_texts(DOCS["spa"], backend="local"), DOCS["spa"], [{}, {}])
+    before = store.bundle["lexical"]
+    count, doc_lens = before.count, before.doc_lens
+
+    _add(store, "pool")
+    assert (before.count, before.doc_lens is doc_lens) == (count, True)
+    assert before.search("rooftop pool", 3)[0].tolist() == []
+    assert store.bundle["lexical"].search("rooftop pool", 3)[0].tolist()[0] == 4
+
+def test_compaction_drops_tombstones_and_keeps_the_live_rows():
+    store = _store("laundry", "spa", "pool", compaction_ratio=1.0)
+    store.delete_document("laundry")
+    assert store.compact()
+    assert store.size == store.live_count == 4
+    assert not store.bundle["deleted"].any()
+    assert sorted(store.documents()) == ["pool", "spa"]
+    results = retrieve_chunks("heated rooftop pool", store.bundle, mode="dense", top_k=1)
+    assert results[0]["text"] == DOCS["pool"][0]
+
+def test_saved_store_loads_with_the_same_rows(tmp_path):
+    store = _store("laundry", "spa", compaction_ratio=1.0)
+    store.delete_document("laundry")
+    store.save(str(tmp_path / "kb.bin"), str(tmp_path / "kb.kb"))
+
+    bundle = load_faiss_index(str(tmp_path / "kb.bin"), str(tmp_path / "kb.kb"))
+    assert list(bundle["texts"]) == DOCS["spa"]
+    assert [m["doc_id"] for m in bundle["metadatas"]] == ["spa", "spa"]
+    assert np.allclose(bundle["vectors"], np.vstack(embed_texts(DOCS["spa"], backend="local")), atol=1e-3)
@@ -0,0 +1,75 @@
+# tests/test_watcher.py
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from app.rag import embedding_executor, watcher
+from app.rag.config import EMBED_REQUESTS_PER_MINUTE, WATCH_RATE_SHARE
+
+@pytest.fixture
+def folders(tmp_path):
+    (tmp_path / "pdf").mkdir()
+    (tmp_path / "images").mkdir()
+    return tmp_path
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+def _watcher(folders, syncs, notified):
+    def fake_sync(*args, **kwargs):
+        syncs.append(sorted(os.listdir(folders / "pdf")))
+        return {"added": 1, "modified": 0, "removed": 0}
+    return watcher.KnowledgeBaseWatcher(
+        folders / "pdf", folders / "images", mode="poll", poll_seconds=0.02,
+        debounce_seconds=0.1, on_sync=lambda: notified.append(True) or True,
+    ), fake_sync
+
+def test_a_burst_of_changes_is_synced_once_after_the_debounce(folders, monkeypatch):
+    syncs, notified = [], []
+    kb_watcher, fake_sync = _watcher(folders, syncs, notified)
+    monkeypatch.setattr(watcher, "sync_documents", fake_sync)
+    thread = kb_watcher.start()
+    try:
+        # The catch-up sync every start begins with.
+        _wait_for(lambda: syncs)
+        assert kb_watcher.wait_idle(5)
+        startup = len(syncs)
+        for name in ("a.pdf", "b.pdf", "c.pdf"):
+            (folders / "pdf" / name).write_bytes(b"%PDF-1.4")
+            time.sleep(0.02)
+        _wait_for(lambda: len(syncs) > startup)
+        assert kb_watcher.wait_idle(5)
+    finally:
+        kb_watcher.stop()
+        thread.join(5)
+
+    assert syncs[startup:] == [["a.pdf", "b.pdf", "c.pdf"]]
+    assert len(notified) == len(syncs)
+
+def test_only_an_ivr_process_is_recognised():
+    assert not watcher._is_ivr_process(os.getpid())
+    sleeper = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        assert not watcher._is_ivr_process(sleeper.pid)
+    finally:
+        sleeper.kill()
+        sleeper.wait()
+
+def test_notify_ivr_ignores_a_stale_pid_file(tmp_path):
+    pid_path = tmp_path / "ivr.pid"
+    assert not watcher.notify_ivr(pid_path)
+    pid_path.write_text(str(os.getpid()))
+    assert not watcher.notify_ivr(pid_path)
+
+def test_watcher_and_ivr_shares_fit_in_one_rate_limit(monkeypatch):
+    monkeypatch.setattr(embedding_executor, "rate_limiter", embedding_executor.rate_limiter)
+    monkeypatch.setattr(embedding_executor, "default_concurrency", embedding_executor.default_concurrency)
+    embedding_executor.throttle(WATCH_RATE_SHARE)
+    watcher_rpm = embedding_executor.rate_limiter.rpm
+    embedding_executor.throttle(1.0 - WATCH_RATE_SHARE, 4)
+    assert watcher_rpm + embedding_executor.rate_limiter.rpm <= EMBED_REQUESTS_PER_MINUTE